@@ -0,0 +1,119 @@
+"""Caché de respuestas ya serializadas de /pricing/listas y /pricing/landed.
+
+Los precios solo cambian con un recálculo, así que la respuesta de una misma
+consulta (sku, transporte y clase de rol) se guarda como bytes JSON y se
+reutiliza mientras no cambie el contenido de la foto de precios
+(`precios_snapshot.current().version`, hash de los precios). Una recarga por
+PRICING_SNAPSHOT_TTL que lee los mismos precios conserva las entradas; solo un
+recálculo o una publicación que cambie precios las descarta. Un acierto no consulta la base, no oculta campos ni valida con
+Pydantic: entrega los mismos bytes.
+
+- Solo se usa con una foto de precios vigente; sin foto se responde desde la
+  base de datos sin guardar nada.
+- Las entradas se descartan por antigüedad de uso (LRU) al pasar de
+  PRICING_CACHE_RESPUESTAS_MB megabytes; 0 desactiva la caché.
+- Aciertos y fallos se publican en /metrics como
+  pricing_response_cache_requests_total{endpoint, resultado}.
+- Con foto vigente la respuesta lleva ETag (versión de la foto + clave); un
+  If-None-Match que coincide recibe 304 antes de buscar en la caché.
+- Cada página (`limite` y cursor forman parte de la clave) se guarda con sus
+  encabezados, como el cursor de la página siguiente (app/paginacion.py).
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from . import metrics, precios_snapshot, versiones_datos
+from .config import settings
+
+
+def clase_rol(rol: str | None) -> str:
+    """Clase de rol que distingue respuestas: el Vendedor no ve costos."""
+    return "vendedor" if rol == "Vendedor" else "completo"
+
+
+class CacheRespuestas:
+    """LRU de cuerpos JSON (con sus encabezados) por clave, acotado por bytes de cuerpo."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[Tuple[Any, ...], Tuple[str, bytes, Dict[str, str]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, clave: Tuple[Any, ...], version: str) -> Tuple[bytes, Dict[str, str]] | None:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] != version:
+                # Quedó de precios anteriores
+                self._descartar(clave)
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[1], entrada[2]
+
+    def put(
+        self, clave: Tuple[Any, ...], version: str, cuerpo: bytes, encabezados: Dict[str, str] | None = None
+    ) -> None:
+        if len(cuerpo) > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self._descartar(clave)
+            self._entradas[clave] = (version, cuerpo, encabezados or {})
+            self._bytes += len(cuerpo)
+            while self._bytes > self.max_bytes:
+                self._descartar(next(iter(self._entradas)))
+
+    def _descartar(self, clave: Tuple[Any, ...]) -> None:
+        _, cuerpo, _ = self._entradas.pop(clave)
+        self._bytes -= len(cuerpo)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+cache = CacheRespuestas(int(settings.pricing_response_cache_mb * 1024 * 1024))
+
+
+def respuesta_json(
+    request: Request,
+    endpoint: str,
+    clave: Tuple[Any, ...],
+    construir: Callable[[Any], Tuple[bytes, Dict[str, str]]],
+) -> Response:
+    """Respuesta JSON de la caché o de `construir(snapshot)`, que recibe la foto vigente o None.
+
+    `construir` devuelve el cuerpo y los encabezados propios de la respuesta.
+    """
+    snapshot = precios_snapshot.current()
+    if snapshot is None:
+        cuerpo, encabezados = construir(snapshot)
+        return Response(cuerpo, media_type="application/json", headers=encabezados)
+    etag = versiones_datos.etag(snapshot.version, endpoint, *clave)
+    if versiones_datos.no_modificado(request, etag):
+        return versiones_datos.respuesta_304(etag)
+    if cache.max_bytes <= 0:
+        cuerpo, encabezados = construir(snapshot)
+        return versiones_datos.marcar(Response(cuerpo, media_type="application/json", headers=encabezados), etag)
+    clave = (endpoint, *clave)
+    entrada = cache.get(clave, snapshot.version)
+    if entrada is None:
+        metrics.response_cache_requests.inc(endpoint=endpoint, resultado="miss")
+        entrada = construir(snapshot)
+        cache.put(clave, snapshot.version, *entrada)
+    else:
+        metrics.response_cache_requests.inc(endpoint=endpoint, resultado="hit")
+    cuerpo, encabezados = entrada
+    return versiones_datos.marcar(Response(cuerpo, media_type="application/json", headers=encabezados), etag)
@@ -0,0 +1,46 @@
+"""Selección de campos (`fields=`) de /pricing/listas, /pricing/landed y /catalog/productos.
+
+`fields=sku,precio_maximo_lista,precio_minimo_lista` devuelve solo esos
+campos de cada fila: la consulta SQL (o la foto de precios) lee únicamente
+las columnas necesarias y la respuesta se serializa con un esquema reducido
+del mismo modelo, así bajan la lectura en la base, el tamaño del JSON y el
+tiempo de serialización. Sin `fields` la respuesta es la completa.
+
+Los campos se validan contra los que el rol puede ver en esa ruta (el
+Vendedor no puede pedir costos en /pricing/listas); uno desconocido o no
+permitido responde 400. La salida conserva el orden de campos del esquema.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Iterable, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, TypeAdapter, create_model
+
+
+def elegir(fields: str | None, modelo: Type[BaseModel], permitidos: Iterable[str]) -> Tuple[str, ...] | None:
+    """Campos pedidos en el orden del esquema, o None si no se pidió selección."""
+    if fields is None or not fields.strip():
+        return None
+    pedidos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    permitidos = set(permitidos)
+    invalidos = sorted(pedidos - permitidos)
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos no válidos para este rol: {', '.join(invalidos)}. "
+            f"Disponibles: {', '.join(campo for campo in modelo.model_fields if campo in permitidos)}",
+        )
+    return tuple(campo for campo in modelo.model_fields if campo in pedidos)
+
+
+@lru_cache(maxsize=128)
+def adaptador(modelo: Type[BaseModel], campos: Tuple[str, ...]) -> TypeAdapter:
+    """Serializador de listas con solo `campos` del modelo (mismos tipos y valores por defecto)."""
+    parcial = create_model(
+        f"{modelo.__name__}Parcial",
+        **{campo: (modelo.model_fields[campo].annotation, modelo.model_fields[campo]) for campo in campos},
+    )
+    return TypeAdapter(list[parcial])
+
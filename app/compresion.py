@@ -0,0 +1,94 @@
+"""Compresión de respuestas negociada con Accept-Encoding (br o gzip).
+
+- Solo se comprimen respuestas de al menos API_COMPRESION_MIN_BYTES bytes
+  (1024 por defecto; 0 desactiva el middleware); las pequeñas y los 304 van
+  tal cual.
+- brotli (calidad 4) si el cliente lo acepta y el paquete `brotli` está
+  instalado; si no, gzip (nivel 6). Entre dos codificaciones con el mismo q
+  se prefiere br, que comprime más el JSON de precios por el mismo CPU.
+- Los bytes comprimidos no son los de la representación, así que un ETag
+  fuerte pasa a débil (W/"..."); If-None-Match compara en forma débil
+  (app/versiones_datos.py) y el 304 sigue funcionando.
+
+Reutiliza los responders de Starlette (GZipMiddleware), que ya manejan
+respuestas completas, streaming y Vary: Accept-Encoding.
+"""
+from __future__ import annotations
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: sin brotli solo gzip
+    brotli = None
+
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 4
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = CALIDAD_BROTLI) -> None:
+        super().__init__(app, minimum_size)
+        self.compresor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        salida = self.compresor.process(body)
+        # En streaming cada parte se entrega completa para que el cliente la pueda leer
+        return salida + (self.compresor.flush() if more_body else self.compresor.finish())
+
+
+def negociar(accept_encoding: str) -> str | None:
+    """Codificación disponible con mayor q en Accept-Encoding ("br", "gzip") o None."""
+    calidades = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        if nombre.strip():
+            calidades[nombre.strip().lower()] = calidad
+    disponibles = ("br", "gzip") if brotli is not None else ("gzip",)
+    elegida, mejor = None, 0.0
+    for codificacion in disponibles:
+        calidad = calidades.get(codificacion, calidades.get("*", 0.0))
+        if calidad > mejor:
+            elegida, mejor = codificacion, calidad
+    return elegida
+
+
+class CompresionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = negociar(Headers(scope=scope).get("accept-encoding", ""))
+        responder: ASGIApp
+        if codificacion == "br":
+            responder = BrotliResponder(self.app, self.minimum_size)
+        elif codificacion == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=NIVEL_GZIP)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+
+        async def enviar(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                encabezados = MutableHeaders(raw=message["headers"])
+                etag = encabezados.get("etag")
+                if etag and "content-encoding" in encabezados and not etag.startswith("W/"):
+                    encabezados["ETag"] = "W/" + etag
+            await send(message)
+
+        await responder(scope, receive, enviar)
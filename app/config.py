@@ -18,6 +18,38 @@ class Settings:
     )
     default_transporte: str = os.getenv("DEFAULT_TRANSPORTE", "Maritimo")
     default_monedas: list[str] = field(default_factory=lambda: os.getenv("DEFAULT_MONEDAS", "MXN").split(","))
+    # Motor de cálculo para /pricing/recalculate: "filas" o "vectorizado"
+    pricing_engine: str = os.getenv("PRICING_ENGINE", "filas")
+    # Persistencia del recálculo: "directa" (DELETE + INSERT), "staging" (carga + MERGE), "diferencial"
+    # o "versionada" (versiones inmutables con publicación atómica)
+    pricing_persist_mode: str = os.getenv("PRICING_PERSIST_MODE", "directa")
+    # Versiones de precios que se conservan por transporte en persistencia versionada
+    pricing_keep_versions: int = int(os.getenv("PRICING_VERSIONES_RETENIDAS", "3"))
+    # Guarda solo la base de cada precio y deriva los niveles al leer (sql/create_precios_base.sql)
+    pricing_precios_derivados: bool = os.getenv("PRICING_PRECIOS_DERIVADOS", "0").lower() in ("1", "true", "si")
+    pricing_batch_size: int = int(os.getenv("PRICING_BATCH_SIZE", "5000"))
+    # Tolerancia en MXN de la persistencia diferencial
+    pricing_diff_tolerance: float = float(os.getenv("PRICING_DIFF_TOLERANCE", "0.01"))
+    # Segundos que se reutiliza la foto de referencia en memoria para /pricing/simulate
+    pricing_reference_ttl: float = float(os.getenv("PRICING_REFERENCE_TTL", "300"))
+    # Segundos que la foto de precios en memoria (app/precios_snapshot.py) se da por vigente; 0 la desactiva
+    pricing_snapshot_ttl: float = float(os.getenv("PRICING_SNAPSHOT_TTL", "120"))
+    # Cada cuántos segundos se compara la foto contra dbo.RecalculoEjecuciones (recálculos de otros procesos); 0 no compara
+    pricing_snapshot_poll: float = float(os.getenv("PRICING_SNAPSHOT_POLL", "5"))
+    # Foto binaria de precios compartida por los workers (mmap); vacío = foto en memoria por worker
+    pricing_snapshot_file: str = os.getenv("PRICING_ARCHIVO_FOTO", "")
+    # Megabytes de respuestas JSON ya serializadas de /pricing/listas y /pricing/landed; 0 desactiva la caché
+    pricing_response_cache_mb: float = float(os.getenv("PRICING_CACHE_RESPUESTAS_MB", "64"))
+    # Segundos que cada worker reutiliza la versión de Productos/Parámetros/Tipos de cambio para los ETags de /catalog
+    catalog_version_ttl: float = float(os.getenv("CATALOGO_VERSION_TTL", "60"))
+    # Filas por página de /catalog/productos, /pricing/listas y /pricing/landed sin `limite`; 0 entrega todo
+    api_page_size: int = int(os.getenv("API_PAGINA_TAMANO", "0"))
+    # Máximo que acepta el parámetro `limite` de las rutas paginadas
+    api_page_max: int = int(os.getenv("API_PAGINA_MAX", "5000"))
+    # Serializa las listas con orjson sin validar contra el esquema (ver app/serializacion.py)
+    api_json_rapido: bool = os.getenv("API_JSON_RAPIDO", "0").lower() in ("1", "true", "si")
+    # Respuestas de al menos estos bytes se comprimen con br o gzip según Accept-Encoding; 0 desactiva
+    api_compression_min_bytes: int = int(os.getenv("API_COMPRESION_MIN_BYTES", "1024"))
     allowed_origins: list[str] = field(default_factory=lambda: os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173").split(","))
     api_title: str = os.getenv("API_TITLE", "Base Costos API")
     api_version: str = os.getenv("API_VERSION", "0.1.0")
@@ -26,4 +58,19 @@ class Settings:
     log_file: str = os.getenv("LOG_FILE", "logs/app.log")
     environment: str = os.getenv("ENVIRONMENT", "development")
 
+    @property
+    def precios_calculados(self) -> str:
+        """Tabla o vista de precios que leen las rutas.
+
+        Con persistencia versionada se lee la versión publicada de cada
+        transporte (vista creada por sql/create_precios_versiones.sql); con
+        precios derivados, la vista que calcula los niveles a partir de
+        dbo.PreciosBase (sql/create_precios_base.sql).
+        """
+        if self.pricing_precios_derivados:
+            return "dbo.vPreciosDerivados"
+        if self.pricing_persist_mode == "versionada":
+            return "dbo.vPreciosCalculadosVigentes"
+        return "dbo.PreciosCalculados"
+
 settings = Settings()
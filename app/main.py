@@ -20,6 +20,10 @@ from .config import settings
 from .routes import catalog, pricing, auth, autorizaciones, pdf, clientes, vendedores, cotizaciones, dashboard
 from .logger import logger
 from .db import connection_scope
+from . import metrics as app_metrics
+from . import paginacion, precios_snapshot
+from .compresion import CompresionMiddleware
+from cost_engine import wait_for_prunes
 
 # Inicializar aplicación FastAPI con configuración desde settings
 app = FastAPI(title=settings.api_title, version=settings.api_version)
@@ -34,9 +38,15 @@ app.add_middleware(
     allow_origins=settings.allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # El frontend de desarrollo (otro origen) lee la versión y el cursor de la página siguiente
+    expose_headers=["ETag", paginacion.ENCABEZADO],
 )
 
+# Comprimir respuestas grandes (listas de precios, catálogo) con br o gzip según Accept-Encoding
+if settings.api_compression_min_bytes > 0:
+    app.add_middleware(CompresionMiddleware, minimum_size=settings.api_compression_min_bytes)
+
 # Servir archivos estáticos del frontend (dashboard, index, assets)
 app.mount("/frontend", StaticFiles(directory="frontend"), name="frontend")
 
@@ -51,6 +61,20 @@ app.include_router(vendedores.router)
 app.include_router(cotizaciones.router)
 app.include_router(dashboard.router)
 
+
+@app.on_event("startup")
+def cargar_foto_precios():
+    """Carga en segundo plano la foto de precios en memoria (ver app/precios_snapshot.py)."""
+    precios_snapshot.start()
+
+
+@app.on_event("shutdown")
+def esperar_poda_versiones():
+    """Da hasta 30 s a la poda de versiones de precios en curso (ver cost_engine.wait_for_prunes)."""
+    if not wait_for_prunes(timeout=30):
+        logger.warning("Apagado con poda de versiones de precios pendiente; se completa en el siguiente recálculo")
+
+
 # Variables para métricas simples (única definición)
 start_time = datetime.now(timezone.utc)
 metrics = {
@@ -116,7 +140,8 @@ async def debug_and_metrics_middleware(request, call_next):
 def metrics_endpoint():
     """
     Endpoint Prometheus-like para métricas básicas de la app.
-    Retorna el total de peticiones, errores, uptime y último error.
+    Retorna el total de peticiones, errores, uptime y último error, más las
+    métricas por etapa del recálculo de precios.
     Returns:
         Response: Texto plano con métricas para Prometheus.
     """
@@ -129,4 +154,12 @@ def metrics_endpoint():
         if metrics['last_error']:
             # Añadir como métrica de texto para debugging
             lines.append(f'last_error "{metrics["last_error"]}"')
+    # Último recálculo y conteos desde la bitácora, para incluir la CLI y la tarea nocturna
+    try:
+        with connection_scope() as conn:
+            app_metrics.load_recalculation_log(conn.cursor())
+    except Exception as e:
+        logger.warning(f"/metrics: no se pudo leer RecalculoEjecuciones, se usan valores del proceso: {e}")
+    # Histogramas y gauges del recálculo de precios (ver app/metrics.py)
+    lines.extend(app_metrics.render())
     return Response("\n".join(lines), media_type="text/plain")
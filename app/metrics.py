@@ -0,0 +1,223 @@
+"""Métricas en formato de texto de Prometheus para /metrics.
+
+Implementación mínima (sin prometheus_client) de contadores, gauges e
+histogramas con etiquetas. Cada métrica se registra en REGISTRY y
+`render()` produce el texto que agrega /metrics.
+
+Métricas del recálculo de precios (las registra `observe_recalculation`):
+- pricing_recalc_stage_seconds{stage, transporte}: histograma de segundos por etapa
+- pricing_recalc_stage_rows{stage, transporte}: filas de la última ejecución por etapa
+- pricing_recalc_last_success_timestamp_seconds{transporte}: fin de la última ejecución exitosa
+- pricing_recalc_last_duration_seconds{transporte}: duración de la última ejecución exitosa
+- pricing_recalc_runs_total{resultado}: ejecuciones terminadas (ok/error)
+
+Las etapas de toda la ejecución (fetch, build, commit) usan transporte="todos".
+
+El último éxito, la duración y el conteo de ejecuciones se toman de
+dbo.RecalculoEjecuciones (`load_recalculation_log`), que registra también
+los recálculos de la CLI y de la tarea nocturna; sin esa tabla quedan los
+valores de las ejecuciones de este proceso.
+
+Caché de respuestas de pricing (ver app/cache_respuestas.py):
+- pricing_response_cache_requests_total{endpoint, resultado}: consultas a la caché (hit/miss)
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REGISTRY: List["_Metric"] = []
+_lock = threading.Lock()
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            for key, value in sorted(self.values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_fmt(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with _lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            estado = self.values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, limite in enumerate(self.buckets):
+                if value <= limite:
+                    estado["counts"][index] += 1
+            estado["sum"] += value
+            estado["count"] += 1
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        lines = []
+        for limite, count in zip(self.buckets, value["counts"]):
+            le = 'le="%s"' % _fmt(limite)
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+        inf = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, inf)} {value['count']}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {value['sum']:.6f}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {value['count']}")
+        return lines
+
+
+def render() -> List[str]:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        if metric.values:
+            lines.extend(metric.render())
+    return lines
+
+
+recalc_stage_seconds = Histogram(
+    "pricing_recalc_stage_seconds",
+    "Segundos por etapa del recálculo de precios",
+    ("stage", "transporte"),
+)
+recalc_stage_rows = Gauge(
+    "pricing_recalc_stage_rows",
+    "Filas procesadas por etapa en la última ejecución",
+    ("stage", "transporte"),
+)
+recalc_last_success = Gauge(
+    "pricing_recalc_last_success_timestamp_seconds",
+    "Epoch del último recálculo exitoso por transporte",
+    ("transporte",),
+)
+recalc_last_duration = Gauge(
+    "pricing_recalc_last_duration_seconds",
+    "Duración del último recálculo exitoso por transporte",
+    ("transporte",),
+)
+recalc_runs = Counter(
+    "pricing_recalc_runs_total",
+    "Recálculos terminados por resultado",
+    ("resultado",),
+)
+
+response_cache_requests = Counter(
+    "pricing_response_cache_requests_total",
+    "Consultas a la caché de respuestas de pricing por resultado",
+    ("endpoint", "resultado"),
+)
+
+# Etapas que cost_engine reporta por transporte; el resto son de toda la ejecución
+_TRANSPORT_STAGES = ("landed_compute", "landed_persist", "price_compute", "price_persist")
+
+
+def observe_recalculation(summary: Dict[str, Any]) -> None:
+    """Registra las etapas del resumen de `cost_engine.run_calculations`."""
+    ahora = time.time()
+    for stage, medida in summary.get("stages", {}).items():
+        if stage in _TRANSPORT_STAGES:
+            continue
+        recalc_stage_seconds.observe(medida["seconds"], stage=stage, transporte="todos")
+        recalc_stage_rows.set(medida["rows"], stage=stage, transporte="todos")
+    for transporte, resumen in summary.get("transportes", {}).items():
+        precios = resumen["price_rows"] + resumen.get("currency_price_rows", 0)
+        filas = {
+            "landed_compute": resumen["landed_rows"],
+            "landed_persist": resumen["landed_rows"],
+            "price_compute": precios,
+            "price_persist": precios,
+        }
+        for stage in _TRANSPORT_STAGES:
+            recalc_stage_seconds.observe(resumen["timings"][f"{stage}_s"], stage=stage, transporte=transporte)
+            recalc_stage_rows.set(filas[stage], stage=stage, transporte=transporte)
+        recalc_last_success.set(ahora, transporte=transporte)
+        recalc_last_duration.set(summary.get("timings", {}).get("total_s", 0.0), transporte=transporte)
+    recalc_runs.inc(resultado="ok")
+
+
+def load_recalculation_log(cursor) -> bool:
+    """Toma de dbo.RecalculoEjecuciones el último éxito y duración por transporte y los conteos.
+
+    Devuelve False (y deja los valores del proceso) si la tabla no existe.
+    """
+    cursor.execute("SELECT OBJECT_ID('dbo.RecalculoEjecuciones', 'U')")
+    row = cursor.fetchone()
+    if not (row and row[0]):
+        return False
+    cursor.execute(
+        """
+        SELECT e.transporte, e.terminado_en, e.duracion_s
+        FROM (
+            SELECT transporte, terminado_en, duracion_s,
+                   ROW_NUMBER() OVER (PARTITION BY transporte ORDER BY ejecucion_id DESC) AS n
+            FROM dbo.RecalculoEjecuciones
+            WHERE resultado = 'ok'
+        ) e
+        WHERE e.n = 1
+        """
+    )
+    ultimos = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT resultado, COUNT_BIG(DISTINCT corrida_id) FROM dbo.RecalculoEjecuciones
+        WHERE resultado IN ('ok', 'error')
+        GROUP BY resultado
+        """
+    )
+    conteos = cursor.fetchall()
+    for transporte, terminado_en, duracion_s in ultimos:
+        # terminado_en se guarda en UTC (SYSUTCDATETIME) sin zona
+        recalc_last_success.set(terminado_en.replace(tzinfo=timezone.utc).timestamp(), transporte=transporte)
+        recalc_last_duration.set(float(duracion_s), transporte=transporte)
+    with _lock:
+        # La bitácora ya incluye las ejecuciones de este proceso
+        recalc_runs.values = {(resultado,): int(total) for resultado, total in conteos}
+    return True
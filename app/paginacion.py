@@ -0,0 +1,121 @@
+"""Paginación por clave (keyset) de /catalog/productos, /pricing/listas y /pricing/landed.
+
+Las filas se entregan ordenadas por (sku, transporte) (solo sku en
+Productos) y cada página empieza después de la última clave de la anterior:
+`sku >= ? AND (sku > ? OR transporte > ?)` con `FETCH NEXT n ROWS ONLY` es
+una sola búsqueda en el índice (sku, transporte), cueste lo mismo la primera
+página que la última (OFFSET en cambio recorre todas las filas anteriores).
+En la foto de precios es una búsqueda binaria.
+
+El orden y la condición usan la intercalación binaria Latin1_General_BIN2
+(orden por punto de código, el mismo de las fotos en Python y en el archivo
+binario). Con la intercalación CI de la base el orden no coincide (mayúsculas,
+guiones), y un cursor emitido por la foto saltaría o repetiría filas al
+seguir en la base. Las fotos guardan SKU y transporte sin espacios y BIN2
+ignora los finales; solo un SKU con espacios al inicio ordenaría distinto.
+Las columnas calculadas `sku_bin`/`transporte_bin` de sql/optimizacion_bd.sql
+indexan esa misma expresión para conservar la búsqueda en el índice.
+
+- `limite` fija el tamaño de página (máximo API_PAGINA_MAX). Sin `limite` se
+  usa API_PAGINA_TAMANO; con 0 (por defecto) la respuesta trae todo el
+  resultado, como antes de paginar.
+- El cuerpo sigue siendo la lista. Si quedan filas, el encabezado
+  X-Siguiente-Cursor trae el cursor de la página siguiente; se envía tal cual
+  en `cursor` junto con los mismos filtros y `limite`.
+- El cursor es opaco (base64 de la última clave entregada); no caduca con un
+  recálculo, la página siguiente empieza después de esa clave.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from .config import settings
+
+ENCABEZADO = "X-Siguiente-Cursor"
+
+# Clave de orden de cada ruta paginada
+CLAVE_PRECIOS = ("sku", "transporte")
+CLAVE_PRODUCTOS = ("sku",)
+
+# Intercalación del orden de páginas (ver docstring del módulo)
+INTERCALACION = "Latin1_General_BIN2"
+
+
+def codificar(clave: Sequence[str]) -> str:
+    texto = json.dumps(list(clave), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar(cursor: str, columnas: Sequence[str]) -> Tuple[str, ...]:
+    """Clave del cursor; HTTP 400 si no es un cursor de esta ruta."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        clave = json.loads(texto.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        clave = None
+    if not isinstance(clave, list) or len(clave) != len(columnas) or not all(isinstance(v, str) for v in clave):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+    return tuple(clave)
+
+
+def pagina(
+    limite: int | None, cursor: str | None, columnas: Sequence[str]
+) -> Tuple[int | None, Tuple[str, ...] | None]:
+    """Tamaño de página (None = sin paginar) y última clave entregada."""
+    if limite is None:
+        limite = settings.api_page_size or None
+    despues = decodificar(cursor, columnas) if cursor else None
+    if despues is not None and limite is None:
+        # Un cursor siempre pide una página acotada
+        limite = settings.api_page_max
+    return limite, despues
+
+
+def _columna(alias: str, columna: str) -> str:
+    return f"{alias}{columna} COLLATE {INTERCALACION}"
+
+
+def filtro_sql(despues: Tuple[str, ...] | None, columnas: Sequence[str], alias: str = "") -> Tuple[str, List[str]]:
+    """Condición `AND ...` para empezar después de `despues` (vacía en la primera página)."""
+    if despues is None:
+        return "", []
+    if len(columnas) == 1:
+        return f" AND {_columna(alias, columnas[0])} > ?", [despues[0]]
+    primera, segunda = _columna(alias, columnas[0]), _columna(alias, columnas[1])
+    # La condición sobre la primera columna sola permite la búsqueda en el índice
+    return (
+        f" AND {primera} >= ? AND ({primera} > ? OR {segunda} > ?)",
+        [despues[0], despues[0], despues[1]],
+    )
+
+
+def orden_sql(columnas: Sequence[str], alias: str = "") -> str:
+    """Cláusula ORDER BY de la clave con la misma intercalación que `filtro_sql`."""
+    return " ORDER BY " + ", ".join(_columna(alias, columna) for columna in columnas)
+
+
+def limite_sql(limite: int | None) -> Tuple[str, List[int]]:
+    """Cláusula que sigue al ORDER BY: una fila más que la página para saber si hay siguiente."""
+    if limite is None:
+        return "", []
+    return " OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", [limite + 1]
+
+
+def recortar(
+    filas: List[Dict[str, Any]], limite: int | None, columnas: Sequence[str]
+) -> Tuple[List[Dict[str, Any]], str | None]:
+    """Página de `filas` (leídas con una fila de más) y cursor de la siguiente, o None si es la última."""
+    if limite is None or len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar([filas[-1][column] for column in columnas])
+
+
+def encabezados(siguiente: str | None) -> Dict[str, str]:
+    """Encabezados de la respuesta paginada (vacío en la última página o sin paginar)."""
+    return {ENCABEZADO: siguiente} if siguiente else {}
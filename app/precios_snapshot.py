@@ -0,0 +1,371 @@
+"""Foto en memoria de los precios calculados, una por worker de la API.
+
+/pricing/listas y las autorizaciones leen los precios de aquí en lugar de
+consultar `settings.precios_calculados` en cada solicitud:
+- Las columnas numéricas son arreglos float64 de solo lectura (NaN = NULL) y
+  un índice (sku, transporte) -> fila resuelve una búsqueda sin ir a la base.
+- La foto es inmutable: una recarga construye otra y reemplaza la referencia,
+  así una solicitud en curso nunca ve una foto a medio cargar.
+- Las búsquedas por SKU y transporte comparan sin distinguir mayúsculas ni
+  espacios al inicio o al final (`clave`), como la intercalación CI de SQL
+  Server: la foto encuentra lo mismo que la consulta a la base.
+- Se carga al arrancar y se recarga en segundo plano cuando un recálculo o
+  una publicación de versión termina en este worker (`invalidate`) y cuando
+  vence PRICING_SNAPSHOT_TTL. Una foto vencida se sigue usando hasta que la
+  recarga termina; solo `invalidate` hace que las rutas vuelvan a la base.
+- Cada foto guarda la posición de dbo.RecalculoEjecuciones con la que se
+  cargó (`bitacora`, ver cost_engine.run_log_position). Cada
+  PRICING_SNAPSHOT_POLL segundos se compara en segundo plano con la actual y,
+  si otro worker o la CLI recalculó, la foto se invalida; las listas pueden
+  quedar atrás a lo más ese intervalo. Las autorizaciones usan
+  `current_verificada`, que compara la posición en la misma solicitud y
+  consulta la base si la foto quedó atrás o no hay bitácora.
+- Mientras no hay foto o está invalidada `current()` devuelve None y las
+  rutas consultan la base de datos. PRICING_SNAPSHOT_TTL=0 desactiva la foto.
+
+Con PRICING_ARCHIVO_FOTO los workers no cargan su propia copia: mapean en
+memoria el archivo binario que escribe cost_engine al terminar cada recálculo
+(`cost_engine.SnapshotFile`) y el sistema operativo comparte sus páginas
+entre procesos. Cada consulta compara la firma del archivo (inodo, fecha y
+tamaño); el recálculo lo reemplaza con un rename atómico y el siguiente
+`current()` abre el nuevo. La posición de la bitácora guardada en el archivo
+se compara con la que lee la verificación periódica: si un recálculo no
+reescribió el archivo, `current()` devuelve None y se consulta la base.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .config import settings
+from .db import connection_scope
+from .logger import logger
+from cost_engine import SnapshotFile, lookup_key, run_log_position
+
+# Columnas de /pricing/listas en el orden de settings.precios_calculados
+COLUMNAS = [
+    "sku",
+    "transporte",
+    "landed_cost_mxn",
+    "precio_base_mxn",
+    "precio_maximo",
+    "precio_vendedor_min",
+    "precio_gerente_com_min",
+    "precio_subdireccion_min",
+    "precio_direccion_min",
+    "markup_pct",
+    "fecha_calculo",
+    "costo_base_mxn",
+    "flete_pct",
+    "seguro_pct",
+    "arancel_pct",
+    "dta_pct",
+    "honorarios_aduanales_pct",
+    "categoria",
+]
+# Columnas que se guardan como texto u objeto; el resto son float64
+COLUMNAS_TEXTO = ("sku", "transporte", "fecha_calculo", "categoria")
+COLUMNAS_NUMERICAS = [column for column in COLUMNAS if column not in COLUMNAS_TEXTO]
+
+# SKU o transporte normalizado como la intercalación CI de la base (mismo criterio que la foto binaria)
+clave = lookup_key
+
+
+def _recortar(valor: Any) -> Any:
+    return valor.strip() if isinstance(valor, str) else valor
+
+
+class PreciosSnapshot:
+    """Precios de todos los SKUs y transportes en columnas, ordenados por (sku, transporte).
+
+    El orden es por punto de código, como Latin1_General_BIN2 en la paginación de la base
+    (ver app/paginacion.py).
+    """
+
+    __slots__ = (
+        "columnas", "indice", "rangos_sku", "transportes", "generacion", "version", "cargado_en", "bitacora"
+    )
+
+    def __init__(self, columnas: Mapping[str, Sequence[Any]], generacion: int = 0, bitacora: int | None = None):
+        # Se recorta antes de ordenar: el orden es el de los valores que se entregan y se comparan
+        llaves = {column: [_recortar(v) for v in columnas[column]] for column in ("sku", "transporte")}
+        orden = sorted(range(len(llaves["sku"])), key=lambda i: (llaves["sku"][i], llaves["transporte"][i]))
+        datos: Dict[str, np.ndarray] = {}
+        for column in COLUMNAS:
+            origen = llaves.get(column, columnas[column])
+            valores = [origen[i] for i in orden]
+            if column in COLUMNAS_NUMERICAS:
+                arreglo = np.array([np.nan if v is None else float(v) for v in valores], dtype=np.float64)
+            else:
+                arreglo = np.empty(len(valores), dtype=object)
+                arreglo[:] = valores
+            arreglo.flags.writeable = False
+            datos[column] = arreglo
+        self.columnas = datos
+        # Índices por clave normalizada; la base no admite dos SKUs que solo difieran en mayúsculas
+        self.transportes = np.array([clave(t) for t in datos["transporte"]], dtype=object)
+        self.indice: Dict[Tuple[str, str], int] = {
+            (clave(sku), transporte): i for i, (sku, transporte) in enumerate(zip(datos["sku"], self.transportes))
+        }
+        # Filas contiguas de cada SKU (la foto está ordenada por SKU)
+        self.rangos_sku: Dict[str, Tuple[int, int]] = {}
+        for i, sku in enumerate(datos["sku"]):
+            inicio, _ = self.rangos_sku.get(clave(sku), (i, i))
+            self.rangos_sku[clave(sku)] = (inicio, i + 1)
+        self.generacion = generacion
+        self.bitacora = bitacora
+        self.version = self._huella()
+        self.cargado_en = time.monotonic()
+
+    def _huella(self) -> str:
+        """Hash del contenido: igual en todos los workers que cargaron los mismos precios (ETags)."""
+        huella = hashlib.blake2b(digest_size=12)
+        for column in COLUMNAS:
+            arreglo = self.columnas[column]
+            if column in COLUMNAS_NUMERICAS:
+                huella.update(arreglo.tobytes())
+            elif column == "fecha_calculo":
+                huella.update(np.array(arreglo.tolist(), dtype="datetime64[us]").tobytes())
+            else:
+                huella.update("\x1f".join(map(str, arreglo.tolist())).encode("utf-8"))
+        return huella.hexdigest()
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[Mapping[str, Any]], generacion: int = 0, bitacora: int | None = None
+    ) -> "PreciosSnapshot":
+        rows = list(rows)
+        return cls({column: [row.get(column) for row in rows] for column in COLUMNAS}, generacion, bitacora)
+
+    def __len__(self) -> int:
+        return len(self.columnas["sku"])
+
+    def _filas(self, indices: Iterable[int], columnas: Sequence[str] = COLUMNAS) -> List[Dict[str, Any]]:
+        indices = np.fromiter(indices, dtype=np.intp)
+        valores = []
+        for column in columnas:
+            seleccion = self.columnas[column][indices]
+            if column in COLUMNAS_NUMERICAS:
+                valores.append([None if v != v else v for v in seleccion.tolist()])
+            else:
+                valores.append(seleccion.tolist())
+        return [dict(zip(columnas, fila)) for fila in zip(*valores)]
+
+    def lookup(self, sku: str, transporte: str) -> Dict[str, Any] | None:
+        """Fila de (sku, transporte) o None si no hay precio calculado."""
+        posicion = self.indice.get((clave(sku), clave(transporte)))
+        return None if posicion is None else self._filas([posicion])[0]
+
+    def _posterior(self, despues: Tuple[str, str]) -> int:
+        """Primera posición cuya clave (sku, transporte) es mayor que `despues` (búsqueda binaria)."""
+        # Un cursor de la base puede traer espacios finales, que la base ignora al comparar
+        sku, transporte = despues[0].strip(), despues[1].strip()
+        inicio = int(np.searchsorted(self.columnas["sku"], sku, "left"))
+        fin = int(np.searchsorted(self.columnas["sku"], sku, "right"))
+        return inicio + int(np.searchsorted(self.columnas["transporte"][inicio:fin], transporte, "right"))
+
+    def rows(
+        self,
+        sku: str | None = None,
+        transporte: str | None = None,
+        despues: Tuple[str, str] | None = None,
+        limite: int | None = None,
+        columnas: Sequence[str] = COLUMNAS,
+    ) -> List[Dict[str, Any]]:
+        """Filas ordenadas por (sku, transporte) con los mismos filtros que /pricing/listas.
+
+        `despues` y `limite` devuelven a lo más `limite` filas posteriores a esa clave (paginación);
+        `columnas` limita los campos de cada fila.
+        """
+        inicio, fin = self.rangos_sku.get(clave(sku), (0, 0)) if sku is not None else (0, len(self))
+        if despues is not None:
+            inicio = max(inicio, self._posterior(despues))
+        indices = np.arange(inicio, max(inicio, fin))
+        if transporte is not None:
+            indices = indices[self.transportes[indices] == clave(transporte)]
+        return self._filas(indices[:limite], columnas)
+
+
+_lock = threading.Lock()
+_estado: Dict[str, Any] = {
+    "snapshot": None, "vigente": False, "cargando": False, "generacion": 0, "verificando": False, "verificado_en": 0.0,
+    "bitacora": None,
+}
+_archivo: Dict[str, Any] = {"firma": None, "foto": None}
+
+
+def load(conn: Any, generacion: int = 0) -> PreciosSnapshot:
+    """Lee todos los precios de `settings.precios_calculados` en una sola consulta."""
+    cursor = conn.cursor()
+    # La posición se lee antes que los precios: un recálculo que confirme en medio la adelanta
+    bitacora = run_log_position(cursor)
+    cursor.execute(f"SELECT {', '.join(COLUMNAS)} FROM {settings.precios_calculados}")
+    columnas: Dict[str, List[Any]] = {column: [] for column in COLUMNAS}
+    while filas := cursor.fetchmany(50_000):
+        for column, valores in zip(COLUMNAS, zip(*filas)):
+            columnas[column].extend(valores)
+    return PreciosSnapshot(columnas, generacion, bitacora)
+
+
+def _recargar() -> None:
+    # La generación solo sube con `invalidate`; una recarga por TTL conserva la actual
+    with _lock:
+        generacion = _estado["generacion"]
+    inicio = time.perf_counter()
+    try:
+        with connection_scope() as conn:
+            snapshot = load(conn, generacion)
+    except Exception:
+        logger.exception("No se pudo cargar la foto de precios; se consulta la base de datos")
+        with _lock:
+            _estado["cargando"] = False
+        return
+    with _lock:
+        _estado["cargando"] = False
+        if _estado["generacion"] != generacion:
+            # Se invalidó durante la carga: pudo leer precios anteriores
+            _recargar_en_segundo_plano()
+            return
+        _estado.update(snapshot=snapshot, vigente=True)
+    logger.info("Foto de precios cargada: %s filas en %.2f s", len(snapshot), time.perf_counter() - inicio)
+
+
+def _recargar_en_segundo_plano() -> None:
+    """Lanza una recarga si no hay otra en curso (se llama con `_lock` tomado)."""
+    if _estado["cargando"] or settings.pricing_snapshot_ttl <= 0 or settings.pricing_snapshot_file:
+        return
+    _estado["cargando"] = True
+    threading.Thread(target=_recargar, name="recarga-precios", daemon=True).start()
+
+
+def start() -> None:
+    """Carga inicial al arrancar la API (en segundo plano; mientras tanto se lee la base)."""
+    with _lock:
+        _recargar_en_segundo_plano()
+
+
+def archivo() -> SnapshotFile | None:
+    """Foto binaria de PRICING_ARCHIVO_FOTO o None si no está configurada o no existe."""
+    ruta = settings.pricing_snapshot_file
+    if not ruta:
+        return None
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+    with _lock:
+        if _archivo["firma"] != firma:
+            try:
+                foto = SnapshotFile(ruta)
+            except (OSError, ValueError):
+                logger.exception("No se pudo abrir la foto de precios %s; se consulta la base de datos", ruta)
+                return None
+            # El mapa anterior se libera cuando ninguna solicitud lo usa
+            _archivo.update(firma=firma, foto=foto)
+        return _archivo["foto"]
+
+
+def _verificar() -> None:
+    """Guarda la posición de la bitácora e invalida la foto en memoria si avanzó.
+
+    Con PRICING_ARCHIVO_FOTO solo guarda la posición: `current` la compara con
+    la del archivo.
+    """
+    try:
+        with connection_scope() as conn:
+            posicion = run_log_position(conn.cursor())
+    except Exception:
+        logger.exception("No se pudo consultar RecalculoEjecuciones; la foto vence por PRICING_SNAPSHOT_TTL")
+        posicion = None
+    with _lock:
+        _estado["verificando"] = False
+        _estado["verificado_en"] = time.monotonic()
+        _estado["bitacora"] = posicion
+        snapshot = _archivo["foto"] if settings.pricing_snapshot_file else _estado["snapshot"]
+        if posicion is None or snapshot is None:
+            return
+        if settings.pricing_snapshot_file:
+            if snapshot.bitacora is not None and snapshot.bitacora < posicion:
+                logger.warning(
+                    "La foto %s quedó atrás de la bitácora (%s < %s); se consulta la base hasta que se reescriba",
+                    settings.pricing_snapshot_file, snapshot.bitacora, posicion,
+                )
+            return
+        if snapshot.bitacora == posicion:
+            return
+    logger.info("Precios recalculados en otro proceso (bitácora %s -> %s); se recarga la foto", snapshot.bitacora, posicion)
+    invalidate()
+
+
+def _verificar_en_segundo_plano() -> None:
+    """Lanza una verificación si toca según PRICING_SNAPSHOT_POLL (se llama con `_lock` tomado)."""
+    if (
+        _estado["verificando"]
+        or settings.pricing_snapshot_poll <= 0
+        or time.monotonic() - _estado["verificado_en"] < settings.pricing_snapshot_poll
+    ):
+        return
+    _estado["verificando"] = True
+    threading.Thread(target=_verificar, name="verifica-precios", daemon=True).start()
+
+
+def current() -> PreciosSnapshot | SnapshotFile | None:
+    """Foto vigente o None (sin foto o invalidada); en ese caso la recarga.
+
+    Al vencer PRICING_SNAPSHOT_TTL la foto se sigue entregando mientras la
+    recarga corre en segundo plano: la verificación contra la bitácora es la
+    que la invalida si otro proceso recalculó.
+    """
+    if settings.pricing_snapshot_file:
+        foto = archivo()
+        if foto is None:
+            return None
+        with _lock:
+            _verificar_en_segundo_plano()
+            posicion = _estado["bitacora"]
+        # Un recálculo que no reescribió el archivo (CLI sin --archivo-foto o escritura fallida)
+        if posicion is not None and foto.bitacora is not None and foto.bitacora < posicion:
+            return None
+        return foto
+    with _lock:
+        snapshot = _estado["snapshot"]
+        if snapshot is None or not _estado["vigente"] or settings.pricing_snapshot_ttl <= 0:
+            _recargar_en_segundo_plano()
+            return None
+        if time.monotonic() - snapshot.cargado_en > settings.pricing_snapshot_ttl:
+            # Vencida pero no invalidada: se sigue sirviendo mientras se recarga en segundo plano
+            _recargar_en_segundo_plano()
+        _verificar_en_segundo_plano()
+        return snapshot
+
+
+def current_verificada(conn: Any) -> PreciosSnapshot | SnapshotFile | None:
+    """Foto vigente solo si refleja la última ejecución registrada; None para consultar la base.
+
+    Para decisiones que no admiten precios atrasados (autorizaciones): cuesta
+    una búsqueda por llave primaria en dbo.RecalculoPosicion (fila única) en la
+    conexión de la solicitud. Sin la tabla no hay forma de comparar y se
+    consulta la base.
+    """
+    snapshot = current()
+    if snapshot is None or snapshot.bitacora is None:
+        return None
+    if run_log_position(conn.cursor()) != snapshot.bitacora:
+        if not settings.pricing_snapshot_file:
+            invalidate()
+        return None
+    return snapshot
+
+
+def invalidate() -> None:
+    """Marca la foto como desactualizada (nuevos precios publicados) y la recarga."""
+    with _lock:
+        _estado["vigente"] = False
+        _estado["generacion"] += 1
+        _recargar_en_segundo_plano()
@@ -0,0 +1,301 @@
+"""Trabajos de recálculo de precios en segundo plano.
+
+POST /pricing/recalculate encola un trabajo y responde de inmediato; el
+recálculo corre en un hilo propio con su propia conexión, así el worker de
+la API queda libre para atender lecturas de precios.
+
+- Los trabajos se ejecutan en orden, uno a la vez (no compiten por las
+  mismas tablas).
+- Si llega una solicitud para transportes que ya cubre un trabajo en cola o
+  en proceso, se devuelve ese trabajo en lugar de crear otro.
+- Cada trabajo registra su progreso y los segundos de cada etapa.
+
+Con sql/create_recalculo_trabajos.sql el estado de cada trabajo se guarda
+también en dbo.RecalculoTrabajos, así cualquier worker de la API responde
+por un job_id aunque lo haya recibido otro. La unión de solicitudes
+repetidas es por worker; dos recálculos de los mismos transportes desde
+workers distintos no corren a la vez porque `run_calculations` toma un
+sp_getapplock por transporte. Un trabajo que quedó activo porque su worker
+se detuvo se reconoce por el campo `worker` (equipo:pid).
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence
+
+from .db import connection_scope
+from .logger import logger
+
+# Estados de un trabajo
+EN_COLA = "en_cola"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+ERROR = "error"
+ACTIVOS = (EN_COLA, EN_PROCESO)
+
+# Trabajos terminados que se conservan para consulta
+MAX_HISTORIAL = 50
+
+# Segundos mínimos entre escrituras del progreso en dbo.RecalculoTrabajos
+GUARDAR_PROGRESO_S = 1.0
+
+# Proceso que ejecuta los trabajos creados aquí
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+# Columnas de dbo.RecalculoTrabajos además de job_id; las de JSON_COLUMNAS van como JSON
+COLUMNAS = (
+    "estado",
+    "transportes",
+    "opciones",
+    "solicitudes",
+    "creado_en",
+    "iniciado_en",
+    "terminado_en",
+    "progreso",
+    "etapas",
+    "resumen",
+    "error",
+    "worker",
+)
+JSON_COLUMNAS = ("transportes", "opciones", "progreso", "etapas", "resumen")
+FECHA_COLUMNAS = ("creado_en", "iniciado_en", "terminado_en")
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recalculo")
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+# Ordena las escrituras en dbo.RecalculoTrabajos: la última escrita es la más reciente
+_escritura = threading.Lock()
+# Existencia confirmada de dbo.RecalculoTrabajos en este proceso (una vez creada no se borra)
+_tabla: Dict[str, bool] = {"existe": False}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia del estado para responder sin exponer el diccionario interno."""
+    copia = dict(job)
+    copia["progreso"] = dict(job["progreso"])
+    copia["etapas"] = dict(job["etapas"])
+    for key in [key for key in copia if key.startswith("_")]:
+        del copia[key]
+    return copia
+
+
+def _tabla_disponible(cursor: Any) -> bool:
+    if not _tabla["existe"]:
+        cursor.execute("SELECT OBJECT_ID('dbo.RecalculoTrabajos', 'U')")
+        row = cursor.fetchone()
+        _tabla["existe"] = bool(row and row[0])
+    return _tabla["existe"]
+
+
+def _a_fila(job: Dict[str, Any]) -> List[Any]:
+    """Valores de COLUMNAS para SQL Server: JSON y fechas UTC sin zona."""
+    valores = []
+    for columna in COLUMNAS:
+        valor = job[columna]
+        if columna in JSON_COLUMNAS and valor is not None:
+            valor = json.dumps(valor, default=str)
+        elif columna in FECHA_COLUMNAS and valor is not None:
+            valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+        elif columna == "error" and valor is not None:
+            valor = valor[:400]  # NVARCHAR(400), como dbo.RecalculoEjecuciones
+        valores.append(valor)
+    return valores
+
+
+def _de_fila(row: Sequence[Any]) -> Dict[str, Any]:
+    job = dict(zip(("job_id", *COLUMNAS), row))
+    for columna in JSON_COLUMNAS:
+        if job[columna] is not None:
+            job[columna] = json.loads(job[columna])
+    for columna in FECHA_COLUMNAS:
+        if job[columna] is not None:
+            job[columna] = job[columna].replace(tzinfo=timezone.utc)
+    return job
+
+
+def _guardar(job: Dict[str, Any]) -> None:
+    """Escribe el estado actual del trabajo en dbo.RecalculoTrabajos, si existe.
+
+    Un error aquí solo se registra: el trabajo sigue y este worker lo responde.
+    """
+    with _escritura:
+        with _lock:
+            copia = _snapshot(job)
+            job["_guardado"] = time.perf_counter()
+        try:
+            with connection_scope() as conn:
+                cursor = conn.cursor()
+                if not _tabla_disponible(cursor):
+                    return
+                valores = _a_fila(copia)
+                cursor.execute(
+                    f"UPDATE dbo.RecalculoTrabajos SET {', '.join(f'{c} = ?' for c in COLUMNAS)} WHERE job_id = ?",
+                    *valores,
+                    copia["job_id"],
+                )
+                if cursor.rowcount == 0:
+                    cursor.execute(
+                        f"INSERT INTO dbo.RecalculoTrabajos (job_id, {', '.join(COLUMNAS)}) "
+                        f"VALUES ({', '.join('?' * (len(COLUMNAS) + 1))})",
+                        copia["job_id"],
+                        *valores,
+                    )
+                conn.commit()
+        except Exception as exc:
+            logger.warning("No se pudo guardar el trabajo de recálculo %s: %s", copia["job_id"], exc)
+
+
+def _leer(consulta: str, *params: Any) -> List[Dict[str, Any]]:
+    """Trabajos de dbo.RecalculoTrabajos (`{columnas}` en la consulta); sin la tabla o sin base, ninguno."""
+    try:
+        with connection_scope() as conn:
+            cursor = conn.cursor()
+            if not _tabla_disponible(cursor):
+                return []
+            cursor.execute(consulta.format(columnas=", ".join(("job_id", *COLUMNAS))), *params)
+            return [_de_fila(row) for row in cursor.fetchall()]
+    except Exception as exc:
+        logger.warning("No se pudieron leer los trabajos de recálculo: %s", exc)
+        return []
+
+
+def _prune() -> None:
+    terminados = [job_id for job_id, job in _jobs.items() if job["estado"] not in ACTIVOS]
+    for job_id in terminados[: max(0, len(terminados) - MAX_HISTORIAL)]:
+        del _jobs[job_id]
+
+
+def _opciones(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Opciones del recálculo que distinguen un trabajo de otro (sin la conexión)."""
+    return {key: value for key, value in kwargs.items() if key != "conn"}
+
+
+def _on_progress(job: Dict[str, Any], etapa: str, completados: int, total: int) -> None:
+    ahora = time.perf_counter()
+    with _lock:
+        anterior = job["progreso"]["etapa"]
+        if anterior and anterior != etapa:
+            job["etapas"][f"{anterior}_s"] = round(
+                job["etapas"].get(f"{anterior}_s", 0.0) + ahora - job["_etapa_inicio"], 4
+            )
+        if anterior != etapa:
+            job["_etapa_inicio"] = ahora
+        job["progreso"] = {
+            "etapa": etapa,
+            "completados": completados,
+            "total": total,
+            "porcentaje": round(completados / total * 100, 1) if total else 100.0,
+        }
+        guardar = ahora - job.get("_guardado", 0.0) >= GUARDAR_PROGRESO_S
+    if guardar:
+        _guardar(job)
+
+
+def _run(job: Dict[str, Any], runner: Callable[..., Dict[str, Any]], kwargs: Dict[str, Any]) -> None:
+    with _lock:
+        job["estado"] = EN_PROCESO
+        job["iniciado_en"] = _now()
+    _guardar(job)
+    try:
+        resumen = runner(job["transportes"], progress=lambda *args: _on_progress(job, *args), **kwargs)
+    except Exception as exc:  # El error queda registrado en el trabajo
+        logger.exception("Error en recálculo %s (%s)", job["job_id"], ", ".join(job["transportes"]))
+        with _lock:
+            job["estado"] = ERROR
+            job["error"] = str(exc)
+            job["terminado_en"] = _now()
+        _guardar(job)
+        return
+    with _lock:
+        job["estado"] = COMPLETADO
+        job["resumen"] = resumen
+        job["terminado_en"] = _now()
+        job["etapas"]["total_s"] = round((job["terminado_en"] - job["iniciado_en"]).total_seconds(), 4)
+    _guardar(job)
+
+
+def submit(
+    transportes: Sequence[str],
+    runner: Callable[..., Dict[str, Any]],
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """Encola un recálculo o devuelve el trabajo activo que ya cubre esos transportes.
+
+    `runner` es `cost_engine.run_calculations` (o un envoltorio); se llama con
+    los transportes, `progress=` y `kwargs`.
+    """
+    solicitados = set(transportes)
+    with _lock:
+        activo = next(
+            (
+                job
+                for job in _jobs.values()
+                if job["estado"] in ACTIVOS
+                and solicitados <= set(job["transportes"])
+                and job["opciones"] == _opciones(kwargs)
+            ),
+            None,
+        )
+        if activo is not None:
+            activo["solicitudes"] += 1
+            respuesta = _snapshot(activo)
+    if activo is not None:
+        _guardar(activo)
+        return respuesta
+    with _lock:
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "estado": EN_COLA,
+            "transportes": list(transportes),
+            "opciones": _opciones(kwargs),
+            "solicitudes": 1,
+            "creado_en": _now(),
+            "iniciado_en": None,
+            "terminado_en": None,
+            "progreso": {"etapa": None, "completados": 0, "total": len(transportes), "porcentaje": 0.0},
+            "etapas": {},
+            "resumen": None,
+            "error": None,
+            "worker": WORKER,
+        }
+        _jobs[job["job_id"]] = job
+        _prune()
+        respuesta = _snapshot(job)
+    # Se guarda antes de encolar: la fila 'en_cola' no puede llegar después de la del hilo
+    _guardar(job)
+    _executor.submit(_run, job, runner, kwargs)
+    return respuesta
+
+
+def get_job(job_id: str) -> Dict[str, Any] | None:
+    """Trabajo de este worker o, si lo recibió otro, el guardado en dbo.RecalculoTrabajos."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job:
+            return _snapshot(job)
+    guardados = _leer("SELECT {columnas} FROM dbo.RecalculoTrabajos WHERE job_id = ?", job_id)
+    return guardados[0] if guardados else None
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    """Trabajos más recientes primero, de este worker y de dbo.RecalculoTrabajos."""
+    with _lock:
+        locales = {job_id: _snapshot(job) for job_id, job in _jobs.items()}
+    guardados = _leer(
+        "SELECT TOP (?) {columnas} FROM dbo.RecalculoTrabajos ORDER BY creado_en DESC", MAX_HISTORIAL
+    )
+    # Los de este worker van en memoria, más al día que su última escritura
+    trabajos = {**{job["job_id"]: job for job in guardados}, **locales}
+    return sorted(trabajos.values(), key=lambda job: job["creado_en"], reverse=True)
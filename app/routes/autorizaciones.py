@@ -24,8 +24,9 @@ ENDPOINTS:
 """
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Optional
-from .. import schemas, db
+from .. import schemas, db, precios_snapshot
 from ..auth import get_current_user
+from ..config import settings
 from datetime import datetime
 from ..logger import logger
 
@@ -70,17 +71,21 @@ def determinar_autorizador(precio_propuesto: float, sku: str, transporte: str, n
         - Está arriba de $15,682.56 (Subdir mín)
         - Autorizador: 'Subdireccion'
     """
-    cursor = conn.cursor()
-    
-    # Obtener precios del producto
-    cursor.execute("""
-        SELECT precio_base_mxn, precio_vendedor_min, precio_gerente_com_min, 
-               precio_subdireccion_min, precio_direccion_min
-        FROM PreciosCalculados
-        WHERE sku = ? AND transporte = ?
-    """, (sku, transporte))
-    
-    row = cursor.fetchone()
+    columnas = ("precio_base_mxn", "precio_vendedor_min", "precio_gerente_com_min",
+                "precio_subdireccion_min", "precio_direccion_min")
+    # Obtener precios del producto (foto en memoria si está al día con la bitácora; si no, la base)
+    snapshot = precios_snapshot.current_verificada(conn)
+    if snapshot is not None:
+        precio = snapshot.lookup(sku, transporte)
+        row = tuple(precio[columna] for columna in columnas) if precio else None
+    else:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
+            FROM {settings.precios_calculados}
+            WHERE sku = ? AND transporte = ?
+        """, (sku, transporte))
+        row = cursor.fetchone()
     if not row:
         logger.error(f"Producto no encontrado: sku={sku}, transporte={transporte}")
         raise HTTPException(
@@ -380,13 +385,13 @@ def obtener_solicitudes_pendientes(
 
     # Cada nivel ve solo las solicitudes que puede autorizar
     if getattr(current_user, 'rol', None) == 'Gerencia_Comercial':
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT s.id, s.sku, s.transporte, s.solicitante_id, s.solicitante, s.nivel_solicitante,
                    s.precio_propuesto, s.precio_minimo_actual, s.descuento_adicional_pct,
                    s.cliente, s.cantidad, s.justificacion, s.estado, s.autorizador_id, s.autorizador,
                    s.fecha_solicitud, s.fecha_respuesta, s.comentarios_autorizador
             FROM vw_SolicitudesAutorizacion s
-            INNER JOIN PreciosCalculados p ON s.sku = p.sku AND s.transporte = p.transporte
+            INNER JOIN {settings.precios_calculados} p ON s.sku = p.sku AND s.transporte = p.transporte
             WHERE s.estado = 'Pendiente' 
             AND s.nivel_solicitante = 'Vendedor'
             AND s.precio_propuesto >= p.precio_gerente_com_min
@@ -453,10 +458,10 @@ def aprobar_solicitud(
     cursor = conn.cursor()
     
     # Verificar que la solicitud existe y está pendiente
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT s.*, p.precio_gerente_com_min, p.precio_subdireccion_min, p.precio_direccion_min
         FROM SolicitudesAutorizacion s
-        INNER JOIN PreciosCalculados p ON s.sku = p.sku AND s.transporte = p.transporte
+        INNER JOIN {settings.precios_calculados} p ON s.sku = p.sku AND s.transporte = p.transporte
         WHERE s.id = ?
     """, (solicitud_id,))
     
@@ -574,10 +579,10 @@ def rechazar_solicitud(
     cursor = conn.cursor()
     
     # Verificar que la solicitud existe y está pendiente
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT s.estado, s.nivel_solicitante, s.precio_propuesto, p.precio_gerente_com_min, p.precio_subdireccion_min, p.precio_direccion_min
         FROM SolicitudesAutorizacion s
-        INNER JOIN PreciosCalculados p ON s.sku = p.sku AND s.transporte = p.transporte
+        INNER JOIN {settings.precios_calculados} p ON s.sku = p.sku AND s.transporte = p.transporte
         WHERE s.id = ?
     """, (solicitud_id,))
     row = cursor.fetchone()
@@ -1,38 +1,93 @@
-"""Rutas para exponer catálogos base."""
+"""Rutas para exponer catálogos base.
+
+Las respuestas llevan ETag con la versión de cada catálogo; con If-None-Match
+vigente se responde 304 sin leer el catálogo (ver app/versiones_datos.py).
+Cada ruta usa una sola conexión: la de `get_connection`, que FastAPI comparte
+con `get_current_user` dentro de la misma solicitud.
+/productos se puede pedir por páginas con `limite` y `cursor` (ver
+app/paginacion.py) y con solo algunos campos con `fields` (ver app/campos.py).
+Las listas se serializan sin pasar por response_model (ver app/serializacion.py).
+"""
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 
-from .. import schemas
+from .. import campos, paginacion, schemas, serializacion, versiones_datos
 from ..auth import get_current_user
+from ..config import settings
 from ..db import fetch_all, get_connection
 
 router = APIRouter(prefix="/catalog", tags=["Catalogos"])
 
 
+def _respuesta(modelo, rows: list[dict], etag: str | None, seleccion=None, encabezados=None) -> Response:
+    """Lista ya serializada con su ETag."""
+    cuerpo = serializacion.lista_json(modelo, rows, seleccion)
+    return versiones_datos.marcar(Response(cuerpo, media_type="application/json", headers=encabezados), etag)
+
+
+# Columnas de dbo.Productos que expone /productos (segmento_hospitalario no se lee)
+PRODUCTOS_COLUMNAS = [
+    "sku",
+    "descripcion",
+    "proveedor",
+    "origen",
+    "categoria",
+    "unidad",
+    "moneda_base",
+    "costo_base",
+    "fecha_actualizacion",
+    "activo",
+]
+
+
 @router.get("/productos", response_model=list[schemas.Producto])
-def list_productos(conn=Depends(get_connection), user=Depends(get_current_user)):
-    cursor = conn.cursor()
+def list_productos(
+    request: Request,
+    limite: int | None = Query(default=None, ge=1, le=settings.api_page_max, description="Filas por página"),
+    cursor: str | None = Query(default=None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    fields: str | None = Query(default=None, description="Campos separados por coma, p. ej. sku,descripcion"),
+    conn=Depends(get_connection),
+    user=Depends(get_current_user),
+):
+    """Productos en orden de SKU; con `limite` y `cursor` por páginas (ver app/paginacion.py).
+
+    `fields` limita los campos de cada fila (ver app/campos.py).
+    """
+    limite, despues = paginacion.pagina(limite, cursor, paginacion.CLAVE_PRODUCTOS)
+    seleccion = campos.elegir(fields, schemas.Producto, schemas.Producto.model_fields)
+    etag = versiones_datos.etag(versiones_datos.version_catalogo("productos", conn), "productos", limite, despues, seleccion)
+    if versiones_datos.no_modificado(request, etag):
+        return versiones_datos.respuesta_304(etag)
+    columnas = PRODUCTOS_COLUMNAS
+    if seleccion is not None:
+        columnas = [column for column in PRODUCTOS_COLUMNAS if column in seleccion or column == "sku"]
+    condicion, valores = paginacion.filtro_sql(despues, paginacion.CLAVE_PRODUCTOS)
+    orden = paginacion.orden_sql(paginacion.CLAVE_PRODUCTOS)
+    clausula, tope = paginacion.limite_sql(limite)
     rows = fetch_all(
-        cursor,
-        """
-        SELECT sku, descripcion, proveedor, origen, categoria, unidad, moneda_base, 
-               costo_base, fecha_actualizacion, activo
+        conn.cursor(),
+        f"""
+        SELECT {', '.join(columnas)}
         FROM dbo.Productos
-        ORDER BY sku
+        WHERE 1=1{condicion}{orden}{clausula}
         """,
+        valores + tope,
     )
-    return rows
+    rows, siguiente = paginacion.recortar(rows, limite, paginacion.CLAVE_PRODUCTOS)
+    return _respuesta(schemas.Producto, rows, etag, seleccion, paginacion.encabezados(siguiente))
 
 
 # Endpoint /costos eliminado - los costos ahora están en /productos (tabla Productos.costo_base)
 
 
 @router.get("/parametros", response_model=list[schemas.ParametroImportacion])
-def list_parametros(conn=Depends(get_connection), user=Depends(get_current_user)):
-    cursor = conn.cursor()
+def list_parametros(request: Request, conn=Depends(get_connection), user=Depends(get_current_user)):
+    etag = versiones_datos.etag(versiones_datos.version_catalogo("parametros", conn), "parametros")
+    if versiones_datos.no_modificado(request, etag):
+        return versiones_datos.respuesta_304(etag)
     rows = fetch_all(
-        cursor,
+        conn.cursor(),
         """
         SELECT concepto, tipo, valor, descripcion, notas
         FROM dbo.ParametrosImportacion
@@ -40,21 +95,23 @@ def list_parametros(conn=Depends(get_connection), user=Depends(get_current_user)
         ORDER BY concepto
         """,
     )
-    return rows
+    return _respuesta(schemas.ParametroImportacion, rows, etag)
 
 
 @router.get("/tipos-cambio", response_model=list[schemas.TipoCambio])
-def list_tipos_cambio(conn=Depends(get_connection), user=Depends(get_current_user)):
-    cursor = conn.cursor()
+def list_tipos_cambio(request: Request, conn=Depends(get_connection), user=Depends(get_current_user)):
+    etag = versiones_datos.etag(versiones_datos.version_catalogo("tipos_cambio", conn), "tipos_cambio")
+    if versiones_datos.no_modificado(request, etag):
+        return versiones_datos.respuesta_304(etag)
     rows = fetch_all(
-        cursor,
+        conn.cursor(),
         """
         SELECT moneda, fecha, tipo_cambio_mxn, fuente
         FROM dbo.TiposCambio
         ORDER BY moneda, fecha DESC
         """,
     )
-    return rows
+    return _respuesta(schemas.TipoCambio, rows, etag)
 
 
 # Endpoint eliminado: /margenes (tabla PoliticasMargen eliminada)
@@ -1,10 +1,17 @@
 """Rutas API para consulta de cálculos de pricing y generación de listas de precios.
 
 Endpoints:
-- GET /pricing/landed: Consulta Landed Cost calculados por SKU/transporte
+- GET /pricing/landed: Consulta Landed Cost calculados por SKU/transporte (paginado con limite/cursor, campos con fields)
 - GET /pricing/lista: Consulta precios de venta por SKU/cliente
-- GET /pricing/listas: Consulta precios con campos específicos por rol del usuario
-- POST /pricing/recalcular: Ejecuta recálculo completo de precios para un transporte
+- GET /pricing/listas: Consulta precios con campos específicos por rol del usuario (paginado con limite/cursor, campos con fields)
+- POST /pricing/lookup: Niveles de precio de varios pares (sku, transporte) en una sola solicitud
+- GET /pricing/listas/moneda/{moneda}: Niveles de precio ya convertidos a otra moneda (USD, EUR...)
+- POST /pricing/recalculate: Encola el recálculo de precios (responde de inmediato con el trabajo)
+- GET /pricing/recalculate/{job_id}: Estado, progreso y tiempos por etapa de un recálculo
+- GET /pricing/versiones: Versiones de precios guardadas (persistencia versionada)
+- POST /pricing/versiones/{version_id}/publicar: Revierte los precios a una versión guardada
+- POST /pricing/simulate: Simula precios con tipos de cambio/parámetros modificados (sin guardar)
+- POST /pricing/sensitivity: Malla SKU × escenarios de tipo de cambio en CSV o Parquet
 
 Control de acceso por rol:
 - Vendedor: Solo ve Precio Máximo y su Precio Mínimo (sin costos)
@@ -12,41 +19,152 @@ Control de acceso por rol:
 """
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+import csv
+import io
+from itertools import islice
 
-from .. import schemas
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+
+from .. import (
+    cache_respuestas,
+    campos,
+    metrics,
+    paginacion,
+    precios_snapshot,
+    recalculo_jobs,
+    schemas,
+    serializacion,
+    versiones_datos,
+)
 from ..auth import get_current_user
 from ..config import settings
 from ..db import fetch_all, get_connection
-from cost_engine import run_calculations
+from cost_engine import (
+    ENGINES,
+    PRICE_TIER_COLUMNS,
+    SnapshotFile,
+    columns_to_rows,
+    current_price_columns,
+    get_reference_snapshot,
+    fx_scenarios,
+    invalidate_reference_snapshot,
+    iter_fx_grid,
+    iter_fx_grid_blocks,
+    list_price_versions,
+    normalize_transportes,
+    publish_price_version,
+    record_publication,
+    run_calculations,
+    simulate_prices,
+    simulation_mask,
+    summarize_price_delta,
+    write_snapshot_file,
+)
 
 router = APIRouter(prefix="/pricing", tags=["Pricing"])
 
+# Campos de costo que no ve el rol Vendedor
+CAMPOS_COSTO = (
+    "costo_base_mxn",
+    "flete_pct",
+    "seguro_pct",
+    "arancel_pct",
+    "dta_pct",
+    "honorarios_aduanales_pct",
+    "landed_cost_mxn",
+)
+
+SIMULACION_COLUMNAS = list(schemas.SimulacionPrecio.model_fields)
+
+LANDED_COLUMNAS = list(schemas.LandedCost.model_fields)
+
+# Alias de /pricing/listas -> columna de la que se copian (ver _presentar_listas)
+ALIAS_LISTAS = {"precio_maximo_lista": "precio_maximo", "precio_minimo_lista": "precio_vendedor_min"}
+
+DESCRIPCION_FIELDS = "Campos separados por coma, p. ej. sku,precio_maximo_lista,precio_minimo_lista"
+
+
+def _columnas(todas: list[str], seleccion: tuple[str, ...] | None) -> list[str]:
+    """Columnas a leer para `seleccion`: los campos pedidos, sus fuentes y la clave de paginación."""
+    if seleccion is None:
+        return todas
+    necesarias = set(paginacion.CLAVE_PRECIOS) | {ALIAS_LISTAS.get(campo, campo) for campo in seleccion}
+    return [column for column in todas if column in necesarias]
+
+# Límite de escenarios por solicitud de /pricing/sensitivity
+MAX_ESCENARIOS = 2000
+# Límite de pares (sku, transporte) por solicitud de /pricing/lookup (2 parámetros SQL por par)
+MAX_CONSULTA_PRECIOS = 500
+FORMATOS_SENSIBILIDAD = ("csv", "parquet")
+
+
+def _landed_json(
+    conn,
+    snapshot,
+    sku: str | None,
+    transporte: str | None,
+    limite: int | None,
+    despues: tuple | None,
+    seleccion: tuple[str, ...] | None,
+) -> tuple[bytes, dict[str, str]]:
+    columnas = _columnas(LANDED_COLUMNAS, seleccion)
+    # Con la foto binaria compartida (PRICING_ARCHIVO_FOTO) no se consulta la base
+    if isinstance(snapshot, SnapshotFile):
+        filas = snapshot.rows(
+            sku,
+            transporte,
+            tabla="landed",
+            despues=despues,
+            limite=None if limite is None else limite + 1,
+            columnas=columnas,
+        )
+    else:
+        query = f"""
+            SELECT {', '.join(columnas)}
+            FROM dbo.LandedCostCache
+            WHERE 1=1
+        """
+        params: list[object] = []
+        if sku:
+            query += " AND sku = ?"
+            params.append(sku)
+        if transporte:
+            query += " AND transporte = ?"
+            params.append(transporte)
+        condicion, valores = paginacion.filtro_sql(despues, paginacion.CLAVE_PRECIOS)
+        clausula, tope = paginacion.limite_sql(limite)
+        query += condicion + paginacion.orden_sql(paginacion.CLAVE_PRECIOS) + clausula
+        filas = fetch_all(conn.cursor(), query, params + valores + tope)
+    filas, siguiente = paginacion.recortar(filas, limite, paginacion.CLAVE_PRECIOS)
+    return serializacion.lista_json(schemas.LandedCost, filas, seleccion), paginacion.encabezados(siguiente)
+
 
 @router.get("/landed", response_model=list[schemas.LandedCost])
 def list_landed_cost(
+    request: Request,
     sku: str | None = Query(default=None, description="Filtra por SKU exacto"),
     transporte: str | None = Query(default=None, description="Filtra por Transporte (Maritimo/Aereo)"),
+    limite: int | None = Query(default=None, ge=1, le=settings.api_page_max, description="Filas por página"),
+    cursor: str | None = Query(default=None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    fields: str | None = Query(default=None, description=DESCRIPCION_FIELDS),
     conn=Depends(get_connection),
     user=Depends(get_current_user),
 ):
-    cursor = conn.cursor()
-    query = """
-        SELECT sku, transporte, origen, moneda_base, costo_base, tc_mxn, costo_base_mxn,
-               flete_pct, seguro_pct, arancel_pct, dta_pct, honorarios_aduanales_pct,
-               gastos_aduana_mxn, landed_cost_mxn, mark_up, calculado_en
-        FROM dbo.LandedCostCache
-        WHERE 1=1
+    """Landed Cost calculado por SKU/transporte (respuesta en caché por versión de precios).
+
+    Paginado por (sku, transporte) con `limite` y `cursor` (ver app/paginacion.py);
+    `fields` limita los campos de cada fila (ver app/campos.py).
     """
-    params: list[str] = []
-    if sku:
-        query += " AND sku = ?"
-        params.append(sku)
-    if transporte:
-        query += " AND transporte = ?"
-        params.append(transporte)
-    query += " ORDER BY sku"
-    return fetch_all(cursor, query, params)
+    sku, transporte = sku or None, transporte or None
+    limite, despues = paginacion.pagina(limite, cursor, paginacion.CLAVE_PRECIOS)
+    seleccion = campos.elegir(fields, schemas.LandedCost, LANDED_COLUMNAS)
+    return cache_respuestas.respuesta_json(
+        request,
+        "landed",
+        (sku, transporte, limite, despues, seleccion, cache_respuestas.clase_rol(user["rol"])),
+        lambda snapshot: _landed_json(conn, snapshot, sku, transporte, limite, despues, seleccion),
+    )
 
 
 @router.get("/lista", response_model=list[schemas.PrecioVenta])
@@ -72,25 +190,317 @@ def list_precios(
         query += " AND tipo_cliente = ?"
         params.append(tipo_cliente)
     query += " ORDER BY sku, tipo_cliente"
-    return fetch_all(cursor, query, params)
+    filas = fetch_all(cursor, query, params)
+    return Response(serializacion.lista_json(schemas.PrecioVenta, filas), media_type="application/json")
 
 
-@router.post("/recalculate", response_model=schemas.RecalculateResponse)
+def _recalcular(transportes, progress=None, **kwargs):
+    try:
+        summary = run_calculations(transportes, progress=progress, **kwargs)
+    except Exception:
+        metrics.recalc_runs.inc(resultado="error")
+        raise
+    metrics.observe_recalculation(summary)
+    # La foto de /pricing/simulate y la de precios deben reflejar los nuevos precios
+    invalidate_reference_snapshot()
+    precios_snapshot.invalidate()
+    # Un recálculo suele seguir a una carga de catálogo: se relee su versión sin esperar al TTL
+    versiones_datos.invalidate_catalogos()
+    return summary
+
+
+@router.post("/recalculate", response_model=schemas.RecalculoJob, status_code=202)
 def recalculate_pricing(
     payload: schemas.RecalculateRequest,
+    user=Depends(get_current_user),
+):
+    """
+    Encola el recálculo y responde de inmediato con el trabajo (202). El
+    recálculo usa su propia conexión en segundo plano; si ya hay un trabajo en
+    cola o en proceso para esos transportes se devuelve ese mismo trabajo.
+    """
+    transportes = normalize_transportes(payload.transportes or payload.transporte or settings.default_transporte)
+    monedas = payload.monedas or settings.default_monedas
+    motor = payload.motor or settings.pricing_engine
+    if motor not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"Motor de cálculo inválido: {motor}")
+    if not transportes:
+        raise HTTPException(status_code=400, detail="Debe indicarse al menos un transporte")
+    return recalculo_jobs.submit(
+        transportes,
+        _recalcular,
+        monedas_precio=list(monedas),
+        engine=motor,
+        incremental=payload.incremental,
+        persist_mode=settings.pricing_persist_mode,
+        batch_size=settings.pricing_batch_size,
+        tolerance=settings.pricing_diff_tolerance,
+        fecha_corte=payload.fecha_tipo_cambio,
+        keep_versions=settings.pricing_keep_versions,
+        derived_tiers=settings.pricing_precios_derivados,
+        snapshot_file=settings.pricing_snapshot_file or None,
+    )
+
+
+@router.get("/recalculate", response_model=list[schemas.RecalculoJob])
+def list_recalculations(user=Depends(get_current_user)):
+    """Trabajos de recálculo recientes (más recientes primero)."""
+    return recalculo_jobs.list_jobs()
+
+
+@router.get("/recalculate/{job_id}", response_model=schemas.RecalculoJob)
+def get_recalculation(job_id: str, user=Depends(get_current_user)):
+    job = recalculo_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de recálculo no encontrado")
+    return job
+
+
+# Roles que pueden revertir precios a una versión anterior
+ROLES_PUBLICAR_VERSION = ("admin", "Admin", "Direccion")
+
+
+@router.get("/versiones", response_model=list[schemas.PrecioVersion])
+def get_price_versions(
+    transporte: str | None = Query(default=None, description="Filtra por Transporte (Maritimo/Aereo)"),
     conn=Depends(get_connection),
     user=Depends(get_current_user),
 ):
+    """Versiones de precios guardadas (persistencia versionada); `actual` marca la publicada."""
+    return list_price_versions(conn.cursor(), transporte)
+
+
+@router.post("/versiones/{version_id}/publicar", response_model=schemas.PrecioVersion)
+def publish_version(
+    version_id: int,
+    conn=Depends(get_connection),
+    user=Depends(get_current_user),
+):
+    """Vuelve a publicar una versión guardada (revertir precios); el cambio es atómico."""
+    if user["rol"] not in ROLES_PUBLICAR_VERSION:
+        raise HTTPException(status_code=403, detail="No tiene permisos para publicar versiones de precios")
+    cursor = conn.cursor()
+    try:
+        transporte = publish_price_version(cursor, version_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    record_publication(cursor, transporte)
+    conn.commit()
+    if settings.pricing_snapshot_file:
+        write_snapshot_file(cursor, settings.pricing_snapshot_file, settings.precios_calculados)
+    invalidate_reference_snapshot()
+    precios_snapshot.invalidate()
+    return next(v for v in list_price_versions(cursor, transporte) if v["version_id"] == version_id)
+
+
+@router.post("/simulate", response_model=schemas.SimulacionResponse)
+def simulate_pricing(
+    payload: schemas.SimulacionRequest,
+    conn=Depends(get_connection),
+    user=Depends(get_current_user),
+):
+    """
+    Simula precios con tipos de cambio y/o parámetros de importación distintos
+    a los vigentes. Calcula en memoria sobre la foto de referencia (se relee
+    cada PRICING_REFERENCE_TTL segundos) y compara contra PreciosCalculados;
+    no modifica ninguna tabla.
+    """
     transporte = payload.transporte or settings.default_transporte
-    monedas = payload.monedas or settings.default_monedas
-    summary = run_calculations(transporte, monedas, conn)
-    return summary
+    snapshot = get_reference_snapshot(conn, settings.pricing_reference_ttl)
+    mask = simulation_mask(snapshot["product_columns"], payload.skus, payload.categorias)
+    simulado = simulate_prices(snapshot, transporte, payload.tipos_cambio, payload.parametros, mask)
+    actuales = current_price_columns(conn, snapshot, transporte, settings.precios_calculados)
+    if mask is not None:
+        actuales = {column: values[mask] for column, values in actuales.items()}
+    resultado = summarize_price_delta(simulado, actuales)
+    resultado["transporte"] = transporte
+    if payload.detalle:
+        detalle = columns_to_rows(simulado, SIMULACION_COLUMNAS)
+        if user["rol"] == "Vendedor":
+            for r in detalle:
+                r["landed_cost_mxn"] = None
+        resultado["detalle"] = detalle
+    return resultado
+
+
+class _SalidaParquet:
+    """Destino de ParquetWriter que acumula los bytes escritos hasta `vaciar()`.
+
+    ParquetWriter solo necesita write/tell/flush/close; `tell` cuenta todo lo
+    escrito para que los offsets del footer sean los del archivo completo.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.partes: list[bytes] = []
+        self.posicion = 0
+
+    def write(self, datos) -> int:
+        datos = bytes(datos)
+        self.partes.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self.posicion
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def vaciar(self) -> bytes:
+        datos, self.partes = b"".join(self.partes), []
+        return datos
+
+
+@router.post("/sensitivity")
+def fx_sensitivity(
+    payload: schemas.SensibilidadRequest,
+    conn=Depends(get_connection),
+    user=Depends(get_current_user),
+):
+    """
+    Tabla de sensibilidad: Landed Cost y niveles de precio de cada SKU para
+    cada escenario de tipo de cambio (p. ej. USD de 16.00 a 22.00 en pasos de
+    0.25). Se calcula en memoria por bloques de SKUs y se entrega en streaming
+    como CSV o Parquet (un row group por bloque; 501 sin pyarrow); no
+    modifica ninguna tabla.
+    """
+    if payload.formato not in FORMATOS_SENSIBILIDAD:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {payload.formato}")
+    transporte = payload.transporte or settings.default_transporte
+    rangos = {r.moneda: (r.desde, r.hasta, r.paso) for r in payload.rangos}
+    try:
+        monedas, escenarios = fx_scenarios(rangos)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if len(escenarios) > MAX_ESCENARIOS:
+        raise HTTPException(status_code=400, detail=f"Demasiados escenarios ({len(escenarios)}); máximo {MAX_ESCENARIOS}")
+    columnas = list(PRICE_TIER_COLUMNS)
+    if user["rol"] != "Vendedor":
+        columnas.insert(0, "landed_cost_mxn")
+    encabezado = ["sku", "escenario", *(f"tc_{moneda.lower()}" for moneda in monedas), *columnas]
+
+    if payload.formato == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise HTTPException(status_code=501, detail="El formato parquet requiere pyarrow instalado")
+
+    snapshot = get_reference_snapshot(conn, settings.pricing_reference_ttl)
+    mask = simulation_mask(snapshot["product_columns"], payload.skus, payload.categorias)
+    nombre = f"sensibilidad_{transporte.lower()}"
+
+    if payload.formato == "parquet":
+        tipos = {"sku": pa.string(), "escenario": pa.int32()}
+        esquema = pa.schema([(name, tipos.get(name, pa.float64())) for name in encabezado])
+        bloques = iter_fx_grid_blocks(snapshot, transporte, rangos, columnas, mask, settings.pricing_batch_size)
+
+        def generar_parquet():
+            # Un row group por bloque de SKUs; cada uno se envía en cuanto se escribe
+            salida = _SalidaParquet()
+            with pq.ParquetWriter(salida, esquema) as writer:
+                for bloque in bloques:
+                    writer.write_table(pa.Table.from_arrays(bloque, schema=esquema))
+                    yield salida.vaciar()
+            yield salida.vaciar()
+
+        return StreamingResponse(
+            generar_parquet(),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="{nombre}.parquet"'},
+        )
+
+    filas = iter_fx_grid(snapshot, transporte, rangos, columnas, mask, settings.pricing_batch_size)
+
+    def generar_csv():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(encabezado)
+        while bloque := list(islice(filas, settings.pricing_batch_size)):
+            escritor.writerows(bloque)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        generar_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.csv"'},
+    )
+
+
+def _presentar_listas(resultados: list[dict], rol: str) -> list[dict]:
+    """Oculta costos al Vendedor y agrega los nombres de campo de lista."""
+    # Si el usuario es Vendedor, ocultar campos de costos
+    if rol == "Vendedor":
+        for r in resultados:
+            for campo in CAMPOS_COSTO:
+                r[campo] = None
+    # Map legacy field names to new "lista" names for compatibility
+    for r in resultados:
+        # precio_maximo_lista is the new name for precio_maximo
+        r['precio_maximo_lista'] = r.get('precio_maximo')
+        # precio_minimo_lista maps to precio_vendedor_min (seller minimum)
+        r['precio_minimo_lista'] = r.get('precio_vendedor_min')
+    return resultados
+
+
+def _campos_listas(rol: str) -> list[str]:
+    """Campos de /pricing/listas que puede pedir el rol: el Vendedor no ve costos."""
+    return [campo for campo in schemas.ListaPrecio.model_fields if rol != "Vendedor" or campo not in CAMPOS_COSTO]
+
+
+def _listas_json(
+    conn,
+    snapshot,
+    sku: str | None,
+    transporte: str | None,
+    limite: int | None,
+    despues: tuple | None,
+    seleccion: tuple[str, ...] | None,
+    rol: str,
+) -> tuple[bytes, dict[str, str]]:
+    columnas = _columnas(precios_snapshot.COLUMNAS, seleccion)
+    if snapshot is not None:
+        filas = snapshot.rows(
+            sku, transporte, despues=despues, limite=None if limite is None else limite + 1, columnas=columnas
+        )
+    else:
+        query = f"""
+            SELECT {', '.join(f"p.{column}" for column in columnas)}
+            FROM {settings.precios_calculados} p
+            WHERE 1=1
+        """
+        params: list[object] = []
+        if sku:
+            query += " AND p.sku = ?"
+            params.append(sku)
+        if transporte:
+            query += " AND p.transporte = ?"
+            params.append(transporte)
+        condicion, valores = paginacion.filtro_sql(despues, paginacion.CLAVE_PRECIOS, alias="p.")
+        clausula, tope = paginacion.limite_sql(limite)
+        query += condicion + paginacion.orden_sql(paginacion.CLAVE_PRECIOS, alias="p.") + clausula
+        filas = fetch_all(conn.cursor(), query, params + valores + tope)
+    filas, siguiente = paginacion.recortar(filas, limite, paginacion.CLAVE_PRECIOS)
+    filas = _presentar_listas(filas, rol)
+    return serializacion.lista_json(schemas.ListaPrecio, filas, seleccion), paginacion.encabezados(siguiente)
 
 
 @router.get("/listas", response_model=list[schemas.ListaPrecio])
 def get_listas_precios(
+    request: Request,
     sku: str | None = Query(default=None, description="Filtra por SKU"),
     transporte: str | None = Query(default=None, description="Filtra por Transporte (Maritimo/Aereo)"),
+    limite: int | None = Query(default=None, ge=1, le=settings.api_page_max, description="Filas por página"),
+    cursor: str | None = Query(default=None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    fields: str | None = Query(default=None, description=DESCRIPCION_FIELDS),
     conn=Depends(get_connection),
     user=Depends(get_current_user),
 ):
@@ -101,48 +511,102 @@ def get_listas_precios(
     - Gerente Comercial: 25% descuento del Precio Máximo
     - Subdirección: 30% descuento del Precio Máximo
     - Dirección: 35% descuento del Precio Máximo
+
+    Se sirve de la foto de precios en memoria; solo consulta la base de datos
+    mientras la foto no está vigente (ver app/precios_snapshot.py). La
+    respuesta serializada queda en caché por SKU, transporte y clase de rol
+    hasta el siguiente recálculo (ver app/cache_respuestas.py). Con `limite` y
+    `cursor` se entrega por páginas en orden (sku, transporte) (ver
+    app/paginacion.py). `fields` limita los campos de cada fila a los que el
+    rol puede ver (ver app/campos.py).
     """
-    cursor = conn.cursor()
+    sku, transporte = sku or None, transporte or None
+    limite, despues = paginacion.pagina(limite, cursor, paginacion.CLAVE_PRECIOS)
+    seleccion = campos.elegir(fields, schemas.ListaPrecio, _campos_listas(user["rol"]))
+    return cache_respuestas.respuesta_json(
+        request,
+        "listas",
+        (sku, transporte, limite, despues, seleccion, cache_respuestas.clase_rol(user["rol"])),
+        lambda snapshot: _listas_json(conn, snapshot, sku, transporte, limite, despues, seleccion, user["rol"]),
+    )
+
+
+@router.post("/lookup", response_model=list[schemas.PrecioConsultado])
+def lookup_precios(
+    payload: schemas.ConsultaPreciosRequest,
+    conn=Depends(get_connection),
+    user=Depends(get_current_user),
+):
+    """
+    Niveles de precio de varios pares (sku, transporte) en una sola solicitud,
+    con los mismos campos y el mismo ocultamiento por rol que /pricing/listas.
+
+    Responde un resultado por par en el orden de la solicitud; los SKUs sin
+    precio calculado vienen con `encontrado: false`. Se resuelve con la foto de
+    precios en memoria o, si no está vigente, con una sola consulta que une los
+    pares contra la llave (sku, transporte).
+    """
+    if len(payload.items) > MAX_CONSULTA_PRECIOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Demasiados SKUs ({len(payload.items)}); máximo {MAX_CONSULTA_PRECIOS}",
+        )
+    pares = [(item.sku.strip(), (item.transporte or settings.default_transporte).strip()) for item in payload.items]
+    # Un par por clave normalizada: la base compara sin distinguir mayúsculas ni espacios finales
+    unicos = list({_clave_par(*par): par for par in pares}.values())
+    snapshot = precios_snapshot.current()
+    if snapshot is not None:
+        encontrados = [fila for fila in (snapshot.lookup(sku, transporte) for sku, transporte in unicos) if fila]
+    elif unicos:
+        valores = ", ".join(["(?, ?)"] * len(unicos))
+        query = f"""
+            SELECT {', '.join(f"p.{column}" for column in precios_snapshot.COLUMNAS)}
+            FROM (VALUES {valores}) AS c(sku, transporte)
+            INNER JOIN {settings.precios_calculados} p ON p.sku = c.sku AND p.transporte = c.transporte
+        """
+        encontrados = fetch_all(conn.cursor(), query, [valor for par in unicos for valor in par])
+    else:
+        encontrados = []
+    precios = {_clave_par(fila["sku"], fila["transporte"]): fila for fila in _presentar_listas(encontrados, user["rol"])}
+    resultados = []
+    for sku, transporte in pares:
+        precio = precios.get(_clave_par(sku, transporte))
+        resultados.append({"sku": sku, "transporte": transporte, "encontrado": precio is not None, "precio": precio})
+    return resultados
+
+
+def _clave_par(sku: str, transporte: str) -> tuple[str, str]:
+    return precios_snapshot.clave(sku), precios_snapshot.clave(transporte)
+
+
+@router.get("/listas/moneda/{moneda}", response_model=list[schemas.ListaPrecioMoneda])
+def get_listas_precios_moneda(
+    moneda: str,
+    sku: str | None = Query(default=None, description="Filtra por SKU"),
+    transporte: str | None = Query(default=None, description="Filtra por Transporte (Maritimo/Aereo)"),
+    conn=Depends(get_connection),
+    user=Depends(get_current_user),
+):
+    """Listas de precios en otra moneda, ya convertidas por el recálculo (`--moneda-precio`).
+
+    Lee PreciosCalculadosMoneda por su llave (moneda_precio, transporte, sku);
+    no convierte nada por consulta. Los precios en MXN siguen en /pricing/listas.
+    """
+    moneda = moneda.strip().upper()
     query = """
-        SELECT p.sku, p.transporte, p.landed_cost_mxn, p.precio_base_mxn,
-               p.precio_maximo, p.precio_vendedor_min,
-               p.precio_gerente_com_min, p.precio_subdireccion_min,
-               p.precio_direccion_min,
-               p.markup_pct, p.fecha_calculo,
-               p.costo_base_mxn, p.flete_pct, p.seguro_pct, 
-               p.arancel_pct, p.dta_pct, p.honorarios_aduanales_pct, p.categoria
-        FROM dbo.PreciosCalculados p
-        WHERE 1=1
+        SELECT sku, transporte, moneda_precio, tc_mxn, precio_base, precio_maximo,
+               precio_vendedor_min, precio_gerente_com_min, precio_subdireccion_min,
+               precio_direccion_min, fecha_calculo
+        FROM dbo.PreciosCalculadosMoneda
+        WHERE moneda_precio = ?
     """
-    params: list[str] = []
-    if sku:
-        query += " AND p.sku = ?"
-        params.append(sku)
+    params: list[str] = [moneda]
     if transporte:
-        query += " AND p.transporte = ?"
+        query += " AND transporte = ?"
         params.append(transporte)
-    query += " ORDER BY p.sku, p.transporte"
-    resultados = fetch_all(cursor, query, params)
-    # Si el usuario es Vendedor, ocultar campos de costos
-    if user["rol"] == "Vendedor":
-        for r in resultados:
-            r["costo_base_mxn"] = None
-            r["flete_pct"] = None
-            r["seguro_pct"] = None
-            r["arancel_pct"] = None
-            r["dta_pct"] = None
-            r["honorarios_aduanales_pct"] = None
-            r["landed_cost_mxn"] = None
-    # Map legacy field names to new "lista" names for compatibility
-    for r in resultados:
-        # precio_maximo_lista is the new name for precio_maximo
-        try:
-            r['precio_maximo_lista'] = r.get('precio_maximo') if r.get('precio_maximo') is not None else None
-        except Exception:
-            r['precio_maximo_lista'] = None
-        # precio_minimo_lista maps to precio_vendedor_min (seller minimum)
-        try:
-            r['precio_minimo_lista'] = r.get('precio_vendedor_min') if r.get('precio_vendedor_min') is not None else None
-        except Exception:
-            r['precio_minimo_lista'] = None
-    return resultados
+    if sku:
+        query += " AND sku = ?"
+        params.append(sku)
+    query += " ORDER BY sku, transporte"
+    filas = fetch_all(conn.cursor(), query, params)
+    return Response(serializacion.lista_json(schemas.ListaPrecioMoneda, filas), media_type="application/json")
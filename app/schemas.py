@@ -1,7 +1,7 @@
 
 from __future__ import annotations
 # Esquema para cotización PDF del rol vendedor
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 
 
@@ -123,12 +123,106 @@ class PrecioVenta(BaseModel):
 
 class RecalculateRequest(BaseModel):
     transporte: str = Field(default="Maritimo")
+    transportes: List[str] | None = None  # Varios transportes en una sola pasada (tiene prioridad sobre `transporte`)
     monedas: List[str] | None = None
+    motor: Optional[str] = None  # "filas" o "vectorizado"; por defecto settings.pricing_engine
+    incremental: bool = False  # Solo SKUs con cambios desde la última ejecución
+    fecha_tipo_cambio: Optional[date] = None  # Tipo de cambio vigente en esta fecha (por defecto el más reciente)
 
 
 class RecalculateResponse(BaseModel):
     landed_rows: int
     price_rows: int
+    currency_price_rows: Optional[int] = None  # Filas en PreciosCalculadosMoneda (SKUs × monedas destino)
+    monedas_precio: Optional[List[str]] = None  # Monedas destino además de MXN
+    modo: Optional[str] = None  # "completo" o "incremental"
+    skipped_rows: Optional[int] = None  # SKUs sin cambios que no se recalcularon
+    deleted_rows: Optional[int] = None  # SKUs eliminados de Productos
+    timings: Optional[Dict[str, float]] = None  # Segundos por etapa (fetch_s, build_s, landed_compute_s, ...)
+    stages: Optional[Dict[str, Dict[str, float | int]]] = None  # Por etapa: seconds y rows
+    transportes: Optional[Dict[str, Dict[str, Any]]] = None  # Resumen por transporte
+    escritura: Optional[Dict[str, Dict[str, int]]] = None  # Persistencia diferencial: inserted/updated/unchanged/deleted por tabla
+    versiones: Optional[Dict[str, int]] = None  # Persistencia versionada: version_id publicado por transporte
+
+
+class PrecioVersion(BaseModel):
+    """Versión inmutable de PreciosCalculados (persistencia versionada)"""
+    version_id: int
+    transporte: str
+    creado_en: datetime
+    publicado_en: Optional[datetime] = None
+    filas: Optional[int] = None
+    actual: bool = False  # Es la versión que leen las rutas
+
+
+class RecalculoProgreso(BaseModel):
+    etapa: Optional[str] = None  # lectura, calculo, persistencia, completado
+    completados: int = 0  # Transportes terminados
+    total: int = 0
+    porcentaje: float = 0.0
+
+
+class RecalculoJob(BaseModel):
+    """Trabajo de recálculo en segundo plano"""
+    job_id: str
+    estado: str  # en_cola, en_proceso, completado, error
+    transportes: List[str]
+    opciones: Dict[str, Any]
+    solicitudes: int  # Solicitudes atendidas por este trabajo (incluye duplicadas)
+    creado_en: datetime
+    iniciado_en: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+    progreso: RecalculoProgreso
+    etapas: Dict[str, float]  # Segundos por etapa (lectura_s, calculo_s, persistencia_s, total_s)
+    resumen: Optional[RecalculateResponse] = None
+    error: Optional[str] = None
+    worker: Optional[str] = None  # equipo:pid del worker de la API que lo ejecuta
+
+
+class SimulacionRequest(BaseModel):
+    """Escenario what-if: se calcula en memoria y no se guarda nada"""
+    transporte: Optional[str] = None  # Por defecto settings.default_transporte
+    tipos_cambio: Dict[str, float] = Field(default_factory=dict)  # {"USD": 19.5}
+    parametros: Dict[str, float] = Field(default_factory=dict)  # {"arancel": 0.2, "maritimo_equipo": 0.08}
+    skus: List[str] | None = None
+    categorias: List[str] | None = None
+    detalle: bool = False  # Incluir precios simulados por SKU
+
+
+class SimulacionPrecio(BaseModel):
+    sku: str
+    categoria: Optional[str]
+    landed_cost_mxn: Optional[float]
+    precio_base_mxn: Optional[float]
+    precio_maximo: Optional[float]
+    precio_vendedor_min: Optional[float]
+    precio_gerente_com_min: Optional[float]
+    precio_subdireccion_min: Optional[float]
+    precio_direccion_min: Optional[float]
+
+
+class SimulacionResponse(BaseModel):
+    transporte: str
+    productos: int  # SKUs simulados
+    comparados: int  # SKUs con precio vigente en PreciosCalculados
+    columnas: Dict[str, Dict[str, Optional[float]]]  # actual / simulado / delta / delta_pct por columna
+    detalle: Optional[List[SimulacionPrecio]] = None
+
+
+class RangoTipoCambio(BaseModel):
+    moneda: str  # "USD"
+    desde: float = Field(gt=0)
+    hasta: float = Field(gt=0)
+    paso: float = Field(gt=0)
+
+
+class SensibilidadRequest(BaseModel):
+    """Malla de sensibilidad: precios por SKU para cada escenario de tipo de cambio"""
+    transporte: Optional[str] = None  # Por defecto settings.default_transporte
+    rangos: List[RangoTipoCambio] = Field(min_length=1)  # Varias monedas se combinan (producto cartesiano)
+    skus: List[str] | None = None
+    categorias: List[str] | None = None
+    formato: str = "csv"  # "csv" o "parquet" (requiere pyarrow)
 
 
 class ListaPrecio(BaseModel):
@@ -158,6 +252,39 @@ class ListaPrecio(BaseModel):
     categoria: Optional[str]
 
 
+class ConsultaPrecio(BaseModel):
+    sku: str
+    transporte: Optional[str] = None  # Por defecto settings.default_transporte
+
+
+class ConsultaPreciosRequest(BaseModel):
+    """Pares (sku, transporte) de una cotización; se resuelven en una sola consulta"""
+    items: List[ConsultaPrecio]
+
+
+class PrecioConsultado(BaseModel):
+    """Resultado de un par en el orden de la solicitud; `precio` es None si no hay precio calculado"""
+    sku: str
+    transporte: str
+    encontrado: bool
+    precio: Optional[ListaPrecio] = None
+
+
+class ListaPrecioMoneda(BaseModel):
+    """Niveles de precio convertidos a una moneda destino (PreciosCalculadosMoneda)"""
+    sku: str
+    transporte: str
+    moneda_precio: str
+    tc_mxn: float  # Tipo de cambio usado en el cálculo
+    precio_base: Optional[float]
+    precio_maximo: Optional[float]
+    precio_vendedor_min: Optional[float]
+    precio_gerente_com_min: Optional[float]
+    precio_subdireccion_min: Optional[float]
+    precio_direccion_min: Optional[float]
+    fecha_calculo: Optional[datetime]
+
+
 class SolicitudAutorizacionCreate(BaseModel):
     """Schema para crear solicitud de autorización"""
     sku: str
@@ -0,0 +1,61 @@
+"""Serialización de listas de filas a bytes JSON para las rutas de catálogo y pricing.
+
+`lista_json(modelo, filas, campos)` reemplaza el `response_model` de las
+rutas de listas (que además pasa por jsonable_encoder y json.dumps):
+- Por defecto valida las filas con el esquema y serializa con pydantic-core;
+  el resultado es el mismo que con response_model.
+- Con API_JSON_RAPIDO=1 y orjson instalado no valida: cada fila se proyecta a
+  los campos del esquema, en su orden (los que falten van como null), y se
+  serializa directo con orjson. Solo es válido porque las filas ya traen los
+  tipos del esquema: salen de la foto de precios o de columnas tipadas de
+  SQL Server. Los Decimal se escriben como número y los enteros de campos
+  float sin decimales.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from . import campos as campos_seleccion
+from .config import settings
+from .logger import logger
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin orjson se usa pydantic
+    orjson = None
+
+if settings.api_json_rapido and orjson is None:
+    logger.warning("API_JSON_RAPIDO requiere orjson instalado; se serializa con pydantic")
+
+
+@lru_cache(maxsize=None)
+def _adaptador(modelo: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(list[modelo])
+
+
+def _decimal(valor: Any) -> float:
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def rapido() -> bool:
+    """True si las listas se serializan con orjson sin validar."""
+    return settings.api_json_rapido and orjson is not None
+
+
+def lista_json(modelo: Type[BaseModel], filas: List[Dict[str, Any]], campos: Tuple[str, ...] | None = None) -> bytes:
+    """Bytes JSON de `filas` con los campos de `modelo` (o solo `campos`, ver app/campos.py)."""
+    if rapido():
+        nombres = campos or tuple(modelo.model_fields)
+        return orjson.dumps(
+            [{nombre: fila.get(nombre) for nombre in nombres} for fila in filas],
+            default=_decimal,
+            option=orjson.OPT_UTC_Z,
+        )
+    adapter = _adaptador(modelo) if campos is None else campos_seleccion.adaptador(modelo, campos)
+    return adapter.dump_json(adapter.validate_python(filas))
@@ -0,0 +1,107 @@
+"""Versiones de datos para ETags y GET condicional (If-None-Match -> 304).
+
+- Catálogos (Productos, ParametrosImportacion, TiposCambio): COUNT_BIG(*) y
+  MAX(version_fila) de cada tabla (columna ROWVERSION de
+  sql/create_versiones_catalogo.sql). Cada worker la lee como máximo una vez
+  cada CATALOGO_VERSION_TTL segundos (60 por defecto) y entre lecturas un 304
+  no toca la base, así que un cambio hecho fuera de este worker (Scripts/,
+  SSMS, otro worker) puede tardar hasta ese plazo en cambiar la etiqueta. Las
+  escrituras desde la API llaman `invalidate_catalogos`. Si la versión no se
+  puede leer (falta la columna, falla la conexión) la ruta responde sin ETag
+  y el fallo también se guarda por el mismo plazo.
+- Precios: versión de la foto vigente (`precios_snapshot.current().version`),
+  que cambia con cada recálculo o publicación.
+
+La etiqueta combina la versión con la ruta, los filtros y la clase de rol, así
+el mismo valor siempre corresponde a los mismos bytes (ETag fuerte). Las
+respuestas llevan `Cache-Control: private, no-cache`: el navegador y el
+service worker pueden guardarlas pero revalidan cada vez, y la revalidación
+cuesta un 304 sin cuerpo.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .config import settings
+from .logger import logger
+
+CACHE_CONTROL = "private, no-cache"
+
+# Versión por catálogo: filas y rowversion más alto de la tabla completa. Un
+# cambio en filas que la ruta no devuelve (parámetros no vigentes) también
+# cambia la etiqueta; solo cuesta una respuesta completa de más.
+VERSIONES = {
+    "productos": "SELECT COUNT_BIG(*), MAX(version_fila) FROM dbo.Productos",
+    "parametros": "SELECT COUNT_BIG(*), MAX(version_fila) FROM dbo.ParametrosImportacion",
+    "tipos_cambio": "SELECT COUNT_BIG(*), MAX(version_fila) FROM dbo.TiposCambio",
+}
+
+_lock = threading.Lock()
+_versiones: Dict[str, Tuple[str | None, float]] = {}
+
+
+def version_catalogo(nombre: str, conn) -> str | None:
+    """Versión vigente del catálogo o None si no se pudo leer (la ruta responde sin ETag).
+
+    `conn` es la conexión de la solicitud (la misma de `get_current_user`).
+    """
+    with _lock:
+        guardada = _versiones.get(nombre)
+    if guardada is not None and time.monotonic() - guardada[1] <= settings.catalog_version_ttl:
+        return guardada[0]
+    version: str | None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(VERSIONES[nombre])
+        filas, maxima = cursor.fetchone()
+        version = f"{filas}-{bytes(maxima).hex() if maxima is not None else 0}"
+    except Exception:
+        # Sin ETag hasta el siguiente intento; no se reintenta en cada solicitud
+        logger.exception("No se pudo leer la versión del catálogo %s", nombre)
+        version = None
+    with _lock:
+        _versiones[nombre] = (version, time.monotonic())
+    return version
+
+
+def invalidate_catalogos() -> None:
+    """Obliga a releer las versiones en la siguiente solicitud (llamar tras escribir un catálogo)."""
+    with _lock:
+        _versiones.clear()
+
+
+def etag(version: str | None, *partes: Any) -> str | None:
+    """ETag fuerte de la representación: versión de datos + ruta, filtros y clase de rol."""
+    if version is None:
+        return None
+    texto = "|".join(str(parte) for parte in (version, *partes))
+    return '"' + hashlib.blake2b(texto.encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def no_modificado(request: Request, valor: str | None) -> bool:
+    """True si If-None-Match ya trae `valor` (comparación débil, como pide RFC 9110)."""
+    if valor is None:
+        return False
+    encabezado = request.headers.get("if-none-match")
+    if not encabezado:
+        return False
+    etiquetas = [etiqueta.strip().removeprefix("W/") for etiqueta in encabezado.split(",")]
+    return "*" in etiquetas or valor in etiquetas
+
+
+def marcar(response: Response, valor: str | None) -> Response:
+    """Agrega ETag y Cache-Control a la respuesta."""
+    if valor is not None:
+        response.headers["ETag"] = valor
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def respuesta_304(valor: str) -> Response:
+    return marcar(Response(status_code=304), valor)
@@ -3,8 +3,8 @@
 Este módulo es el núcleo del sistema de cálculo de precios. Realiza:
 
 1. CÁLCULO DE LANDED COST:
-   - Lee costos base de productos desde dbo.Productos
-   - Aplica tasas de cambio desde dbo.TiposCambio
+   - Lee costos base de productos activos desde dbo.Productos
+   - Aplica el último tipo de cambio por moneda de dbo.TiposCambio
    - Agrega costos de importación según tipo de transporte:
      * Aéreo: +10% flete, +seguros, +aranceles, +DTA, +honorarios aduanales
      * Marítimo: +5% flete, +seguros, +aranceles, +DTA, +honorarios aduanales
@@ -22,25 +22,101 @@ Este módulo es el núcleo del sistema de cálculo de precios. Realiza:
 Ejecución:
   python cost_engine.py --transporte Maritimo
   python cost_engine.py --transporte Aereo
+  python cost_engine.py --transporte Maritimo --motor vectorizado
+  python cost_engine.py --transporte Maritimo --incremental
+  python cost_engine.py --transporte Maritimo --transporte Aereo   (una sola lectura y transacción)
+  python cost_engine.py --transporte Maritimo --persistencia staging --tamano-lote 5000
+  python cost_engine.py --transporte Maritimo --persistencia diferencial --tolerancia 0.01
+  python cost_engine.py --transporte Maritimo --persistencia versionada --versiones-retenidas 3
+  python cost_engine.py --publicar-version 41   (revierte a una versión guardada)
+  python cost_engine.py --transporte Maritimo --precios-derivados
+  python cost_engine.py --transporte Maritimo --archivo-foto data/precios.snap
+  python cost_engine.py --transporte Maritimo --streaming --tamano-lote 10000
+  python cost_engine.py --transporte Maritimo --transporte Aereo --procesos 4 --particion sku
+  python cost_engine.py --transporte Maritimo --fecha-tc 2026-03-31
+  python cost_engine.py --transporte Maritimo --moneda-precio USD --moneda-precio EUR
+
+Motores de cálculo:
+- filas: recorre cada producto como diccionario (implementación original).
+- vectorizado: carga Productos en columnas NumPy, resuelve tipo de cambio y
+  flete una sola vez por moneda/categoría y calcula Landed Cost y Mark-up con
+  expresiones de arreglos. Produce exactamente las mismas filas.
 
 Nota: Los cálculos son incrementales por tipo de transporte (no se eliminan
-datos de otros transportes al recalcular).
+datos de otros transportes al recalcular). Con --incremental además solo se
+recalculan los SKUs afectados por cambios desde la última ejecución
+(requiere sql/create_recalculo_entradas.sql); sin la bandera se recalcula todo.
 """
 from __future__ import annotations
 
 import argparse
-from datetime import datetime, timezone
-from decimal import Decimal
-from typing import Any, Dict, Iterable, List, Sequence, Tuple
+import json
+import mmap
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
 
 import os
+import numpy as np
 import pyodbc
 
 # Use centralized DB connector
-from app.db import connect as get_connection
+from app.db import connect as get_connection, fetch_all
 
 PRICE_MIN_MULTIPLIER = 1.10
 
+ENGINES = ("filas", "vectorizado")
+
+LANDED_COLUMNS = [
+    "sku",
+    "transporte",
+    "origen",
+    "categoria",
+    "moneda_base",
+    "costo_base",
+    "tc_mxn",
+    "costo_base_mxn",
+    "flete_pct",
+    "seguro_pct",
+    "arancel_pct",
+    "dta_pct",
+    "honorarios_aduanales_pct",
+    "gastos_aduana_mxn",
+    "landed_cost_mxn",
+    "mark_up",
+    "calculado_en",
+]
+
+# Parámetros que afectan a todos los SKUs de un transporte
+GLOBAL_PARAMS = ("seguro", "arancel", "dta", "honorarios_aduanales", "mark_up")
+
+PRICE_COLUMNS = [
+    "sku",
+    "transporte",
+    "landed_cost_mxn",
+    "precio_base_mxn",
+    "precio_maximo",
+    "precio_vendedor_min",
+    "precio_gerente_com_min",
+    "precio_subdireccion_min",
+    "precio_direccion_min",
+    "markup_pct",
+    "costo_base_mxn",
+    "flete_pct",
+    "seguro_pct",
+    "arancel_pct",
+    "dta_pct",
+    "honorarios_aduanales_pct",
+    "categoria",
+    "fecha_calculo",
+]
+
 
 # Note: `get_connection()` is provided by `app.db.connect` alias above
 
@@ -51,26 +127,125 @@ def fetch_dicts(cursor: pyodbc.Cursor, query: str) -> List[Dict[str, Any]]:
     return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 
-def fetch_reference_data(cursor: pyodbc.Cursor) -> Dict[str, Any]:
+def fetch_columns(cursor: pyodbc.Cursor, query: str, params: Sequence[Any] | None = None) -> Dict[str, List[Any]]:
+    """Ejecuta la consulta y devuelve un diccionario columna -> lista de valores."""
+    cursor.execute(query, params or ())
+    columns = [col[0] for col in cursor.description]
+    rows = cursor.fetchall()
+    if not rows:
+        return {column: [] for column in columns}
+    return {column: list(values) for column, values in zip(columns, zip(*rows))}
+
+
+PRODUCTOS_SELECT = (
+    "sku, origen, categoria, moneda_base, costo_base, fecha_actualizacion, "
+    "Segmento_Hospitalario AS segmento_hospitalario"
+)
+
+# Solo productos activos entran al cálculo
+PRODUCTOS_ACTIVOS = "activo = 1"
+
+# Último tipo de cambio por moneda (opcionalmente vigente a una fecha): el
+# servidor resuelve la ventana con el índice (moneda, fecha) y solo viaja una
+# fila por moneda, sin importar cuánto histórico tenga TiposCambio.
+TIPOS_CAMBIO_VIGENTES = """
+    SELECT moneda, tipo_cambio_mxn, fecha
+    FROM (
+        SELECT moneda, tipo_cambio_mxn, fecha,
+               ROW_NUMBER() OVER (PARTITION BY moneda ORDER BY fecha DESC) AS rn
+        FROM dbo.TiposCambio
+        {where}
+    ) AS t
+    WHERE rn = 1
+"""
+
+
+def fetch_latest_fx(cursor: pyodbc.Cursor, fecha_corte: date | None = None) -> List[Dict[str, Any]]:
+    """Tipo de cambio más reciente por moneda; con `fecha_corte`, el vigente ese día."""
+    if fecha_corte is None:
+        cursor.execute(TIPOS_CAMBIO_VIGENTES.format(where=""))
+    else:
+        cursor.execute(TIPOS_CAMBIO_VIGENTES.format(where="WHERE fecha <= ?"), fecha_corte)
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def fetch_reference_data(
+    cursor: pyodbc.Cursor,
+    columnar: bool = False,
+    include_productos: bool = True,
+    fecha_corte: date | None = None,
+) -> Dict[str, Any]:
+    """Lee Productos activos, parámetros vigentes y el último tipo de cambio por moneda.
+
+    Con `columnar=True` los productos se devuelven como columnas (dict de
+    listas) listas para `productos_to_columns`, sin crear un dict por fila.
+    Con `include_productos=False` solo se leen las tablas pequeñas (el modo
+    streaming recorre Productos por lotes con `iter_productos_batches`).
+    Con `fecha_corte` se usa el tipo de cambio vigente ese día.
+    """
     data = {}
-    # Ahora los costos están en la tabla Productos
-    data["productos"] = fetch_dicts(
-        cursor,
-        "SELECT sku, origen, categoria, moneda_base, costo_base, fecha_actualizacion, Segmento_Hospitalario AS segmento_hospitalario FROM dbo.Productos",
-    )
+    if include_productos:
+        # Ahora los costos están en la tabla Productos
+        fetch_productos = fetch_columns if columnar else fetch_dicts
+        data["productos"] = fetch_productos(
+            cursor, f"SELECT {PRODUCTOS_SELECT} FROM dbo.Productos WHERE {PRODUCTOS_ACTIVOS}"
+        )
     data["parametros"] = fetch_dicts(
         cursor,
         "SELECT concepto, tipo, valor FROM dbo.ParametrosImportacion WHERE vigente_hasta IS NULL",
     )
-    data["tipos_cambio"] = fetch_dicts(
+    data["tipos_cambio"] = fetch_latest_fx(cursor, fecha_corte)
+    data["listas"] = fetch_dicts(
         cursor,
-        "SELECT moneda, tipo_cambio_mxn, fecha FROM dbo.TiposCambio",
+        """
+        SELECT nombre_lista, margen_min_pct, margen_max_pct, orden_jerarquia
+        FROM ListasPrecios
+        WHERE activa = 1
+        ORDER BY orden_jerarquia DESC
+        """,
     )
     # Tablas PoliticasMargen y Versiones eliminadas
     data["margenes"] = []
     return data
 
 
+def iter_productos_batches(
+    cursor: pyodbc.Cursor,
+    batch_size: int,
+    columnar: bool = False,
+) -> Iterator[List[Dict[str, Any]] | Dict[str, List[Any]]]:
+    """Recorre los Productos activos en lotes de `batch_size` filas ordenadas por SKU.
+
+    Cada lote es una consulta independiente (paginación por llave sobre la PK
+    `sku`), así no queda un result set abierto mientras el writer usa la misma
+    conexión para escribir el lote anterior, y la memoria depende solo del
+    tamaño del lote.
+    """
+    ultimo_sku = None
+    while True:
+        if ultimo_sku is None:
+            batch = fetch_columns(
+                cursor,
+                f"SELECT TOP (?) {PRODUCTOS_SELECT} FROM dbo.Productos WHERE {PRODUCTOS_ACTIVOS} ORDER BY sku",
+                [batch_size],
+            )
+        else:
+            batch = fetch_columns(
+                cursor,
+                f"SELECT TOP (?) {PRODUCTOS_SELECT} FROM dbo.Productos "
+                f"WHERE {PRODUCTOS_ACTIVOS} AND sku > ? ORDER BY sku",
+                [batch_size, ultimo_sku],
+            )
+        size = len(batch["sku"])
+        if not size:
+            return
+        ultimo_sku = batch["sku"][-1]
+        yield batch if columnar else [dict(zip(batch, values)) for values in zip(*batch.values())]
+        if size < batch_size:
+            return
+
+
 def normalize_number(value: Any, default: float = 0.0) -> float:
     if value is None:
         return default
@@ -127,6 +302,30 @@ def split_parametros(param_rows: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, fl
     return porcentajes, fijos
 
 
+def resolve_flete_pct(pct_params: Dict[str, float], transporte_key: str, categoria: str) -> float:
+    """Porcentaje de flete para un producto importado según transporte y categoría."""
+    # Buscar un parámetro específico por transporte+categoria (ej: 'aereo_equipo')
+    cat_key = f"{transporte_key}_{categoria}" if categoria else None
+    flete_param = None
+    if cat_key:
+        flete_param = pct_params.get(cat_key)
+    # Si no hay por categoria, buscar por transporte general
+    if flete_param is None:
+        flete_param = pct_params.get(transporte_key)
+    if flete_param is not None:
+        try:
+            return float(flete_param)
+        except Exception:
+            return 0.0
+    # Caer al comportamiento por categoría (compatibilidad)
+    if categoria in ["equipo", "insumo"]:
+        if transporte_key == "aereo":
+            return 0.10
+        if transporte_key == "maritimo":
+            return 0.05
+    return 0.0
+
+
 def calculate_landed_costs(
     productos: Iterable[Dict[str, Any]],
     cost_map: Dict[str, Dict[str, Any]],
@@ -134,6 +333,7 @@ def calculate_landed_costs(
     pct_params: Dict[str, float],
     fixed_params: Dict[str, float],
     transporte: str,
+    calculado_en: datetime | None = None,
 ) -> List[Dict[str, Any]]:
     transporte_key = transporte.strip().lower()
     seguro_pct = pct_params.get("seguro", 0.0)
@@ -159,31 +359,7 @@ def calculate_landed_costs(
             origen = 'importado'
         # Aplicar flete para productos importados; preferir valores en ParametrosImportacion
         if origen == "importado":
-            # Buscar un parámetro específico por transporte+categoria (ej: 'aereo_equipo')
-            cat_key = f"{transporte_key}_{categoria}" if categoria else None
-            flete_param = None
-            if cat_key:
-                flete_param = pct_params.get(cat_key)
-            # Si no hay por categoria, buscar por transporte general
-            if flete_param is None:
-                flete_param = pct_params.get(transporte_key)
-            if flete_param is not None:
-                try:
-                    flete_pct = float(flete_param)
-                except Exception:
-                    flete_pct = 0.0
-            else:
-                # Caer al comportamiento por categoría (compatibilidad)
-                if categoria in ["equipo", "insumo"]:
-                    if transporte_key == "aereo":
-                        flete_pct = 0.10
-                    elif transporte_key == "maritimo":
-                        flete_pct = 0.05
-                    else:
-                        flete_pct = 0.0
-                else:
-                    flete_pct = 0.0
-
+            flete_pct = resolve_flete_pct(pct_params, transporte_key, categoria)
             # Fórmula: Costo_Base_MXN × (1 + Flete% + Seguro% + Arancel% + DTA% + Honorarios_Aduanales%)
             landed = costo_base_mxn * (1 + flete_pct + seguro_pct + arancel_pct + dta_pct + honorarios_aduanales_pct)
         else:
@@ -212,18 +388,398 @@ def calculate_landed_costs(
                 "gastos_aduana_mxn": 0.0,  # Ya no se usa este concepto
                 "landed_cost_mxn": landed,
                 "mark_up": mark_up,
-                "calculado_en": datetime.now(timezone.utc),
+                "calculado_en": calculado_en or datetime.now(timezone.utc),
             }
         )
     return landed_rows
 
 
+# ---------------------------------------------------------------------------
+# Motor vectorizado (columnas NumPy)
+# ---------------------------------------------------------------------------
+
+
+def _factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Codifica valores repetidos como enteros; devuelve (códigos, valores únicos).
+
+    Las columnas de texto de Productos (moneda, categoría, origen) tienen muy
+    pocos valores distintos, así que normalizar cada valor único una sola vez
+    evita el strip/lower por fila.
+    """
+    lookup: Dict[Any, int] = {}
+    codes = np.fromiter(
+        (lookup.setdefault(value, len(lookup)) for value in values),
+        dtype=np.intp,
+        count=len(values),
+    )
+    return codes, list(lookup)
+
+
+def _to_float_array(values: Sequence[Any], default: float = 0.0) -> np.ndarray:
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Valores nulos o texto con separadores: normalizar uno por uno
+        return np.fromiter(
+            (normalize_number(value, default) for value in values),
+            dtype=np.float64,
+            count=len(values),
+        )
+
+
+def productos_to_columns(productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]]) -> Dict[str, Any]:
+    """Convierte Productos (lista de dicts o columnas) en arreglos codificados.
+
+    Devuelve un diccionario con:
+    - sku: arreglo de objetos con el SKU sin espacios
+    - costo_base: float64
+    - moneda_codes / moneda_labels: moneda normalizada (strip + upper, MXN por defecto)
+    - categoria_codes / categoria_labels: categoría normalizada (strip + lower)
+    - origen_codes / origen_labels: valor crudo de origen (se conserva para persistir)
+    """
+    if isinstance(productos, Mapping):
+        columns = productos
+    else:
+        rows = list(productos)
+        columns = {
+            name: [row.get(name) for row in rows]
+            for name in ("sku", "origen", "categoria", "moneda_base", "costo_base")
+        }
+
+    moneda_codes, moneda_raw = _factorize(columns["moneda_base"])
+    categoria_codes, categoria_raw = _factorize(columns["categoria"])
+    origen_codes, origen_raw = _factorize(columns["origen"])
+    return {
+        "sku": np.array([sku.strip() for sku in columns["sku"]], dtype=object),
+        "costo_base": _to_float_array(columns["costo_base"]),
+        "moneda_codes": moneda_codes,
+        "moneda_labels": [(value or "MXN").strip().upper() for value in moneda_raw],
+        "categoria_codes": categoria_codes,
+        "categoria_labels": [(value or "").strip().lower() for value in categoria_raw],
+        "origen_codes": origen_codes,
+        "origen_labels": origen_raw,
+    }
+
+
+def import_factors(
+    product_columns: Mapping[str, Any],
+    pct_params: Dict[str, float],
+    transporte: str,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Por SKU: si es importado, su flete y el factor que multiplica al costo en MXN.
+
+    El factor no depende del tipo de cambio, así que también sirve para
+    evaluar varios escenarios de tipo de cambio a la vez (`calculate_fx_grid`).
+    """
+    transporte_key = transporte.strip().lower()
+    moneda_labels = product_columns["moneda_labels"]
+    origen_codes = product_columns["origen_codes"]
+    # Resolver flete y origen una sola vez por valor distinto
+    flete_por_categoria = np.array(
+        [resolve_flete_pct(pct_params, transporte_key, categoria) for categoria in product_columns["categoria_labels"]],
+        dtype=np.float64,
+    )
+    origen_norm = [(value or "").strip().lower() for value in product_columns["origen_labels"]]
+    origen_importado = np.array([origen == "importado" for origen in origen_norm], dtype=bool)
+    origen_vacio = np.array([not origen for origen in origen_norm], dtype=bool)
+    moneda_extranjera = np.array([bool(moneda) and moneda != "MXN" for moneda in moneda_labels], dtype=bool)
+
+    # Sin origen explícito se considera importado cuando la moneda no es MXN
+    importado = origen_importado[origen_codes] | (
+        origen_vacio[origen_codes] & moneda_extranjera[product_columns["moneda_codes"]]
+    )
+    flete_pct = np.where(importado, flete_por_categoria[product_columns["categoria_codes"]], 0.0)
+    # Mismo orden de sumas que el motor por filas para obtener resultados idénticos
+    factor = (
+        1.0
+        + flete_pct
+        + pct_params.get("seguro", 0.0)
+        + pct_params.get("arancel", 0.0)
+        + pct_params.get("dta", 0.0)
+        + pct_params.get("honorarios_aduanales", 0.0)
+    )
+    return importado, flete_pct, factor
+
+
+def calculate_landed_columns(
+    product_columns: Mapping[str, Any],
+    fx_map: Dict[str, float],
+    pct_params: Dict[str, float],
+    fixed_params: Dict[str, float],
+    transporte: str,
+    calculado_en: datetime | None = None,
+) -> Dict[str, Any]:
+    """Versión vectorizada de `calculate_landed_costs`.
+
+    Recibe la salida de `productos_to_columns` y devuelve las columnas de
+    LandedCostCache: arreglos NumPy para los valores por SKU y escalares para
+    los valores comunes (transporte, porcentajes globales, fecha de cálculo).
+    """
+    seguro_pct = pct_params.get("seguro", 0.0)
+    arancel_pct = pct_params.get("arancel", 0.0)
+    dta_pct = pct_params.get("dta", 0.0)
+    honorarios_aduanales_pct = pct_params.get("honorarios_aduanales", 0.0)
+    markup_pct = pct_params.get("mark_up", 0.1)
+
+    moneda_codes = product_columns["moneda_codes"]
+    moneda_labels = product_columns["moneda_labels"]
+    categoria_codes = product_columns["categoria_codes"]
+    categoria_labels = product_columns["categoria_labels"]
+    origen_codes = product_columns["origen_codes"]
+    origen_labels = product_columns["origen_labels"]
+
+    # Resolver tipo de cambio una sola vez por moneda distinta
+    tc_por_moneda = np.array([fx_map.get(moneda, 1.0) for moneda in moneda_labels], dtype=np.float64)
+    tc = tc_por_moneda[moneda_codes]
+    costo_base = product_columns["costo_base"]
+    costo_base_mxn = costo_base * tc
+    importado, flete_pct, factor = import_factors(product_columns, pct_params, transporte)
+    landed = np.where(importado, costo_base_mxn * factor, costo_base_mxn)
+    mark_up = landed * (1 + markup_pct)
+
+    return {
+        "sku": product_columns["sku"],
+        "transporte": transporte,
+        "origen": np.array(origen_labels, dtype=object)[origen_codes],
+        "categoria": np.array(categoria_labels, dtype=object)[categoria_codes],
+        "moneda_base": np.array(moneda_labels, dtype=object)[moneda_codes],
+        "costo_base": costo_base,
+        "tc_mxn": tc,
+        "costo_base_mxn": costo_base_mxn,
+        "flete_pct": flete_pct,
+        "seguro_pct": seguro_pct,
+        "arancel_pct": arancel_pct,
+        "dta_pct": dta_pct,
+        "honorarios_aduanales_pct": honorarios_aduanales_pct,
+        "gastos_aduana_mxn": 0.0,
+        "landed_cost_mxn": landed,
+        "mark_up": mark_up,
+        "calculado_en": calculado_en or datetime.now(timezone.utc),
+    }
+
+
+def iter_column_tuples(columns: Mapping[str, Any], names: Sequence[str]) -> Iterator[Tuple[Any, ...]]:
+    """Recorre columnas (arreglos o escalares) como tuplas en el orden de `names`."""
+    size = len(columns["sku"])
+    series = [
+        columns[name].tolist() if isinstance(columns[name], np.ndarray) else repeat(columns[name], size)
+        for name in names
+    ]
+    return zip(*series)
+
+
+def columns_to_rows(columns: Mapping[str, Any], names: Sequence[str]) -> List[Dict[str, Any]]:
+    return [dict(zip(names, values)) for values in iter_column_tuples(columns, names)]
+
+
+def calculate_landed_costs_vectorized(
+    productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]],
+    cost_map: Dict[str, Dict[str, Any]],
+    fx_map: Dict[str, float],
+    pct_params: Dict[str, float],
+    fixed_params: Dict[str, float],
+    transporte: str,
+    calculado_en: datetime | None = None,
+) -> List[Dict[str, Any]]:
+    """Misma firma y salida que `calculate_landed_costs`, calculada por columnas."""
+    landed_columns = calculate_landed_columns(
+        productos_to_columns(productos),
+        fx_map,
+        pct_params,
+        fixed_params,
+        transporte,
+        calculado_en,
+    )
+    return columns_to_rows(landed_columns, LANDED_COLUMNS)
+
+
+# Multiplicadores de la jerarquía de precios sobre el Precio Máximo
+PRECIO_MAXIMO_MULTIPLIER = 2
+TIER_MULTIPLIERS = {
+    "precio_vendedor_min": 0.80,  # Vendedor: 20% descuento
+    "precio_gerente_com_min": 0.75,  # Gerente Comercial: 25% descuento
+    "precio_subdireccion_min": 0.70,  # Subdirección: 30% descuento
+    "precio_direccion_min": 0.65,  # Dirección: 35% descuento
+}
+
+# Columnas de precio que se comparan contra PreciosCalculados
+PRICE_TIER_COLUMNS = ("precio_base_mxn", "precio_maximo", *TIER_MULTIPLIERS)
+
+CENTAVO = Decimal("0.01")
+
+
+def round_money(value: float) -> float:
+    """Redondea a centavos como SQL Server al guardar en DECIMAL(18,6) y convertir a DECIMAL(18,2).
+
+    Los niveles de precio se derivan del Landed Cost y del mark-up ya en
+    centavos, como cuando se leían de LandedCostCache; así coinciden con la
+    vista vPreciosDerivados y no se mueven ±0.01 por el redondeo.
+    """
+    return float(Decimal(f"{value:.6f}").quantize(CENTAVO, ROUND_HALF_UP))
+
+
+def round_money_array(values: np.ndarray) -> np.ndarray:
+    """`round_money` vectorizado (mitad lejos de cero, sobre el valor a 6 decimales)."""
+    values = np.round(np.asarray(values, dtype=np.float64), 6)
+    # values * 100 tiene a lo más 4 decimales; redondear a 4 evita 100.4999... por el binario
+    centavos = np.floor(np.round(np.abs(values) * 100, 4) + 0.5)
+    return np.copysign(centavos / 100, values)
+
+
+def build_price_rows(
+    landed_rows: Iterable[Dict[str, Any]],
+    markup_pct: float,
+    fecha_calculo: datetime | None = None,
+) -> List[Dict[str, Any]]:
+    """Construye las filas de PreciosCalculados a partir de filas de Landed Cost en memoria.
+
+    Nueva lógica de precios:
+    - Precio Máximo = Mark-up × 2
+    - Vendedor: 20% descuento del Precio Máximo
+    - Gerente Comercial: 25% descuento del Precio Máximo
+    - Subdirección: 30% descuento del Precio Máximo
+    - Dirección: 35% descuento del Precio Máximo
+    """
+    fecha_calculo = fecha_calculo or datetime.now(timezone.utc)
+    price_rows: List[Dict[str, Any]] = []
+    for item in landed_rows:
+        precio_base = round_money(normalize_number(item.get("mark_up"), 0.0))  # Mark-up ya calculado
+        precio_maximo = precio_base * PRECIO_MAXIMO_MULTIPLIER
+        row = {
+            "sku": item["sku"],
+            "transporte": item["transporte"],
+            "landed_cost_mxn": round_money(normalize_number(item.get("landed_cost_mxn"), 0.0)),
+            "precio_base_mxn": precio_base,
+            "precio_maximo": precio_maximo,
+        }
+        for column, multiplier in TIER_MULTIPLIERS.items():
+            row[column] = precio_maximo * multiplier
+        row.update(
+            {
+                "markup_pct": markup_pct,
+                "costo_base_mxn": normalize_number(item.get("costo_base_mxn"), 0.0),
+                "flete_pct": normalize_number(item.get("flete_pct"), 0.0),
+                "seguro_pct": normalize_number(item.get("seguro_pct"), 0.0),
+                "arancel_pct": normalize_number(item.get("arancel_pct"), 0.0),
+                "dta_pct": normalize_number(item.get("dta_pct"), 0.0),
+                "honorarios_aduanales_pct": normalize_number(item.get("honorarios_aduanales_pct"), 0.0),
+                "categoria": item.get("categoria") or "",
+                "fecha_calculo": fecha_calculo,
+            }
+        )
+        price_rows.append(row)
+    return price_rows
+
+
+def calculate_price_columns(
+    landed_columns: Mapping[str, Any],
+    markup_pct: float,
+    fecha_calculo: datetime | None = None,
+) -> Dict[str, Any]:
+    """Versión vectorizada de `build_price_rows` sobre la salida de `calculate_landed_columns`."""
+    precio_base = round_money_array(landed_columns["mark_up"])
+    precio_maximo = precio_base * PRECIO_MAXIMO_MULTIPLIER
+    columns: Dict[str, Any] = {
+        "sku": landed_columns["sku"],
+        "transporte": landed_columns["transporte"],
+        "landed_cost_mxn": round_money_array(landed_columns["landed_cost_mxn"]),
+        "precio_base_mxn": precio_base,
+        "precio_maximo": precio_maximo,
+    }
+    for column, multiplier in TIER_MULTIPLIERS.items():
+        columns[column] = precio_maximo * multiplier
+    for column in ("costo_base_mxn", "flete_pct", "seguro_pct", "arancel_pct", "dta_pct", "honorarios_aduanales_pct", "categoria"):
+        columns[column] = landed_columns[column]
+    columns["markup_pct"] = markup_pct
+    columns["fecha_calculo"] = fecha_calculo or datetime.now(timezone.utc)
+    return columns
+
+
+# PreciosCalculados está en MXN; las demás monedas destino van a PreciosCalculadosMoneda
+MONEDA_PRECIOS = "MXN"
+CURRENCY_TIER_COLUMNS = ("precio_base", "precio_maximo", *TIER_MULTIPLIERS)
+PRICE_CURRENCY_COLUMNS = [
+    "sku",
+    "transporte",
+    "moneda_precio",
+    "tc_mxn",
+    *CURRENCY_TIER_COLUMNS,
+    "fecha_calculo",
+]
+
+
+def normalize_monedas_precio(monedas: Sequence[str] | None) -> List[str]:
+    """Monedas destino en mayúsculas, sin duplicados y sin MXN (ya es PreciosCalculados)."""
+    resultado: List[str] = []
+    for moneda in monedas or []:
+        for item in moneda.split(","):
+            item = item.strip().upper()
+            if item and item != MONEDA_PRECIOS and item not in resultado:
+                resultado.append(item)
+    return resultado
+
+
+def currency_rates(fx_map: Dict[str, float], monedas: Sequence[str]) -> np.ndarray:
+    """Tipo de cambio a MXN de cada moneda destino; falla si alguna no tiene tipo de cambio."""
+    faltantes = [moneda for moneda in monedas if not fx_map.get(moneda)]
+    if faltantes:
+        raise ValueError(f"Sin tipo de cambio para moneda de precio: {', '.join(faltantes)}")
+    return np.array([fx_map[moneda] for moneda in monedas], dtype=np.float64)
+
+
+def _price_tiers(prices: List[Dict[str, Any]] | List[Tuple[Any, ...]] | Mapping[str, Any]) -> Tuple[Any, np.ndarray]:
+    """SKUs y matriz niveles × SKUs (PRICE_TIER_COLUMNS) de filas, tuplas o columnas de precios."""
+    if isinstance(prices, Mapping):
+        skus = prices["sku"]
+        tiers = [prices[column] for column in PRICE_TIER_COLUMNS]
+    elif prices and isinstance(prices[0], tuple):
+        # Tuplas en el orden de PRICE_COLUMNS (resultados de los shards)
+        indices = [PRICE_COLUMNS.index(column) for column in ("sku", *PRICE_TIER_COLUMNS)]
+        columnas = list(zip(*prices))
+        skus, tiers = columnas[indices[0]], [columnas[index] for index in indices[1:]]
+    else:
+        skus = [row["sku"] for row in prices]
+        tiers = [[row[column] for row in prices] for column in PRICE_TIER_COLUMNS]
+    matriz = np.array(tiers, dtype=np.float64).reshape(len(PRICE_TIER_COLUMNS), len(skus))
+    return skus, matriz
+
+
+def calculate_currency_price_columns(
+    prices: List[Dict[str, Any]] | List[Tuple[Any, ...]] | Mapping[str, Any],
+    transporte: str,
+    monedas: Sequence[str],
+    tipos_cambio: np.ndarray,
+    fecha_calculo: datetime | None = None,
+) -> Dict[str, Any]:
+    """Niveles de precio convertidos a cada moneda destino en una sola operación.
+
+    La matriz niveles × SKUs se divide entre el vector de tipos de cambio por
+    broadcasting (niveles × monedas × SKUs); el costo es el de escribir las
+    filas de salida, no el de recalcular los precios por moneda. Devuelve
+    columnas de PRICE_CURRENCY_COLUMNS agrupadas por moneda.
+    """
+    skus, matriz = _price_tiers(prices)
+    n = matriz.shape[1]
+    convertidos = matriz[:, None, :] / tipos_cambio[None, :, None]
+    columns: Dict[str, Any] = {
+        "sku": np.tile(np.asarray(skus, dtype=object), len(monedas)),
+        "transporte": transporte,
+        "moneda_precio": np.repeat(np.asarray(monedas, dtype=object), n),
+        "tc_mxn": np.repeat(tipos_cambio, n),
+    }
+    for index, column in enumerate(CURRENCY_TIER_COLUMNS):
+        columns[column] = convertidos[index].reshape(-1)
+    columns["fecha_calculo"] = fecha_calculo or datetime.now(timezone.utc)
+    return columns
+
+
 def calculate_price_lists(cursor, transporte: str) -> List[Dict[str, Any]]:
     """
-    Calcula las 3 listas de precios con rangos según la jerarquía:
-    - Vendedor: 90% a 65% sobre Mark-up
-    - Gerencia Comercial: 65% a 40% sobre Mark-up
-    - Gerencia: 40% a 10% sobre Mark-up (Mark-up base)
+    Calcula las listas de precios leyendo LandedCostCache ya persistido.
+
+    `run_calculations` ya no usa esta función (deriva los precios en memoria con
+    `build_price_rows` / `calculate_price_columns`); se conserva para recalcular
+    PreciosCalculados a partir de lo que hay en la base de datos.
     """
     # Obtener listas de precios configuradas
     cursor.execute(
@@ -241,7 +797,8 @@ def calculate_price_lists(cursor, transporte: str) -> List[Dict[str, Any]]:
         return []
     
     # Obtener datos de landed cost y mark_up
-    cursor.execute(
+    landed_data = fetch_all(
+        cursor,
         """
         SELECT sku, transporte, landed_cost_mxn, mark_up, 
                costo_base_mxn, flete_pct, seguro_pct, arancel_pct, dta_pct, 
@@ -249,9 +806,8 @@ def calculate_price_lists(cursor, transporte: str) -> List[Dict[str, Any]]:
         FROM LandedCostCache
         WHERE transporte = ?
         """,
-        transporte,
+        [transporte],
     )
-    landed_data = cursor.fetchall()
     
     if not landed_data:
         print(f"⚠️ No hay datos de Landed Cost para transporte {transporte}")
@@ -264,59 +820,7 @@ def calculate_price_lists(cursor, transporte: str) -> List[Dict[str, Any]]:
     row = cursor.fetchone()
     markup_pct = float(row[0]) if row else 0.10
     
-    price_rows: List[Dict[str, Any]] = []
-    
-    for item in landed_data:
-        sku = item[0]
-        trans = item[1]
-        landed_cost = float(item[2]) if item[2] is not None else 0.0
-        precio_base = float(item[3]) if item[3] is not None else 0.0  # Mark-up ya calculado
-        costo_base_mxn = float(item[4]) if item[4] is not None else 0.0
-        flete_pct = float(item[5]) if item[5] is not None else 0.0
-        seguro_pct = float(item[6]) if item[6] is not None else 0.0
-        arancel_pct = float(item[7]) if item[7] is not None else 0.0
-        dta_pct = float(item[8]) if item[8] is not None else 0.0
-        honorarios_aduanales_pct = float(item[9]) if item[9] is not None else 0.0
-        categoria = item[10] if item[10] else ""
-        
-        # Nueva lógica de precios:
-        # Precio Máximo = Mark-up × 2
-        precio_maximo = precio_base * 2
-        
-        # Vendedor: 20% descuento del Precio Máximo
-        precio_vendedor_min = precio_maximo * 0.80
-        
-        # Gerente Comercial: 25% descuento del Precio Máximo
-        precio_gerente_com_min = precio_maximo * 0.75
-        
-        # Subdirección: 30% descuento del Precio Máximo
-        precio_subdireccion_min = precio_maximo * 0.70
-        
-        # Dirección: 35% descuento del Precio Máximo
-        precio_direccion_min = precio_maximo * 0.65
-        
-        price_rows.append({
-            "sku": sku,
-            "transporte": trans,
-            "landed_cost_mxn": landed_cost,
-            "precio_base_mxn": precio_base,
-            "precio_maximo": precio_maximo,
-            "precio_vendedor_min": precio_vendedor_min,
-            "precio_gerente_com_min": precio_gerente_com_min,
-            "precio_subdireccion_min": precio_subdireccion_min,
-            "precio_direccion_min": precio_direccion_min,
-            "markup_pct": markup_pct,
-            "costo_base_mxn": costo_base_mxn,
-            "flete_pct": flete_pct,
-            "seguro_pct": seguro_pct,
-            "arancel_pct": arancel_pct,
-            "dta_pct": dta_pct,
-            "honorarios_aduanales_pct": honorarios_aduanales_pct,
-            "categoria": categoria,
-            "fecha_calculo": datetime.now(timezone.utc),
-        })
-    
-    return price_rows
+    return build_price_rows(landed_data, markup_pct)
 
 
 def calculate_price_list(
@@ -359,165 +863,2333 @@ def calculate_price_list(
     return price_rows
 
 
-def persist_rows(
-    cursor: pyodbc.Cursor,
-    table: str,
-    columns: Sequence[str],
-    rows: Iterable[Dict[str, Any]],
-    transporte: str | None = None,
-) -> None:
-    """Persiste filas en una tabla, eliminando datos existentes según la estrategia.
-    
-    Args:
-        cursor: Cursor de pyodbc para ejecutar queries
-        table: Nombre completo de la tabla (ej: 'dbo.LandedCostCache')
-        columns: Lista de nombres de columnas a insertar
-        rows: Diccionarios con los datos a insertar
-        transporte: Tipo de transporte ('Aereo' o 'Maritimo')
-    
-    Estrategia de eliminación:
-    - Para LandedCostCache y PreciosCalculados: Solo elimina registros del
-      transporte específico para permitir cálculos incrementales por tipo
-      de transporte sin afectar los datos de otros transportes.
-    - Para otras tablas: Limpia completamente la tabla antes de insertar.
-    
-    Usa fast_executemany para inserción masiva eficiente.
-    """
-    rows = list(rows)
-    print(f"{table}: escribiendo {len(rows)} filas")
-    
-    # Si es LandedCostCache o PreciosCalculados, solo eliminar registros del transporte específico
-    # Esto permite recalcular Marítimo sin afectar Aéreo y viceversa
-    if table in ["dbo.LandedCostCache", "dbo.PreciosCalculados"] and transporte:
-        cursor.execute(f"DELETE FROM {table} WHERE transporte = ?", transporte)
-        print(f"  (eliminados registros existentes de transporte: {transporte})")
-    else:
-        # Para otras tablas, limpieza completa
-        cursor.execute(f"DELETE FROM {table}")
-    if not rows:
-        return
-    placeholders = ",".join(["?"] * len(columns))
-    sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
-    payload: List[Tuple[Any, ...]] = [tuple(row.get(col) for col in columns) for row in rows]
-    cursor.fast_executemany = True
-    cursor.executemany(sql, payload)
+# ---------------------------------------------------------------------------
+# Recálculo incremental
+# ---------------------------------------------------------------------------
 
 
-def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Calcula Landed Cost y Lista de Precios")
-    parser.add_argument("--transporte", default="Maritimo", help="Clave del modo de transporte en Parametros")
-    parser.add_argument(
-        "--moneda-precio",
-        action="append",
-        dest="monedas",
-        help="Moneda destino para precios (por defecto solo MXN). Puedes repetir la bandera.",
-    )
-    return parser.parse_args()
+def _as_datetime(value: Any) -> datetime | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str) and value:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    return None
 
 
-def run_calculations(
-    transporte: str,
-    monedas_precio: Sequence[str] | None = None,
-    conn: pyodbc.Connection | None = None,
-) -> Dict[str, Any]:
-    monedas = list(monedas_precio or ["MXN"])
-    own_connection = False
-    if conn is None:
-        conn = get_connection()
-        own_connection = True
+def _product_field(productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]], name: str) -> List[Any]:
+    if isinstance(productos, Mapping):
+        return list(productos.get(name) or [None] * len(productos["sku"]))
+    return [row.get(name) for row in productos]
 
-    try:
-        cursor = conn.cursor()
-        data = fetch_reference_data(cursor)
-        # Ya no necesitamos build_cost_map porque los costos están en productos
-        fx_map = build_fx_map(data["tipos_cambio"])
-        pct_params, fixed_params = split_parametros(data["parametros"])
 
-        landed_rows = calculate_landed_costs(
-            data["productos"],
-            {},  # cost_map ya no se usa
-            fx_map,
-            pct_params,
-            fixed_params,
-            transporte,
-        )
+def select_productos(
+    productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]],
+    skus: set[str],
+) -> List[Dict[str, Any]] | Dict[str, List[Any]]:
+    """Filtra productos (filas o columnas) dejando solo los SKUs indicados."""
+    if isinstance(productos, Mapping):
+        indices = [i for i, sku in enumerate(productos["sku"]) if sku.strip() in skus]
+        return {name: [values[i] for i in indices] for name, values in productos.items()}
+    return [row for row in productos if row["sku"].strip() in skus]
 
-        persist_rows(
-            cursor,
-            "dbo.LandedCostCache",
-            [
-                "sku",
-                "transporte",
-                "origen",
-                "categoria",
-                "moneda_base",
-                "costo_base",
-                "tc_mxn",
-                "costo_base_mxn",
-                "flete_pct",
-                "seguro_pct",
-                "arancel_pct",
-                "dta_pct",
-                "honorarios_aduanales_pct",
-                "gastos_aduana_mxn",
-                "landed_cost_mxn",
-                "mark_up",
-                "calculado_en",
-            ],
-            landed_rows,
-            transporte,  # Pasar el transporte para eliminar solo ese tipo
-        )
 
-        # Calcular listas de precios
-        print(f"\n📊 Calculando listas de precios para {transporte}...")
-        price_rows = calculate_price_lists(cursor, transporte)
-        
-        if price_rows:
-            persist_rows(
-                cursor,
-                "dbo.PreciosCalculados",
-                [
-                    "sku",
-                    "transporte",
-                    "landed_cost_mxn",
-                    "precio_base_mxn",
-                    "precio_maximo",
-                    "precio_vendedor_min",
-                    "precio_gerente_com_min",
-                    "precio_subdireccion_min",
-                    "precio_direccion_min",
-                    "markup_pct",
-                    "costo_base_mxn",
-                    "flete_pct",
-                    "seguro_pct",
-                    "arancel_pct",
-                    "dta_pct",
-                    "honorarios_aduanales_pct",
-                    "categoria",
-                    "fecha_calculo",
-                ],
-                price_rows,
-                transporte,
-            )
+def recalculo_inputs_available(cursor: pyodbc.Cursor) -> bool:
+    cursor.execute("SELECT OBJECT_ID('dbo.RecalculoEntradas', 'U')")
+    row = cursor.fetchone()
+    return bool(row and row[0])
 
-        conn.commit()
-        summary = {
-            "landed_rows": len(landed_rows),
-            "price_rows": len(price_rows) if price_rows else 0,
-            # "version_id": data.get("version_id"),  # Eliminado: ya no existe version_id
-        }
-        print(
-            f"\n✅ Cálculos almacenados correctamente. Landed={summary['landed_rows']}, Precios={summary['price_rows']}"
-        )
-        return summary
-    finally:
-        if own_connection:
-            conn.close()
+
+def load_last_run_inputs(cursor: pyodbc.Cursor, transporte: str) -> Dict[str, Any] | None:
+    """Entradas registradas en la última ejecución para el transporte (o None)."""
+    cursor.execute(
+        """
+        SELECT productos_fecha_max, tipos_cambio_json, parametros_json, ejecutado_en
+        FROM dbo.RecalculoEntradas
+        WHERE transporte = ?
+        """,
+        transporte,
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        "productos_fecha_max": _as_datetime(row[0]),
+        "fx_map": json.loads(row[1] or "{}"),
+        "pct_params": json.loads(row[2] or "{}"),
+        "ejecutado_en": row[3],
+    }
 
 
-def main() -> None:
-    args = parse_args()
-    run_calculations(args.transporte, args.monedas)
+def save_run_inputs(
+    cursor: pyodbc.Cursor,
+    transporte: str,
+    productos_fecha_max: datetime | None,
+    fx_map: Dict[str, float],
+    pct_params: Dict[str, float],
+) -> None:
+    """Registra las entradas usadas en esta ejecución (upsert por transporte)."""
+    values = (
+        productos_fecha_max,
+        json.dumps(fx_map, sort_keys=True),
+        json.dumps(pct_params, sort_keys=True),
+        datetime.now(timezone.utc).replace(tzinfo=None),
+    )
+    cursor.execute(
+        """
+        UPDATE dbo.RecalculoEntradas
+        SET productos_fecha_max = ?, tipos_cambio_json = ?, parametros_json = ?, ejecutado_en = ?
+        WHERE transporte = ?
+        """,
+        (*values, transporte),
+    )
+    if cursor.rowcount == 0:
+        cursor.execute(
+            """
+            INSERT INTO dbo.RecalculoEntradas
+                (productos_fecha_max, tipos_cambio_json, parametros_json, ejecutado_en, transporte)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (*values, transporte),
+        )
+
+
+# Resultados de dbo.RecalculoEjecuciones que cambian los precios vigentes (suben la posición)
+RUN_LOG_PRICE_CHANGES = ("ok", "publicada")
+# Existencia confirmada de dbo.RecalculoPosicion en este proceso (una vez creada no se borra)
+_RUN_LOG_COUNTER: Dict[str, bool] = {"existe": False}
+
+
+def recalculo_ejecuciones_available(cursor: pyodbc.Cursor) -> bool:
+    cursor.execute("SELECT OBJECT_ID('dbo.RecalculoEjecuciones', 'U')")
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def save_run_outcome(
+    cursor: pyodbc.Cursor,
+    transportes: Sequence[str],
+    resultado: str,
+    duracion_s: float,
+    por_transporte: Mapping[str, Dict[str, Any]] | None = None,
+    error: str | None = None,
+) -> None:
+    """Registra la ejecución en dbo.RecalculoEjecuciones (una fila por transporte)."""
+    corrida_id = str(uuid.uuid4())
+    por_transporte = por_transporte or {}
+    cursor.executemany(
+        """
+        INSERT INTO dbo.RecalculoEjecuciones
+            (corrida_id, transporte, resultado, duracion_s, landed_rows, price_rows, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                corrida_id,
+                item,
+                resultado,
+                round(duracion_s, 4),
+                por_transporte.get(item, {}).get("landed_rows"),
+                por_transporte.get(item, {}).get("price_rows"),
+                error[:400] if error else None,
+            )
+            for item in transportes
+        ],
+    )
+    if resultado in RUN_LOG_PRICE_CHANGES:
+        # Misma transacción que las filas: la posición solo sube al confirmar
+        cursor.execute(
+            """
+            IF OBJECT_ID('dbo.RecalculoPosicion', 'U') IS NOT NULL
+                UPDATE dbo.RecalculoPosicion SET posicion = posicion + ? WHERE id = 1
+            """,
+            len(transportes),
+        )
+
+
+def record_publication(cursor: pyodbc.Cursor, transporte: str) -> None:
+    """Registra la publicación manual de una versión (cambia los precios vigentes sin recálculo)."""
+    if recalculo_ejecuciones_available(cursor):
+        save_run_outcome(cursor, [transporte], "publicada", 0.0)
+
+
+def run_log_position(cursor: pyodbc.Cursor) -> int | None:
+    """Ejecuciones exitosas y publicaciones registradas, de dbo.RecalculoPosicion (None sin la tabla).
+
+    Sube con cada cambio confirmado de los precios vigentes, sin importar el
+    proceso que lo hizo: las fotos de precios de la API la comparan para saber
+    si siguen al día. Es un contador y no MAX(ejecucion_id) porque la identidad
+    se asigna al insertar, no al confirmar: una ejecución más larga puede
+    confirmar un id menor después de otra. Leerla es una búsqueda por llave
+    primaria; la existencia de la tabla se consulta hasta encontrarla.
+    """
+    if not _RUN_LOG_COUNTER["existe"]:
+        cursor.execute("SELECT OBJECT_ID('dbo.RecalculoPosicion', 'U')")
+        row = cursor.fetchone()
+        if not (row and row[0]):
+            return None
+        _RUN_LOG_COUNTER["existe"] = True
+    cursor.execute("SELECT posicion FROM dbo.RecalculoPosicion WHERE id = 1")
+    return int(cursor.fetchone()[0])
+
+
+def record_run_failure(conn: pyodbc.Connection, transportes: Sequence[str], duracion_s: float, exc: Exception) -> None:
+    """Registra una ejecución fallida después del ROLLBACK; un error aquí no oculta el original."""
+    try:
+        conn.rollback()
+        cursor = conn.cursor()
+        if recalculo_ejecuciones_available(cursor):
+            save_run_outcome(cursor, transportes, "error", duracion_s, error=f"{type(exc).__name__}: {exc}")
+            conn.commit()
+    except pyodbc.Error as log_exc:
+        print(f"⚠️ No se pudo registrar la ejecución fallida: {log_exc}")
+
+
+# Segundos que un recálculo espera a que termine otro del mismo transporte
+RUN_LOCK_TIMEOUT_S = 600
+
+
+def run_lock_resource(transporte: str) -> str:
+    # sp_getapplock compara el recurso en binario y la columna transporte no distingue mayúsculas
+    return f"recalculo:{transporte.strip().lower()}"
+
+
+def acquire_run_locks(
+    cursor: pyodbc.Cursor, transportes: Sequence[str], timeout_s: float = RUN_LOCK_TIMEOUT_S
+) -> List[str]:
+    """Toma un sp_getapplock exclusivo por transporte, en orden, para la sesión.
+
+    Serializa los recálculos del mismo transporte entre workers de la API, la
+    CLI y la tarea nocturna. El candado es de sesión (no de transacción)
+    porque la persistencia staging confirma por lotes; se libera con
+    `release_run_locks` o al cerrar la conexión. Si no se obtiene en
+    `timeout_s` se liberan los ya tomados y se lanza RuntimeError.
+    """
+    tomados: List[str] = []
+    for recurso in sorted({run_lock_resource(item) for item in transportes}):
+        cursor.execute(
+            """
+            SET NOCOUNT ON;
+            DECLARE @resultado INT;
+            EXEC @resultado = sp_getapplock
+                @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = ?;
+            SELECT @resultado;
+            """,
+            recurso,
+            int(timeout_s * 1000),
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] is None or row[0] < 0:
+            release_run_locks(cursor, tomados)
+            raise RuntimeError(f"Otro recálculo de {recurso.split(':', 1)[1]} sigue en curso (espera de {timeout_s:g} s)")
+        tomados.append(recurso)
+    return tomados
+
+
+def release_run_locks(cursor: pyodbc.Cursor, recursos: Sequence[str]) -> None:
+    """Libera los candados de `acquire_run_locks`; un error aquí no oculta el original."""
+    for recurso in reversed(recursos):
+        try:
+            cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", recurso)
+        except pyodbc.Error as exc:
+            print(f"⚠️ No se pudo liberar el candado {recurso}: {exc}")
+
+
+def staging_table_available(cursor: pyodbc.Cursor, table: str) -> bool:
+    cursor.execute("SELECT OBJECT_ID(?, 'U')", f"{table}_Staging")
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def precios_moneda_available(cursor: pyodbc.Cursor) -> bool:
+    cursor.execute("SELECT OBJECT_ID('dbo.PreciosCalculadosMoneda', 'U')")
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def fetch_cached_monedas(cursor: pyodbc.Cursor, transporte: str) -> set[str]:
+    cursor.execute("SELECT DISTINCT moneda_precio FROM dbo.PreciosCalculadosMoneda WHERE transporte = ?", transporte)
+    return {row[0].strip() for row in cursor.fetchall()}
+
+
+def fetch_cached_skus(cursor: pyodbc.Cursor, transporte: str) -> set[str]:
+    cursor.execute("SELECT sku FROM dbo.LandedCostCache WHERE transporte = ?", transporte)
+    return {row[0].strip() for row in cursor.fetchall()}
+
+
+def max_fecha_actualizacion(productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]]) -> datetime | None:
+    fechas = [f for f in map(_as_datetime, _product_field(productos, "fecha_actualizacion")) if f is not None]
+    return max(fechas) if fechas else None
+
+
+def detect_changed_skus(
+    productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]],
+    fx_map: Dict[str, float],
+    pct_params: Dict[str, float],
+    previous: Dict[str, Any],
+    cached_skus: set[str],
+    transporte: str,
+) -> Tuple[set[str] | None, set[str]]:
+    """Determina qué SKUs deben recalcularse comparando con la última ejecución.
+
+    Un SKU se recalcula si:
+    - no existe en LandedCostCache para el transporte (SKU nuevo),
+    - su fecha_actualizacion es igual o posterior a la más reciente vista en
+      la ejecución anterior (cambio de costo),
+    - el tipo de cambio de su moneda cambió,
+    - cambió el flete de su categoría para el transporte.
+
+    Returns:
+        (skus_a_recalcular, skus_eliminados). `skus_a_recalcular` es None cuando
+        cambió un parámetro que afecta a todo el transporte (recalculo completo).
+    """
+    transporte_key = transporte.strip().lower()
+    prev_params: Dict[str, float] = previous.get("pct_params") or {}
+    changed_params = {
+        key for key in set(pct_params) | set(prev_params) if pct_params.get(key) != prev_params.get(key)
+    }
+    if changed_params & (set(GLOBAL_PARAMS) | {transporte_key}):
+        return None, set()
+    prefix = f"{transporte_key}_"
+    changed_categorias = {key[len(prefix):] for key in changed_params if key.startswith(prefix)}
+
+    prev_fx: Dict[str, float] = previous.get("fx_map") or {}
+    changed_monedas = {
+        moneda for moneda in set(fx_map) | set(prev_fx) if fx_map.get(moneda, 1.0) != prev_fx.get(moneda, 1.0)
+    }
+    fecha_corte = previous.get("productos_fecha_max")
+
+    skus = [sku.strip() for sku in _product_field(productos, "sku")]
+    monedas = [(m or "MXN").strip().upper() for m in _product_field(productos, "moneda_base")]
+    categorias = [(c or "").strip().lower() for c in _product_field(productos, "categoria")]
+    fechas = [_as_datetime(f) for f in _product_field(productos, "fecha_actualizacion")]
+
+    dirty: set[str] = set()
+    for sku, moneda, categoria, fecha in zip(skus, monedas, categorias, fechas):
+        if (
+            sku not in cached_skus
+            or moneda in changed_monedas
+            or categoria in changed_categorias
+            or (fecha is not None and (fecha_corte is None or fecha >= fecha_corte))
+        ):
+            dirty.add(sku)
+    return dirty, cached_skus - set(skus)
+
+
+def _row_payload(rows: Iterable[Dict[str, Any]] | Mapping[str, Any], columns: Sequence[str]) -> List[Tuple[Any, ...]]:
+    if isinstance(rows, Mapping):
+        return list(iter_column_tuples(rows, columns))
+    rows = rows if isinstance(rows, list) else list(rows)
+    if rows and isinstance(rows[0], tuple):
+        # Filas ya serializadas en el orden de `columns` (p. ej. resultados de los shards)
+        return rows
+    return [tuple(row.get(col) for col in columns) for row in rows]
+
+
+def _chunks(payload: Sequence[Tuple[Any, ...]], size: int | None) -> Iterator[Sequence[Tuple[Any, ...]]]:
+    if not size or size <= 0:
+        size = len(payload) or 1
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+# Tablas de resultados: se reemplazan por transporte y cada fila se identifica
+# por transporte + ROW_KEYS (solo "sku" salvo que se indique otra llave)
+RESULT_TABLES = ("dbo.LandedCostCache", "dbo.PreciosCalculados", "dbo.PreciosBase", "dbo.PreciosCalculadosMoneda")
+ROW_KEYS = {"dbo.PreciosCalculadosMoneda": ("moneda_precio", "sku")}
+
+
+def row_key(table: str) -> Tuple[str, ...]:
+    return ROW_KEYS.get(table, ("sku",))
+
+
+def delete_scope(
+    cursor: pyodbc.Cursor,
+    table: str,
+    transporte: str | None = None,
+    skus: Iterable[str] | None = None,
+) -> None:
+    """Elimina las filas que serán reemplazadas (transporte completo o solo `skus`)."""
+    # En las tablas de resultados solo se eliminan registros del transporte específico
+    # Esto permite recalcular Marítimo sin afectar Aéreo y viceversa
+    if table in RESULT_TABLES and transporte and skus is not None:
+        skus = sorted(skus)
+        if skus:
+            cursor.fast_executemany = True
+            cursor.executemany(
+                f"DELETE FROM {table} WHERE transporte = ? AND sku = ?",
+                [(transporte, sku) for sku in skus],
+            )
+        print(f"  (eliminados {len(skus)} SKUs de transporte: {transporte})")
+    elif table in RESULT_TABLES and transporte:
+        cursor.execute(f"DELETE FROM {table} WHERE transporte = ?", transporte)
+        print(f"  (eliminados registros existentes de transporte: {transporte})")
+    else:
+        # Para otras tablas, limpieza completa
+        cursor.execute(f"DELETE FROM {table}")
+
+
+def insert_rows(
+    cursor: pyodbc.Cursor,
+    table: str,
+    columns: Sequence[str],
+    payload: Sequence[Tuple[Any, ...]],
+    batch_size: int | None = None,
+) -> None:
+    """INSERT masivo con fast_executemany, en lotes de `batch_size` filas."""
+    if not payload:
+        return
+    placeholders = ",".join(["?"] * len(columns))
+    sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
+    cursor.fast_executemany = True
+    for chunk in _chunks(payload, batch_size):
+        cursor.executemany(sql, chunk)
+
+
+def persist_rows(
+    cursor: pyodbc.Cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Dict[str, Any]] | Mapping[str, Any],
+    transporte: str | None = None,
+    skus: Iterable[str] | None = None,
+    batch_size: int | None = None,
+) -> None:
+    """Persiste filas en una tabla, eliminando datos existentes según la estrategia.
+    
+    Args:
+        cursor: Cursor de pyodbc para ejecutar queries
+        table: Nombre completo de la tabla (ej: 'dbo.LandedCostCache')
+        columns: Lista de nombres de columnas a insertar
+        rows: Diccionarios con los datos a insertar, o columnas del motor
+            vectorizado (se convierten directamente a tuplas)
+        transporte: Tipo de transporte ('Aereo' o 'Maritimo')
+        skus: Si se indica (modo incremental), solo se eliminan esos SKUs del
+            transporte en lugar de todo el transporte
+        batch_size: Filas por executemany (None = un solo lote)
+    
+    Estrategia de eliminación:
+    - Para las tablas de resultados (RESULT_TABLES): Solo elimina registros del
+      transporte específico para permitir cálculos incrementales por tipo
+      de transporte sin afectar los datos de otros transportes.
+    - Para otras tablas: Limpia completamente la tabla antes de insertar.
+    
+    Usa fast_executemany para inserción masiva eficiente.
+    """
+    payload = _row_payload(rows, columns)
+    print(f"{table}: escribiendo {len(payload)} filas")
+    delete_scope(cursor, table, transporte, skus)
+    insert_rows(cursor, table, columns, payload, batch_size)
+
+
+class DirectWriter:
+    """Persistencia directa: DELETE + INSERT dentro de la transacción de la ejecución.
+
+    Es el comportamiento original; mientras dura la transacción las filas del
+    transporte quedan bloqueadas para los lectores.
+    """
+
+    def __init__(self, conn: pyodbc.Connection, batch_size: int | None = None):
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        self.cleared: set[Tuple[str, str]] = set()
+
+    def write(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Dict[str, Any]] | Mapping[str, Any],
+        transporte: str,
+        skus: Iterable[str] | None = None,
+    ) -> None:
+        if (table, transporte) not in self.cleared:
+            self.cleared.add((table, transporte))
+            persist_rows(self.cursor, table, columns, rows, transporte, skus, self.batch_size)
+        else:
+            # Lotes siguientes del modo streaming: el transporte ya se limpió
+            insert_rows(self.cursor, table, columns, _row_payload(rows, columns), self.batch_size)
+
+    def finish(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+
+class StagingWriter:
+    """Persistencia por tabla staging con MERGE final.
+
+    Las filas se cargan en dbo.<Tabla>_Staging en lotes de `batch_size`,
+    confirmando cada lote, sin tocar las tablas que leen la API. Al terminar,
+    `finish()` aplica un MERGE por tabla/transporte (una sola sentencia
+    del lado del servidor) dentro de la transacción de la ejecución. El MERGE
+    solo actualiza las filas cuyos valores cambiaron (sin contar las fechas de
+    cálculo), así que un recálculo sin cambios casi no toma bloqueos de
+    escritura. Los lectores que tocan filas modificadas esperan al COMMIT,
+    salvo que la base tenga READ_COMMITTED_SNAPSHOT (opcional, ver
+    sql/enable_rcsi.sql), con el que leen los precios anteriores sin esperar.
+    """
+
+    def __init__(self, conn: pyodbc.Connection, batch_size: int | None = None, commit_batches: bool = True):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        # Sin confirmar por lote la carga queda en la transacción de la ejecución (ver VersionedWriter)
+        self.commit_batches = commit_batches
+        self.lote_id = str(uuid.uuid4())
+        # (tabla, transporte) -> columnas, SKUs a reemplazar (None = transporte completo) y SKUs
+        # cargados (solo se rastrean en modo incremental, para no crecer con el catálogo)
+        self.scopes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def write(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Dict[str, Any]] | Mapping[str, Any],
+        transporte: str,
+        skus: Iterable[str] | None = None,
+    ) -> None:
+        payload = _row_payload(rows, columns)
+        scope = self.scopes.setdefault(
+            (table, transporte),
+            {"columns": list(columns), "skus": None if skus is None else set(skus), "staged": set()},
+        )
+        print(f"{table}: cargando {len(payload)} filas en staging (lote {self.lote_id})")
+        staging_columns = ["lote_id", *columns]
+        sku_index = list(columns).index("sku")
+        for chunk in _chunks(payload, self.batch_size):
+            insert_rows(self.cursor, f"{table}_Staging", staging_columns, [(self.lote_id, *row) for row in chunk])
+            if self.commit_batches:
+                # Cada lote se confirma: la tabla staging no la lee nadie más
+                self.conn.commit()
+            if scope["skus"] is not None:
+                scope["staged"].update(row[sku_index] for row in chunk)
+
+    def finish(self) -> None:
+        for (table, transporte), scope in self.scopes.items():
+            columns = scope["columns"]
+            key = ("transporte", *row_key(table))
+            updates = ", ".join(f"t.{col} = s.{col}" for col in columns if col not in key)
+            # EXCEPT compara NULL contra NULL como iguales; las fechas de cálculo no cuentan como cambio
+            compared = [col for col in columns if col not in key and col not in DIFF_IGNORED_COLUMNS]
+            sql = f"""
+                MERGE {table} WITH (HOLDLOCK) AS t
+                USING (
+                    SELECT {', '.join(columns)} FROM {table}_Staging WHERE lote_id = ? AND transporte = ?
+                ) AS s
+                ON {' AND '.join(f't.{col} = s.{col}' for col in key)}
+                WHEN MATCHED AND EXISTS (
+                    SELECT {', '.join('s.' + col for col in compared)}
+                    EXCEPT
+                    SELECT {', '.join('t.' + col for col in compared)}
+                ) THEN UPDATE SET {updates}
+                WHEN NOT MATCHED BY TARGET THEN
+                    INSERT ({', '.join(columns)}) VALUES ({', '.join('s.' + col for col in columns)})
+            """
+            params: List[Any] = [self.lote_id, transporte]
+            if scope["skus"] is None:
+                # Transporte completo: lo que no venga en el lote se elimina
+                sql += " WHEN NOT MATCHED BY SOURCE AND t.transporte = ? THEN DELETE"
+                params.append(transporte)
+            self.cursor.execute(sql + ";", params)
+            if scope["skus"] is not None:
+                # Incremental: SKUs a reemplazar que ya no tienen fila (eliminados de Productos)
+                delete_scope(self.cursor, table, transporte, scope["skus"] - scope["staged"])
+            print(f"{table}: MERGE aplicado para {transporte}")
+        self._cleanup()
+
+    def abort(self) -> None:
+        try:
+            self.conn.rollback()
+            self._cleanup()
+            self.conn.commit()
+        except pyodbc.Error as exc:
+            print(f"⚠️ No se pudo limpiar el lote staging {self.lote_id}: {exc}")
+
+    def _cleanup(self) -> None:
+        for table in {table for table, _ in self.scopes}:
+            self.cursor.execute(f"DELETE FROM {table}_Staging WHERE lote_id = ?", self.lote_id)
+
+
+# Tolerancia por defecto del modo diferencial: montos (MXN) y porcentajes
+DIFF_TOLERANCE = 0.01
+DIFF_PCT_TOLERANCE = 1e-6
+# Columnas que no cuentan como cambio (llave y fechas de cálculo)
+DIFF_IGNORED_COLUMNS = ("sku", "transporte", "calculado_en", "fecha_calculo")
+
+
+def _values_differ(new: Any, old: Any, tolerance: float) -> bool:
+    if new is None or old is None:
+        return (new is None) != (old is None)
+    if isinstance(new, str) or isinstance(old, str):
+        return str(new).strip() != str(old).strip()
+    return abs(float(new) - float(old)) > tolerance
+
+
+class DiffWriter:
+    """Persistencia diferencial: solo escribe las filas que cambiaron.
+
+    Lee los valores actuales de la tabla para el transporte y compara cada fila
+    calculada contra ellos: los montos con `tolerance` (las tablas guardan
+    DECIMAL(18,2)) y los porcentajes con DIFF_PCT_TOLERANCE. Inserta los SKUs
+    nuevos, actualiza los que cambiaron (incluida su fecha de cálculo), deja
+    intactos los demás y elimina los que ya no existen. Todo ocurre dentro de
+    la transacción de la ejecución, como en la persistencia directa.
+
+    `stats` lleva por (tabla, transporte) los conteos inserted, updated,
+    unchanged y deleted.
+    """
+
+    def __init__(self, conn: pyodbc.Connection, batch_size: int | None = None, tolerance: float = DIFF_TOLERANCE):
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        self.tolerance = tolerance
+        # (tabla, transporte) -> filas actuales por llave (ROW_KEYS), SKUs a reemplazar
+        # (None = transporte completo) y llaves vistas
+        self.scopes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def _load_current(self, table: str, columns: Sequence[str], transporte: str) -> Dict[Tuple[str, ...], Tuple[Any, ...]]:
+        key = row_key(table)
+        compared = [col for col in columns if col not in DIFF_IGNORED_COLUMNS and col not in key]
+        current = fetch_columns(
+            self.cursor,
+            f"SELECT {', '.join(key)}, {', '.join(compared)} FROM {table} WHERE transporte = ?",
+            [transporte],
+        )
+        keys = zip(*(current[col] for col in key))
+        return {
+            tuple(value.strip() for value in values_key): values
+            for values_key, values in zip(keys, zip(*(current[col] for col in compared)))
+        }
+
+    def write(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Dict[str, Any]] | Mapping[str, Any],
+        transporte: str,
+        skus: Iterable[str] | None = None,
+    ) -> None:
+        scope = self.scopes.get((table, transporte))
+        if scope is None:
+            scope = self.scopes[(table, transporte)] = {
+                "current": self._load_current(table, columns, transporte),
+                "skus": None if skus is None else set(skus),
+                "seen": set(),
+            }
+            self.stats[(table, transporte)] = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        stats = self.stats[(table, transporte)]
+        key = row_key(table)
+        compared = [
+            (index, col) for index, col in enumerate(columns) if col not in DIFF_IGNORED_COLUMNS and col not in key
+        ]
+        tolerances = [DIFF_PCT_TOLERANCE if col.endswith("_pct") else self.tolerance for _, col in compared]
+        key_index = [list(columns).index(col) for col in key]
+
+        inserts: List[Tuple[Any, ...]] = []
+        updates: List[Tuple[Any, ...]] = []
+        for row in _row_payload(rows, columns):
+            row_id = tuple(row[index] for index in key_index)
+            scope["seen"].add(row_id)
+            old = scope["current"].get(row_id)
+            if old is None:
+                inserts.append(row)
+            elif any(
+                _values_differ(row[index], old_value, tolerance)
+                for (index, _), old_value, tolerance in zip(compared, old, tolerances)
+            ):
+                updates.append(row)
+            else:
+                stats["unchanged"] += 1
+
+        insert_rows(self.cursor, table, columns, inserts, self.batch_size)
+        if updates:
+            changed = [col for col in columns if col != "transporte" and col not in key]
+            changed_index = [list(columns).index(col) for col in changed]
+            sql = (
+                f"UPDATE {table} SET {', '.join(f'{col} = ?' for col in changed)} "
+                f"WHERE transporte = ? AND {' AND '.join(f'{col} = ?' for col in key)}"
+            )
+            payload = [
+                (*(row[i] for i in changed_index), transporte, *(row[i] for i in key_index)) for row in updates
+            ]
+            self.cursor.fast_executemany = True
+            for chunk in _chunks(payload, self.batch_size):
+                self.cursor.executemany(sql, chunk)
+        stats["inserted"] += len(inserts)
+        stats["updated"] += len(updates)
+
+    def finish(self) -> None:
+        for (table, transporte), scope in self.scopes.items():
+            key = row_key(table)
+            candidates = set(scope["current"])
+            if scope["skus"] is not None:
+                sku_position = key.index("sku")
+                candidates = {row_id for row_id in candidates if row_id[sku_position] in scope["skus"]}
+            stale = sorted(candidates - scope["seen"])
+            if stale:
+                self.cursor.fast_executemany = True
+                self.cursor.executemany(
+                    f"DELETE FROM {table} WHERE transporte = ? AND {' AND '.join(f'{col} = ?' for col in key)}",
+                    [(transporte, *row_id) for row_id in stale],
+                )
+            stats = self.stats[(table, transporte)]
+            stats["deleted"] = len(stale)
+            print(
+                f"{table} ({transporte}): {stats['inserted']} nuevas, {stats['updated']} actualizadas, "
+                f"{stats['unchanged']} sin cambios, {stats['deleted']} eliminadas"
+            )
+
+    def abort(self) -> None:
+        pass
+
+
+# Tablas que se publican por versiones: tabla que leen las rutas -> tabla de versiones
+VERSIONED_TABLES = {"dbo.PreciosCalculados": "dbo.PreciosCalculadosVersion"}
+# Tablas sin versiones que la persistencia versionada aplica con MERGE desde staging
+STAGED_TABLES = ("dbo.LandedCostCache",)
+# Vista con la versión publicada de cada transporte (ver sql/create_precios_versiones.sql)
+PRECIOS_VIGENTES_VIEW = "dbo.vPreciosCalculadosVigentes"
+# Versiones que se conservan por transporte (incluida la publicada) para revertir
+KEEP_VERSIONS = 3
+
+
+def current_price_version(cursor: pyodbc.Cursor, transporte: str) -> int | None:
+    cursor.execute("SELECT version_id FROM dbo.PreciosVersionActual WHERE transporte = ?", transporte)
+    row = cursor.fetchone()
+    return int(row[0]) if row else None
+
+
+def publish_price_version(cursor: pyodbc.Cursor, version_id: int) -> str:
+    """Apunta el transporte de la versión a `version_id` (publicar o revertir).
+
+    Es una sola fila de dbo.PreciosVersionActual: los lectores ven la versión
+    anterior completa o la nueva completa, nunca una mezcla. No hace COMMIT.
+    Devuelve el transporte de la versión.
+    """
+    cursor.execute("SELECT transporte FROM dbo.PreciosVersiones WHERE version_id = ?", version_id)
+    row = cursor.fetchone()
+    if not row:
+        raise ValueError(f"La versión de precios {version_id} no existe")
+    transporte = row[0]
+    cursor.execute(
+        "UPDATE dbo.PreciosVersionActual SET version_id = ?, publicado_en = SYSUTCDATETIME() WHERE transporte = ?",
+        (version_id, transporte),
+    )
+    if cursor.rowcount == 0:
+        cursor.execute(
+            "INSERT INTO dbo.PreciosVersionActual (transporte, version_id, publicado_en) VALUES (?, ?, SYSUTCDATETIME())",
+            (transporte, version_id),
+        )
+    cursor.execute("UPDATE dbo.PreciosVersiones SET publicado_en = SYSUTCDATETIME() WHERE version_id = ?", version_id)
+    return transporte
+
+
+def list_price_versions(cursor: pyodbc.Cursor, transporte: str | None = None) -> List[Dict[str, Any]]:
+    """Versiones de precios guardadas, las más recientes primero; `actual` marca la publicada."""
+    query = """
+        SELECT v.version_id, v.transporte, v.creado_en, v.publicado_en, v.filas,
+               CAST(CASE WHEN a.version_id = v.version_id THEN 1 ELSE 0 END AS BIT) AS actual
+        FROM dbo.PreciosVersiones v
+        LEFT JOIN dbo.PreciosVersionActual a ON a.transporte = v.transporte
+    """
+    params: List[Any] = []
+    if transporte:
+        query += " WHERE v.transporte = ?"
+        params.append(transporte)
+    query += " ORDER BY v.transporte, v.version_id DESC"
+    return fetch_all(cursor, query, params)
+
+
+def prune_price_versions(
+    transportes: Sequence[str],
+    keep_versions: int = KEEP_VERSIONS,
+    conn: pyodbc.Connection | None = None,
+    batch_size: int = 50_000,
+) -> List[int]:
+    """Elimina las versiones más antiguas que las `keep_versions` más recientes.
+
+    La versión publicada nunca se elimina. Los renglones se borran en lotes de
+    `batch_size` con COMMIT por lote para no retener bloqueos largos. Devuelve
+    las versiones eliminadas.
+    """
+    own_connection = conn is None
+    conn = conn or get_connection()
+    eliminadas: List[int] = []
+    try:
+        cursor = conn.cursor()
+        for transporte in transportes:
+            cursor.execute(
+                """
+                SELECT version_id FROM dbo.PreciosVersiones
+                WHERE transporte = ?
+                  AND version_id NOT IN (SELECT version_id FROM dbo.PreciosVersionActual WHERE transporte = ?)
+                ORDER BY version_id DESC
+                """,
+                (transporte, transporte),
+            )
+            # La publicada cuenta dentro de las `keep_versions` conservadas
+            viejas = [int(row[0]) for row in cursor.fetchall()][max(keep_versions - 1, 0):]
+            for version_id in viejas:
+                for table in VERSIONED_TABLES.values():
+                    while True:
+                        cursor.execute(f"DELETE TOP (?) FROM {table} WHERE version_id = ?", (batch_size, version_id))
+                        borradas = cursor.rowcount
+                        conn.commit()
+                        if borradas < batch_size:
+                            break
+                cursor.execute("DELETE FROM dbo.PreciosVersiones WHERE version_id = ?", version_id)
+                conn.commit()
+                eliminadas.append(version_id)
+        if eliminadas:
+            print(f"🧹 Versiones de precios eliminadas: {', '.join(map(str, eliminadas))}")
+        return eliminadas
+    finally:
+        if own_connection:
+            conn.close()
+
+
+# Podas en curso; `wait_for_prunes` las espera al salir de la CLI o al apagar la API
+_PRUNE_THREADS: set[threading.Thread] = set()
+_PRUNE_LOCK = threading.Lock()
+
+
+def _prune_in_background(transportes: Sequence[str], keep_versions: int) -> threading.Thread:
+    def podar() -> None:
+        try:
+            prune_price_versions(transportes, keep_versions)
+        except pyodbc.Error as exc:
+            # La poda se reintenta en el siguiente recálculo
+            print(f"⚠️ No se pudieron podar versiones de precios: {exc}")
+        finally:
+            with _PRUNE_LOCK:
+                _PRUNE_THREADS.discard(threading.current_thread())
+
+    # Daemon: no retiene el apagado de la API. Cada lote de la poda se confirma
+    # por separado, así que si el proceso termina antes la siguiente la completa.
+    hilo = threading.Thread(target=podar, name="poda-versiones-precios", daemon=True)
+    with _PRUNE_LOCK:
+        _PRUNE_THREADS.add(hilo)
+    hilo.start()
+    return hilo
+
+
+def wait_for_prunes(timeout: float | None = None) -> bool:
+    """Espera las podas de versiones en curso (hasta `timeout` segundos); True si terminaron."""
+    with _PRUNE_LOCK:
+        hilos = list(_PRUNE_THREADS)
+    limite = None if timeout is None else time.monotonic() + timeout
+    for hilo in hilos:
+        hilo.join(None if limite is None else max(limite - time.monotonic(), 0))
+    return not any(hilo.is_alive() for hilo in hilos)
+
+
+class VersionedWriter(DirectWriter):
+    """Persistencia versionada: cada recálculo escribe una versión nueva e inmutable.
+
+    Las filas de PreciosCalculados van a dbo.PreciosCalculadosVersion con un
+    version_id nuevo por transporte; la versión publicada no se toca mientras
+    se escribe. `finish()` mueve el apuntador de dbo.PreciosVersionActual en
+    la misma transacción, así los lectores de la vista PRECIOS_VIGENTES_VIEW
+    pasan de una versión completa a la otra sin ver el hueco del DELETE.
+    LandedCostCache no tiene versiones: se carga en su tabla staging dentro de
+    la transacción y `finish()` la aplica con el MERGE de StagingWriter (solo
+    filas que cambiaron) justo antes de publicar, así tampoco queda vacía
+    mientras dura el recálculo. Sin sql/create_staging_precios.sql, y para
+    el resto de las tablas, se escribe como en la persistencia directa.
+
+    En modo incremental la versión nueva parte de una copia (del lado del
+    servidor) de la publicada sin los SKUs a reemplazar. Después del COMMIT,
+    `run_calculations` poda en segundo plano las versiones que exceden
+    `keep_versions`.
+    """
+
+    def __init__(self, conn: pyodbc.Connection, batch_size: int | None = None, keep_versions: int = KEEP_VERSIONS):
+        super().__init__(conn, batch_size)
+        self.keep_versions = keep_versions
+        # (tabla, transporte) -> version_id
+        self.versions: Dict[Tuple[str, str], int] = {}
+        self.staging = StagingWriter(conn, batch_size, commit_batches=False)
+        # tabla -> si tiene tabla staging
+        self.staged: Dict[str, bool] = {}
+
+    def _staged(self, table: str) -> bool:
+        if table not in self.staged:
+            self.staged[table] = staging_table_available(self.cursor, table)
+            if not self.staged[table]:
+                print(f"⚠️ {table}_Staging no existe (sql/create_staging_precios.sql): {table} se escribe con DELETE + INSERT")
+        return self.staged[table]
+
+    def _new_version(self, table: str, columns: Sequence[str], transporte: str, skus: Iterable[str] | None) -> int:
+        self.cursor.execute(
+            "INSERT INTO dbo.PreciosVersiones (transporte, creado_en) OUTPUT INSERTED.version_id VALUES (?, SYSUTCDATETIME())",
+            transporte,
+        )
+        version_id = int(self.cursor.fetchone()[0])
+        if skus is not None:
+            version_table = VERSIONED_TABLES[table]
+            actual = current_price_version(self.cursor, transporte)
+            select = ", ".join(columns)
+            if actual is None:
+                # Transporte sin versiones todavía: se parte de la tabla sin versionar
+                self.cursor.execute(
+                    f"INSERT INTO {version_table} (version_id, {select}) SELECT ?, {select} FROM {table} WHERE transporte = ?",
+                    (version_id, transporte),
+                )
+            else:
+                self.cursor.execute(
+                    f"INSERT INTO {version_table} (version_id, {select}) "
+                    f"SELECT ?, {select} FROM {version_table} WHERE version_id = ?",
+                    (version_id, actual),
+                )
+            skus = sorted(skus)
+            if skus:
+                self.cursor.fast_executemany = True
+                self.cursor.executemany(
+                    f"DELETE FROM {version_table} WHERE version_id = ? AND sku = ?",
+                    [(version_id, sku) for sku in skus],
+                )
+        self.versions[(table, transporte)] = version_id
+        return version_id
+
+    def write(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Dict[str, Any]] | Mapping[str, Any],
+        transporte: str,
+        skus: Iterable[str] | None = None,
+    ) -> None:
+        if table not in VERSIONED_TABLES:
+            if table in STAGED_TABLES and self._staged(table):
+                self.staging.write(table, columns, rows, transporte, skus)
+            else:
+                super().write(table, columns, rows, transporte, skus)
+            return
+        version_id = self.versions.get((table, transporte))
+        if version_id is None:
+            version_id = self._new_version(table, columns, transporte, skus)
+        payload = _row_payload(rows, columns)
+        print(f"{table}: escribiendo {len(payload)} filas en la versión {version_id}")
+        insert_rows(
+            self.cursor,
+            VERSIONED_TABLES[table],
+            ["version_id", *columns],
+            [(version_id, *row) for row in payload],
+            self.batch_size,
+        )
+
+    def finish(self) -> None:
+        self.staging.finish()
+        for (table, transporte), version_id in self.versions.items():
+            self.cursor.execute(
+                f"UPDATE dbo.PreciosVersiones SET filas = (SELECT COUNT(*) FROM {VERSIONED_TABLES[table]} "
+                "WHERE version_id = ?) WHERE version_id = ?",
+                (version_id, version_id),
+            )
+            publish_price_version(self.cursor, version_id)
+            print(f"{table}: versión {version_id} publicada para {transporte}")
+
+    def abort(self) -> None:
+        self.staging.abort()
+
+
+PERSIST_MODES = {
+    "directa": DirectWriter,
+    "staging": StagingWriter,
+    "diferencial": DiffWriter,
+    "versionada": VersionedWriter,
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Calcula Landed Cost y Lista de Precios")
+    parser.add_argument(
+        "--transporte",
+        action="append",
+        dest="transportes",
+        help="Clave del modo de transporte en Parametros (por defecto Maritimo). "
+        "Puedes repetir la bandera o separar por comas para calcular varios en una sola pasada.",
+    )
+    parser.add_argument(
+        "--moneda-precio",
+        action="append",
+        dest="monedas",
+        help="Moneda destino adicional para precios (por defecto solo MXN); se guarda en "
+        "dbo.PreciosCalculadosMoneda. Puedes repetir la bandera o separar por comas.",
+    )
+    parser.add_argument(
+        "--motor",
+        choices=ENGINES,
+        default="filas",
+        help="Motor de cálculo de Landed Cost: 'filas' (por producto) o 'vectorizado' (columnas NumPy).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Recalcula solo los SKUs cuyo costo, tipo de cambio o flete cambió desde la última ejecución.",
+    )
+    parser.add_argument(
+        "--persistencia",
+        choices=tuple(PERSIST_MODES),
+        default="directa",
+        help=(
+            "'directa' (DELETE + INSERT), 'staging' (carga en tablas staging y MERGE final que solo actualiza las filas que cambiaron), "
+            "'diferencial' (solo inserta/actualiza/elimina las filas que cambiaron) "
+            "o 'versionada' (versión nueva de precios que se publica de forma atómica al terminar)."
+        ),
+    )
+    parser.add_argument(
+        "--archivo-foto",
+        default=None,
+        help="Al terminar escribe la foto binaria de precios que mapean los workers de la API "
+        "(misma ruta que PRICING_ARCHIVO_FOTO).",
+    )
+    parser.add_argument(
+        "--precios-derivados",
+        action="store_true",
+        help="Guarda solo la base de cada precio (dbo.PreciosBase); los niveles se derivan al leer "
+        "con la vista dbo.vPreciosDerivados.",
+    )
+    parser.add_argument(
+        "--versiones-retenidas",
+        type=int,
+        default=KEEP_VERSIONS,
+        dest="keep_versions",
+        help="Versiones de precios que se conservan por transporte en persistencia versionada.",
+    )
+    parser.add_argument(
+        "--publicar-version",
+        type=int,
+        default=None,
+        dest="publicar_version",
+        help="Solo vuelve a publicar una versión guardada (revertir precios) y termina.",
+    )
+    parser.add_argument(
+        "--tolerancia",
+        type=float,
+        default=DIFF_TOLERANCE,
+        help="Diferencia mínima en MXN para considerar que un monto cambió (persistencia diferencial).",
+    )
+    parser.add_argument(
+        "--tamano-lote",
+        type=int,
+        default=None,
+        dest="batch_size",
+        help="Filas por lote de escritura/lectura (por defecto un solo lote en modo directo, 5000 en streaming).",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Lee Productos por lotes y escribe cada lote calculado; memoria acotada por --tamano-lote.",
+    )
+    parser.add_argument(
+        "--procesos",
+        type=int,
+        default=1,
+        help="Procesos worker para calcular en paralelo (1 = un solo proceso).",
+    )
+    parser.add_argument(
+        "--particion",
+        choices=SHARD_KEYS,
+        default="sku",
+        help="Cómo repartir los SKUs entre procesos: hash de SKU o categoría.",
+    )
+    parser.add_argument(
+        "--fecha-tc",
+        type=date.fromisoformat,
+        default=None,
+        dest="fecha_corte",
+        help="Usa el tipo de cambio vigente en esta fecha (AAAA-MM-DD) en lugar del más reciente.",
+    )
+    args = parser.parse_args()
+    if args.streaming and args.persistencia == "diferencial":
+        parser.error("--streaming no admite --persistencia diferencial (carga todos los precios actuales en memoria)")
+    return args
+
+
+def normalize_transportes(transporte: str | Sequence[str] | None) -> List[str]:
+    """Lista de transportes sin duplicados; acepta 'Maritimo,Aereo' o una secuencia."""
+    if transporte is None:
+        return []
+    valores = [transporte] if isinstance(transporte, str) else list(transporte)
+    transportes: List[str] = []
+    for valor in valores:
+        for item in valor.split(","):
+            item = item.strip()
+            if item and item not in transportes:
+                transportes.append(item)
+    return transportes
+
+
+def compute_landed(
+    productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]],
+    snapshot: Dict[str, Any],
+    transporte: str,
+    engine: str,
+    calculado_en: datetime,
+    product_columns: Mapping[str, Any] | None = None,
+) -> Tuple[List[Dict[str, Any]] | Dict[str, Any], int]:
+    """Calcula Landed Cost con el motor elegido; devuelve (filas o columnas, cantidad)."""
+    if engine == "vectorizado":
+        landed_columns = calculate_landed_columns(
+            product_columns if product_columns is not None else productos_to_columns(productos),
+            snapshot["fx_map"],
+            snapshot["pct_params"],
+            snapshot["fixed_params"],
+            transporte,
+            calculado_en,
+        )
+        return landed_columns, len(landed_columns["sku"])
+    landed_rows = calculate_landed_costs(
+        productos,
+        {},  # cost_map ya no se usa
+        snapshot["fx_map"],
+        snapshot["pct_params"],
+        snapshot["fixed_params"],
+        transporte,
+        calculado_en,
+    )
+    return landed_rows, len(landed_rows)
+
+
+def compute_prices(
+    landed: List[Dict[str, Any]] | Mapping[str, Any],
+    markup_pct: float,
+    calculado_en: datetime,
+) -> List[Dict[str, Any]] | Dict[str, Any]:
+    """Deriva PreciosCalculados de filas (motor por filas) o columnas (motor vectorizado)."""
+    if isinstance(landed, Mapping):
+        return calculate_price_columns(landed, markup_pct, calculado_en)
+    return build_price_rows(landed, markup_pct, calculado_en)
+
+
+# Precios derivados al leer: solo se guarda la base por SKU y transporte en
+# dbo.PreciosBase; la vista PRECIOS_DERIVADOS_VIEW calcula los niveles con los
+# mismos multiplicadores y toma costos y porcentajes de LandedCostCache
+# (ver sql/create_precios_base.sql)
+PRICE_BASE_COLUMNS = ["sku", "transporte", "precio_base_mxn", "markup_pct", "fecha_calculo"]
+PRECIOS_DERIVADOS_VIEW = "dbo.vPreciosDerivados"
+
+
+def _write_prices(
+    writer: DirectWriter | StagingWriter | DiffWriter,
+    snapshot: Dict[str, Any],
+    prices: List[Dict[str, Any]] | List[Tuple[Any, ...]] | Mapping[str, Any],
+    transporte: str,
+    skus: Iterable[str] | None = None,
+) -> None:
+    """Entrega los precios al writer: PreciosCalculados completo o solo la base (precios derivados)."""
+    if not snapshot.get("derived_tiers"):
+        writer.write("dbo.PreciosCalculados", PRICE_COLUMNS, prices, transporte, skus)
+        return
+    if isinstance(prices, list) and prices and isinstance(prices[0], tuple):
+        # Tuplas en el orden de PRICE_COLUMNS (resultados de los shards)
+        indices = [PRICE_COLUMNS.index(column) for column in PRICE_BASE_COLUMNS]
+        prices = [tuple(row[index] for index in indices) for row in prices]
+    writer.write("dbo.PreciosBase", PRICE_BASE_COLUMNS, prices, transporte, skus)
+
+
+# Etapas por transporte (segundos en "timings"); landed_s y price_list_s suman cálculo + escritura
+TRANSPORT_STAGES = ("landed_compute", "landed_persist", "price_compute", "price_persist")
+# Etapas de toda la ejecución, en orden
+RUN_STAGES = ("fetch", "build", *TRANSPORT_STAGES, "commit")
+
+
+def _stage_timings(landed_compute: float, landed_persist: float, price_compute: float, price_persist: float) -> Dict[str, float]:
+    return {
+        "landed_compute_s": round(landed_compute, 4),
+        "landed_persist_s": round(landed_persist, 4),
+        "price_compute_s": round(price_compute, 4),
+        "price_persist_s": round(price_persist, 4),
+        "landed_s": round(landed_compute + landed_persist, 4),
+        "price_list_s": round(price_compute + price_persist, 4),
+    }
+
+
+def _write_currency_prices(
+    writer: DirectWriter | StagingWriter | DiffWriter,
+    snapshot: Dict[str, Any],
+    prices: List[Dict[str, Any]] | List[Tuple[Any, ...]] | Mapping[str, Any],
+    transporte: str,
+    calculado_en: datetime,
+    skus: Iterable[str] | None = None,
+) -> Tuple[int, float, float]:
+    """Convierte los precios a las monedas destino y los entrega al writer.
+
+    Si existe dbo.PreciosCalculadosMoneda siempre se escribe (aunque no se
+    pidan monedas), así la tabla refleja exactamente las monedas de la última
+    ejecución. Devuelve filas escritas y segundos de cálculo y de escritura.
+    """
+    if not snapshot.get("precios_moneda"):
+        return 0, 0.0, 0.0
+    inicio = time.perf_counter()
+    columns = calculate_currency_price_columns(
+        prices, transporte, snapshot["monedas_precio"], snapshot["tc_monedas"], calculado_en
+    )
+    compute_s = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    writer.write("dbo.PreciosCalculadosMoneda", PRICE_CURRENCY_COLUMNS, columns, transporte, skus)
+    return len(columns["sku"]), compute_s, time.perf_counter() - inicio
+
+
+def _recalculate_transporte(
+    cursor: pyodbc.Cursor,
+    writer: DirectWriter | StagingWriter,
+    snapshot: Dict[str, Any],
+    transporte: str,
+    engine: str,
+    incremental: bool,
+    registrar_entradas: bool,
+    calculado_en: datetime,
+) -> Dict[str, Any]:
+    """Calcula un transporte a partir de la foto de datos de referencia y lo entrega al writer."""
+    fx_map = snapshot["fx_map"]
+    pct_params = snapshot["pct_params"]
+    productos = snapshot["productos"]
+    total_skus = len(_product_field(productos, "sku"))
+    dirty_skus: set[str] | None = None
+    deleted_skus: set[str] = set()
+    if incremental:
+        previous = load_last_run_inputs(cursor, transporte) if registrar_entradas else None
+        if previous is None:
+            print(f"⚠️ Sin ejecución previa registrada para {transporte}; se realiza recálculo completo")
+        else:
+            dirty_skus, deleted_skus = detect_changed_skus(
+                productos,
+                fx_map,
+                pct_params,
+                previous,
+                fetch_cached_skus(cursor, transporte),
+                transporte,
+            )
+            monedas = snapshot.get("monedas_precio") or []
+            prev_fx = previous.get("fx_map") or {}
+            if dirty_skus is None:
+                print(f"⚠️ Cambió un parámetro global de {transporte}; se realiza recálculo completo")
+            elif snapshot.get("precios_moneda") and (
+                fetch_cached_monedas(cursor, transporte) != set(monedas)
+                or any(prev_fx.get(moneda) != fx_map.get(moneda) for moneda in monedas)
+            ):
+                # Los precios en otras monedas dependen del tipo de cambio destino de todos los SKUs
+                print(f"⚠️ Cambiaron las monedas de precio o su tipo de cambio ({transporte}); se realiza recálculo completo")
+                dirty_skus, deleted_skus = None, set()
+            else:
+                productos = select_productos(productos, dirty_skus)
+                print(f"🔎 Incremental {transporte}: {len(dirty_skus)} SKUs a recalcular, {len(deleted_skus)} eliminados")
+
+    markup_pct = pct_params.get("mark_up", 0.10)
+    skus_a_reemplazar = None if dirty_skus is None else dirty_skus | deleted_skus
+
+    inicio = time.perf_counter()
+    product_columns = None
+    if engine == "vectorizado" and dirty_skus is None:
+        # Las columnas de Productos se codifican una sola vez para todos los transportes
+        if snapshot.get("product_columns") is None:
+            snapshot["product_columns"] = productos_to_columns(productos)
+        product_columns = snapshot["product_columns"]
+    landed, landed_count = compute_landed(productos, snapshot, transporte, engine, calculado_en, product_columns)
+    landed_compute_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    writer.write(
+        "dbo.LandedCostCache",
+        LANDED_COLUMNS,
+        landed,
+        transporte,  # Pasar el transporte para eliminar solo ese tipo
+        skus_a_reemplazar,
+    )
+    landed_persist_s = time.perf_counter() - inicio
+
+    # Calcular listas de precios en memoria a partir del Landed Cost recién calculado
+    print(f"\n📊 Calculando listas de precios para {transporte}...")
+    price_count = currency_count = 0
+    price_compute_s = price_persist_s = 0.0
+    if not snapshot["listas"]:
+        print("⚠️ No hay listas de precios configuradas")
+    elif landed_count or skus_a_reemplazar:
+        inicio = time.perf_counter()
+        prices = compute_prices(landed, markup_pct, calculado_en)
+        price_count = landed_count
+        price_compute_s = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        _write_prices(writer, snapshot, prices, transporte, skus_a_reemplazar)
+        price_persist_s = time.perf_counter() - inicio
+        currency_count, currency_compute_s, currency_persist_s = _write_currency_prices(
+            writer, snapshot, prices, transporte, calculado_en, skus_a_reemplazar
+        )
+        price_compute_s += currency_compute_s
+        price_persist_s += currency_persist_s
+    else:
+        print(f"⚠️ No hay datos de Landed Cost para transporte {transporte}")
+
+    return {
+        "landed_rows": landed_count,
+        "price_rows": price_count,
+        "currency_price_rows": currency_count,
+        "modo": "completo" if dirty_skus is None else "incremental",
+        "skipped_rows": 0 if dirty_skus is None else total_skus - landed_count,
+        "deleted_rows": len(deleted_skus),
+        "timings": _stage_timings(landed_compute_s, landed_persist_s, price_compute_s, price_persist_s),
+    }
+
+
+def _stream_transportes(
+    cursor: pyodbc.Cursor,
+    writer: DirectWriter | StagingWriter,
+    snapshot: Dict[str, Any],
+    transportes: Sequence[str],
+    engine: str,
+    batch_size: int,
+    calculado_en: datetime,
+) -> Dict[str, Dict[str, Any]]:
+    """Modo streaming: lee Productos por lotes y entrega cada lote calculado al writer.
+
+    Por cada lote se calcula Landed Cost y precios de todos los transportes y
+    se escribe de inmediato, así la memoria pico depende de `batch_size` y no
+    del tamaño del catálogo.
+    """
+    markup_pct = snapshot["pct_params"].get("mark_up", 0.10)
+    por_transporte = {
+        transporte: {
+            "landed_rows": 0,
+            "price_rows": 0,
+            "currency_price_rows": 0,
+            "modo": "completo",
+            "skipped_rows": 0,
+            "deleted_rows": 0,
+        }
+        for transporte in transportes
+    }
+    # Segundos acumulados por transporte y etapa (TRANSPORT_STAGES)
+    acumulado = {transporte: dict.fromkeys(TRANSPORT_STAGES, 0.0) for transporte in transportes}
+    if not snapshot["listas"]:
+        print("⚠️ No hay listas de precios configuradas")
+    fecha_max: datetime | None = None
+    lotes = 0
+    leidos = 0
+    lectura_s = 0.0
+    batches = iter_productos_batches(cursor, batch_size, columnar=engine == "vectorizado")
+    while True:
+        inicio = time.perf_counter()
+        productos = next(batches, None)
+        lectura_s += time.perf_counter() - inicio
+        if productos is None:
+            break
+        lotes += 1
+        leidos += len(_product_field(productos, "sku"))
+        lote_fecha_max = max_fecha_actualizacion(productos)
+        if lote_fecha_max is not None and (fecha_max is None or lote_fecha_max > fecha_max):
+            fecha_max = lote_fecha_max
+        product_columns = productos_to_columns(productos) if engine == "vectorizado" else None
+        for transporte in transportes:
+            resumen = por_transporte[transporte]
+            etapas = acumulado[transporte]
+            inicio = time.perf_counter()
+            landed, landed_count = compute_landed(productos, snapshot, transporte, engine, calculado_en, product_columns)
+            etapas["landed_compute"] += time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            writer.write("dbo.LandedCostCache", LANDED_COLUMNS, landed, transporte)
+            etapas["landed_persist"] += time.perf_counter() - inicio
+            resumen["landed_rows"] += landed_count
+            if snapshot["listas"]:
+                inicio = time.perf_counter()
+                prices = compute_prices(landed, markup_pct, calculado_en)
+                etapas["price_compute"] += time.perf_counter() - inicio
+                inicio = time.perf_counter()
+                _write_prices(writer, snapshot, prices, transporte)
+                etapas["price_persist"] += time.perf_counter() - inicio
+                resumen["price_rows"] += landed_count
+                currency_count, currency_compute_s, currency_persist_s = _write_currency_prices(
+                    writer, snapshot, prices, transporte, calculado_en
+                )
+                etapas["price_compute"] += currency_compute_s
+                etapas["price_persist"] += currency_persist_s
+                resumen["currency_price_rows"] += currency_count
+    for transporte, resumen in por_transporte.items():
+        resumen["timings"] = _stage_timings(*(acumulado[transporte][stage] for stage in TRANSPORT_STAGES))
+    snapshot["productos_fecha_max"] = fecha_max
+    # La lectura de Productos ocurre dentro del streaming; se suma a la etapa fetch
+    snapshot["productos_leidos"] = leidos
+    snapshot["fetch_s"] = lectura_s
+    print(f"🌊 Streaming: {lotes} lotes de hasta {batch_size} productos")
+    return por_transporte
+
+
+# ---------------------------------------------------------------------------
+# Simulación (what-if) sobre una foto en memoria
+# ---------------------------------------------------------------------------
+
+_REFERENCE_CACHE: Dict[str, Any] = {}
+_REFERENCE_LOCK = threading.Lock()
+
+
+def load_reference_snapshot(cursor: pyodbc.Cursor) -> Dict[str, Any]:
+    """Lee los datos de referencia y los deja listos para el motor vectorizado."""
+    data = fetch_reference_data(cursor, columnar=True)
+    pct_params, fixed_params = split_parametros(data["parametros"])
+    return {
+        "product_columns": productos_to_columns(data["productos"]),
+        "productos": data["productos"],
+        "fx_map": build_fx_map(data["tipos_cambio"]),
+        "pct_params": pct_params,
+        "fixed_params": fixed_params,
+        "listas": data["listas"],
+        "precios_actuales": {},
+        "cargado_en": time.monotonic(),
+    }
+
+
+def get_reference_snapshot(conn: pyodbc.Connection, max_age_s: float = 300.0) -> Dict[str, Any]:
+    """Foto de referencia compartida por el proceso; se vuelve a leer al vencer `max_age_s`."""
+    with _REFERENCE_LOCK:
+        snapshot = _REFERENCE_CACHE.get("snapshot")
+        if snapshot is None or time.monotonic() - snapshot["cargado_en"] > max_age_s:
+            snapshot = load_reference_snapshot(conn.cursor())
+            _REFERENCE_CACHE["snapshot"] = snapshot
+        return snapshot
+
+
+def invalidate_reference_snapshot() -> None:
+    """Descarta la foto en memoria (p. ej. después de un recálculo)."""
+    with _REFERENCE_LOCK:
+        _REFERENCE_CACHE.clear()
+
+
+def current_price_columns(
+    conn: pyodbc.Connection,
+    snapshot: Dict[str, Any],
+    transporte: str,
+    source: str = "dbo.PreciosCalculados",
+) -> Dict[str, np.ndarray]:
+    """Precios vigentes de PreciosCalculados alineados con los SKUs de la foto.
+
+    Los SKUs sin precio calculado quedan en NaN. El resultado se guarda en la
+    foto, así solo se lee una vez por transporte mientras la foto esté vigente.
+    `source` permite leer la vista de la versión publicada (PRECIOS_VIGENTES_VIEW).
+    """
+    cached = snapshot["precios_actuales"].get(transporte)
+    if cached is not None:
+        return cached
+    rows = fetch_columns(
+        conn.cursor(),
+        f"SELECT sku, {', '.join(PRICE_TIER_COLUMNS)} FROM {source} WHERE transporte = ?",
+        [transporte],
+    )
+    position = {sku.strip(): index for index, sku in enumerate(rows["sku"])}
+    # -1 apunta al NaN agregado al final de cada columna
+    indices = np.fromiter(
+        (position.get(sku, -1) for sku in snapshot["product_columns"]["sku"]),
+        dtype=np.intp,
+        count=len(snapshot["product_columns"]["sku"]),
+    )
+    cached = {
+        column: np.append(_to_float_array(rows[column], np.nan), np.nan)[indices]
+        for column in PRICE_TIER_COLUMNS
+    }
+    with _REFERENCE_LOCK:
+        snapshot["precios_actuales"][transporte] = cached
+    return cached
+
+
+def simulation_mask(
+    product_columns: Mapping[str, Any],
+    skus: Iterable[str] | None = None,
+    categorias: Iterable[str] | None = None,
+) -> np.ndarray | None:
+    """Filtro booleano por SKU y/o categoría; None si no hay filtros."""
+    if not skus and not categorias:
+        return None
+    mask = np.ones(len(product_columns["sku"]), dtype=bool)
+    if skus:
+        wanted = {sku.strip() for sku in skus}
+        mask &= np.fromiter((sku in wanted for sku in product_columns["sku"]), dtype=bool, count=len(mask))
+    if categorias:
+        wanted = {(categoria or "").strip().lower() for categoria in categorias}
+        selected = np.array([label in wanted for label in product_columns["categoria_labels"]], dtype=bool)
+        mask &= selected[product_columns["categoria_codes"]]
+    return mask
+
+
+def _mask_product_columns(product_columns: Mapping[str, Any], mask: np.ndarray | slice) -> Dict[str, Any]:
+    # Los códigos y el SKU son por producto; las etiquetas son los valores únicos
+    return {
+        name: values[mask] if isinstance(values, np.ndarray) else values
+        for name, values in product_columns.items()
+    }
+
+
+def simulate_prices(
+    snapshot: Dict[str, Any],
+    transporte: str,
+    tipos_cambio: Mapping[str, float] | None = None,
+    parametros: Mapping[str, float] | None = None,
+    mask: np.ndarray | None = None,
+    calculado_en: datetime | None = None,
+) -> Dict[str, Any]:
+    """Calcula Landed Cost y precios con tipos de cambio/parámetros modificados.
+
+    Usa las mismas fórmulas que `run_calculations` (motor vectorizado) sobre la
+    foto en memoria y no escribe nada. `tipos_cambio` sobrescribe monedas
+    (USD, EUR...) y `parametros` conceptos de ParametrosImportacion (seguro,
+    arancel, mark_up, maritimo_equipo...). Devuelve columnas de PreciosCalculados.
+    """
+    fx_map = dict(snapshot["fx_map"])
+    for moneda, valor in (tipos_cambio or {}).items():
+        fx_map[moneda.strip().upper()] = float(valor)
+    pct_params = dict(snapshot["pct_params"])
+    for concepto, valor in (parametros or {}).items():
+        pct_params[concepto.strip().lower()] = float(valor)
+    product_columns = snapshot["product_columns"]
+    if mask is not None:
+        product_columns = _mask_product_columns(product_columns, mask)
+    landed = calculate_landed_columns(
+        product_columns, fx_map, pct_params, snapshot["fixed_params"], transporte, calculado_en
+    )
+    return calculate_price_columns(landed, pct_params.get("mark_up", 0.10), landed["calculado_en"])
+
+
+def summarize_price_delta(simulated: Mapping[str, Any], current: Mapping[str, np.ndarray]) -> Dict[str, Any]:
+    """Compara precios simulados contra los vigentes (solo SKUs con precio actual).
+
+    Por columna devuelve la suma actual, la simulada, la diferencia y la
+    variación porcentual.
+    """
+    comparable = ~np.isnan(current["precio_maximo"])
+    resumen: Dict[str, Any] = {
+        "productos": int(len(simulated["sku"])),
+        "comparados": int(comparable.sum()),
+        "columnas": {},
+    }
+    for column in PRICE_TIER_COLUMNS:
+        actual = float(current[column][comparable].sum())
+        simulado = float(np.asarray(simulated[column])[comparable].sum())
+        resumen["columnas"][column] = {
+            "actual": round(actual, 2),
+            "simulado": round(simulado, 2),
+            "delta": round(simulado - actual, 2),
+            "delta_pct": round((simulado - actual) / actual * 100, 4) if actual else None,
+        }
+    return resumen
+
+
+def fx_scenarios(rangos: Mapping[str, Tuple[float, float, float]]) -> Tuple[List[str], np.ndarray]:
+    """Escenarios de tipo de cambio a partir de rangos {moneda: (desde, hasta, paso)}.
+
+    Con varias monedas se combinan todos los valores (producto cartesiano).
+    Devuelve las monedas y una matriz escenarios × monedas.
+    """
+    if not rangos:
+        raise ValueError("Debe indicarse al menos un rango de tipo de cambio")
+    monedas: List[str] = []
+    valores: List[np.ndarray] = []
+    for moneda, (desde, hasta, paso) in rangos.items():
+        if paso <= 0 or hasta < desde:
+            raise ValueError(f"Rango inválido para {moneda}: desde={desde} hasta={hasta} paso={paso}")
+        pasos = int(np.floor((hasta - desde) / paso + 1e-9)) + 1
+        monedas.append(moneda.strip().upper())
+        # Redondeo para que 16.0 + 0.25 * k no arrastre error de punto flotante
+        valores.append(np.round(desde + paso * np.arange(pasos, dtype=np.float64), 10))
+    malla = np.meshgrid(*valores, indexing="ij")
+    return monedas, np.stack([eje.ravel() for eje in malla], axis=1)
+
+
+def calculate_fx_grid(
+    product_columns: Mapping[str, Any],
+    fx_map: Dict[str, float],
+    pct_params: Dict[str, float],
+    transporte: str,
+    monedas: Sequence[str],
+    escenarios: np.ndarray,
+) -> Dict[str, Any]:
+    """Landed Cost y niveles de precio para cada SKU en cada escenario de tipo de cambio.
+
+    Evalúa las fórmulas de `calculate_landed_columns` y `calculate_price_columns`
+    como matrices SKUs × escenarios en una sola pasada; las monedas que no
+    están en `monedas` usan el tipo de cambio vigente de `fx_map`.
+    """
+    moneda_labels = product_columns["moneda_labels"]
+    moneda_codes = product_columns["moneda_codes"]
+    # Tipo de cambio por moneda distinta y escenario: (monedas del catálogo × escenarios)
+    tc_por_moneda = np.array([fx_map.get(moneda, 1.0) for moneda in moneda_labels], dtype=np.float64)
+    tc_por_moneda = np.repeat(tc_por_moneda[:, None], len(escenarios), axis=1)
+    # Varias etiquetas crudas pueden normalizar a la misma moneda ("usd", "USD ")
+    for posicion, moneda in enumerate(moneda_labels):
+        if moneda in monedas:
+            tc_por_moneda[posicion] = escenarios[:, monedas.index(moneda)]
+    tc = tc_por_moneda[moneda_codes]
+
+    importado, _, factor = import_factors(product_columns, pct_params, transporte)
+    costo_base_mxn = product_columns["costo_base"][:, None] * tc
+    landed = np.where(importado[:, None], costo_base_mxn * factor[:, None], costo_base_mxn)
+    precio_base = round_money_array(landed * (1 + pct_params.get("mark_up", 0.1)))
+    landed = round_money_array(landed)
+    precio_maximo = precio_base * PRECIO_MAXIMO_MULTIPLIER
+    grid: Dict[str, Any] = {
+        "sku": product_columns["sku"],
+        "tc_mxn": tc,
+        "landed_cost_mxn": landed,
+        "precio_base_mxn": precio_base,
+        "precio_maximo": precio_maximo,
+    }
+    for column, multiplier in TIER_MULTIPLIERS.items():
+        grid[column] = precio_maximo * multiplier
+    return grid
+
+
+def iter_fx_grid_blocks(
+    snapshot: Dict[str, Any],
+    transporte: str,
+    rangos: Mapping[str, Tuple[float, float, float]],
+    columns: Sequence[str],
+    mask: np.ndarray | None = None,
+    chunk_size: int = 5000,
+) -> Iterator[List[List[Any]]]:
+    """Recorre la malla de sensibilidad por bloques de `chunk_size` SKUs.
+
+    Cada bloque son las columnas (sku, escenario, tc_<moneda>..., `columns`)
+    de sus SKUs × escenarios; acota la memoria cuando el catálogo y el número
+    de escenarios son grandes.
+    """
+    monedas, escenarios = fx_scenarios(rangos)
+    product_columns = snapshot["product_columns"]
+    if mask is not None:
+        product_columns = _mask_product_columns(product_columns, mask)
+    total = len(product_columns["sku"])
+    n_escenarios = len(escenarios)
+    escenario_ids = list(range(1, n_escenarios + 1))
+    tc_escenarios = [escenarios[:, j].tolist() for j in range(len(monedas))]
+    for inicio in range(0, total, chunk_size):
+        bloque = _mask_product_columns(product_columns, slice(inicio, inicio + chunk_size))
+        grid = calculate_fx_grid(
+            bloque, snapshot["fx_map"], snapshot["pct_params"], transporte, monedas, escenarios
+        )
+        skus = np.repeat(bloque["sku"], n_escenarios).tolist()
+        size = len(bloque["sku"])
+        series = [skus, escenario_ids * size]
+        series.extend(valores * size for valores in tc_escenarios)
+        series.extend(grid[column].ravel().tolist() for column in columns)
+        yield series
+
+
+def iter_fx_grid(
+    snapshot: Dict[str, Any],
+    transporte: str,
+    rangos: Mapping[str, Tuple[float, float, float]],
+    columns: Sequence[str],
+    mask: np.ndarray | None = None,
+    chunk_size: int = 5000,
+) -> Iterator[Tuple[Any, ...]]:
+    """`iter_fx_grid_blocks` como filas (sku, escenario, tc_<moneda>..., `columns`)."""
+    for series in iter_fx_grid_blocks(snapshot, transporte, rangos, columns, mask, chunk_size):
+        yield from zip(*series)
+
+
+# ---------------------------------------------------------------------------
+# Recálculo por shards en procesos
+# ---------------------------------------------------------------------------
+
+SHARD_KEYS = ("sku", "categoria")
+
+# Foto de solo lectura de cada proceso worker (se asigna en `_init_shard_worker`)
+_WORKER_SNAPSHOT: Dict[str, Any] = {}
+
+
+def shard_indices(
+    productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]],
+    shards: int,
+    shard_by: str = "sku",
+) -> List[List[int]]:
+    """Reparte las posiciones de los productos en `shards` grupos estables.
+
+    Usa crc32 del SKU (o de la categoría normalizada) para que el reparto sea
+    el mismo en cualquier proceso y ejecución.
+    """
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"Partición desconocida: {shard_by}. Opciones: {', '.join(SHARD_KEYS)}")
+    if shard_by == "sku":
+        keys = [sku.strip() for sku in _product_field(productos, "sku")]
+    else:
+        keys = [(c or "").strip().lower() for c in _product_field(productos, "categoria")]
+    groups: List[List[int]] = [[] for _ in range(shards)]
+    for position, key in enumerate(keys):
+        groups[zlib.crc32(key.encode("utf-8")) % shards].append(position)
+    return [group for group in groups if group]
+
+
+def _take(productos: Iterable[Dict[str, Any]] | Mapping[str, Sequence[Any]], positions: Sequence[int]):
+    if isinstance(productos, Mapping):
+        return {name: [values[i] for i in positions] for name, values in productos.items()}
+    return [productos[i] for i in positions]
+
+
+def _init_shard_worker(snapshot: Dict[str, Any]) -> None:
+    _WORKER_SNAPSHOT.clear()
+    _WORKER_SNAPSHOT.update(snapshot)
+
+
+def _compute_shard(
+    productos: List[Dict[str, Any]] | Dict[str, List[Any]],
+    transportes: Sequence[str],
+    engine: str,
+    calculado_en: datetime,
+) -> Dict[str, Any]:
+    """Calcula Landed Cost y precios de un shard para todos los transportes (en el worker)."""
+    snapshot = _WORKER_SNAPSHOT
+    markup_pct = snapshot["pct_params"].get("mark_up", 0.10)
+    product_columns = productos_to_columns(productos) if engine == "vectorizado" else None
+    result: Dict[str, Any] = {}
+    for transporte in transportes:
+        inicio = time.perf_counter()
+        landed, _ = compute_landed(productos, snapshot, transporte, engine, calculado_en, product_columns)
+        landed_rows = _row_payload(landed, LANDED_COLUMNS)
+        landed_s = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        prices = compute_prices(landed, markup_pct, calculado_en) if snapshot["listas"] else None
+        result[transporte] = {
+            "landed": landed_rows,
+            "prices": None if prices is None else _row_payload(prices, PRICE_COLUMNS),
+            "landed_s": landed_s,
+            "price_list_s": time.perf_counter() - inicio,
+        }
+    return result
+
+
+def compute_sharded(
+    productos: List[Dict[str, Any]] | Dict[str, List[Any]],
+    snapshot: Dict[str, Any],
+    transportes: Sequence[str],
+    engine: str,
+    calculado_en: datetime,
+    workers: int,
+    shard_by: str = "sku",
+) -> Dict[str, Dict[str, Any]]:
+    """Calcula todos los transportes repartiendo los SKUs entre `workers` procesos.
+
+    Cada worker recibe una sola vez la foto de tipos de cambio y parámetros
+    (initializer) y solo los productos de su shard. Los resultados se reordenan
+    a la posición original de cada producto, así las filas (tuplas en el orden
+    de LANDED_COLUMNS / PRICE_COLUMNS) son idénticas a las de una ejecución en
+    un solo proceso.
+    """
+    shared = {key: snapshot[key] for key in ("fx_map", "pct_params", "fixed_params", "listas")}
+    total = len(_product_field(productos, "sku"))
+    groups = shard_indices(productos, workers, shard_by)
+    merged = {
+        transporte: {
+            "landed": [None] * total,
+            "prices": [None] * total if snapshot["listas"] else None,
+            "landed_s": 0.0,
+            "price_list_s": 0.0,
+        }
+        for transporte in transportes
+    }
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker, initargs=(shared,)) as pool:
+        futures = [
+            (positions, pool.submit(_compute_shard, _take(productos, positions), list(transportes), engine, calculado_en))
+            for positions in groups
+        ]
+        for positions, future in futures:
+            for transporte, shard in future.result().items():
+                destino = merged[transporte]
+                for position, row in zip(positions, shard["landed"]):
+                    destino["landed"][position] = row
+                if shard["prices"] is not None:
+                    for position, row in zip(positions, shard["prices"]):
+                        destino["prices"][position] = row
+                # Los shards corren en paralelo: el tiempo de la etapa es el del shard más lento
+                destino["landed_s"] = max(destino["landed_s"], shard["landed_s"])
+                destino["price_list_s"] = max(destino["price_list_s"], shard["price_list_s"])
+    return merged
+
+
+def _recalculate_sharded(
+    writer: DirectWriter | StagingWriter,
+    snapshot: Dict[str, Any],
+    transportes: Sequence[str],
+    engine: str,
+    calculado_en: datetime,
+    workers: int,
+    shard_by: str,
+) -> Dict[str, Dict[str, Any]]:
+    merged = compute_sharded(snapshot["productos"], snapshot, transportes, engine, calculado_en, workers, shard_by)
+    if not snapshot["listas"]:
+        print("⚠️ No hay listas de precios configuradas")
+    por_transporte: Dict[str, Dict[str, Any]] = {}
+    for transporte in transportes:
+        resultado = merged[transporte]
+        inicio = time.perf_counter()
+        writer.write("dbo.LandedCostCache", LANDED_COLUMNS, resultado["landed"], transporte)
+        landed_persist_s = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        price_count = currency_count = 0
+        currency_compute_s = 0.0
+        if resultado["prices"] is not None and resultado["landed"]:
+            _write_prices(writer, snapshot, resultado["prices"], transporte)
+            price_count = len(resultado["prices"])
+            currency_count, currency_compute_s, _ = _write_currency_prices(
+                writer, snapshot, resultado["prices"], transporte, calculado_en
+            )
+        price_persist_s = time.perf_counter() - inicio - currency_compute_s
+        por_transporte[transporte] = {
+            "landed_rows": len(resultado["landed"]),
+            "price_rows": price_count,
+            "currency_price_rows": currency_count,
+            "modo": "completo",
+            "skipped_rows": 0,
+            "deleted_rows": 0,
+            # El cálculo corrió en los workers: se reporta el shard más lento
+            "timings": _stage_timings(
+                resultado["landed_s"], landed_persist_s, resultado["price_list_s"] + currency_compute_s, price_persist_s
+            ),
+        }
+    return por_transporte
+
+
+# Archivo binario con la foto de precios para los workers de la API
+# (--archivo-foto / PRICING_ARCHIVO_FOTO). Formato:
+#   SNAPSHOT_MAGIC | largo del encabezado (uint64 LE) | encabezado JSON | columnas
+# Cada columna es un bloque de ancho fijo alineado a 8 bytes (texto UTF-8 en
+# "S<n>", números en float64 con NaN = NULL, fechas en datetime64[us]); las
+# filas de cada tabla están ordenadas por (sku, transporte) en bytes, así la
+# columna sku sirve de índice para búsqueda binaria sobre el archivo mapeado.
+# Para buscar como la intercalación CI de la base cada tabla trae además un
+# índice normalizado (`lookup_key`): las claves ordenadas y la fila de cada
+# una; los transportes distintos van en el encabezado.
+SNAPSHOT_MAGIC = b"PRECIOS2"
+SNAPSHOT_TABLES = {
+    "precios": ("dbo.PreciosCalculados", PRICE_COLUMNS),
+    "landed": ("dbo.LandedCostCache", LANDED_COLUMNS),
+}
+SNAPSHOT_TEXT_COLUMNS = ("sku", "transporte", "origen", "categoria", "moneda_base")
+SNAPSHOT_DATETIME_COLUMNS = ("fecha_calculo", "calculado_en")
+# Marca de NULL en columnas de texto (no es UTF-8 válido, no choca con datos)
+SNAPSHOT_NULL_TEXT = b"\xff"
+
+
+def price_source(persist_mode: str = "directa", derived_tiers: bool = False) -> str:
+    """Tabla o vista con los precios vigentes según el modo de persistencia."""
+    if derived_tiers:
+        return PRECIOS_DERIVADOS_VIEW
+    if persist_mode == "versionada":
+        return PRECIOS_VIGENTES_VIEW
+    return "dbo.PreciosCalculados"
+
+
+def lookup_key(text: str) -> str:
+    """SKU o transporte normalizado para comparar como la intercalación CI de SQL Server."""
+    return text.strip().casefold()
+
+
+def _align(offset: int, size: int = 8) -> int:
+    return -(-offset // size) * size
+
+
+def _snapshot_column(column: str, values: Sequence[Any]) -> np.ndarray:
+    if column in SNAPSHOT_TEXT_COLUMNS:
+        encoded = [
+            SNAPSHOT_NULL_TEXT if value is None else str(value).strip().encode("utf-8") for value in values
+        ]
+        return np.array(encoded, dtype=f"S{max([1, *map(len, encoded)])}")
+    if column in SNAPSHOT_DATETIME_COLUMNS:
+        fechas = [
+            None if value is None else value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+            for value in values
+        ]
+        return np.array([np.datetime64("NaT") if f is None else np.datetime64(f, "us") for f in fechas], dtype="M8[us]")
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+
+def write_snapshot_file(cursor: pyodbc.Cursor, path: str, source: str = "dbo.PreciosCalculados") -> Dict[str, int]:
+    """Escribe la foto binaria de precios y Landed Cost y la publica con un rename atómico.
+
+    `source` es la tabla o vista de precios vigentes (ver `price_source`). Los
+    lectores que ya tienen mapeado el archivo anterior lo siguen viendo
+    completo hasta que abren el nuevo. Devuelve las filas por tabla.
+    """
+    bloques: List[Tuple[str, str, np.ndarray]] = []
+    # Posición de la bitácora antes de leer: si otro recálculo confirma durante la lectura, la foto queda atrás
+    encabezado: Dict[str, Any] = {
+        "generacion": time.time_ns(),
+        "fuente": source,
+        "bitacora": run_log_position(cursor),
+        "tablas": {},
+    }
+    offset = 0
+    for nombre, (tabla, columns) in SNAPSHOT_TABLES.items():
+        datos = fetch_columns(cursor, f"SELECT {', '.join(columns)} FROM {source if nombre == 'precios' else tabla}")
+        arreglos = {column: _snapshot_column(column, datos[column]) for column in columns}
+        # Bytes UTF-8 sin espacios: orden por punto de código, como la paginación BIN2 de la API
+        orden = np.lexsort((arreglos["transporte"], arreglos["sku"]))
+        info: Dict[str, Any] = {
+            "filas": len(orden),
+            "columnas": {},
+            "indice": {},
+            "transportes": sorted({str(t).strip() for t in datos["transporte"]}),
+        }
+        for column in columns:
+            arreglo = np.ascontiguousarray(arreglos[column][orden])
+            info["columnas"][column] = {"dtype": arreglo.dtype.str, "offset": offset}
+            bloques.append((nombre, column, arreglo))
+            offset = _align(offset + arreglo.nbytes)
+        # Índice normalizado: claves ordenadas y la posición (en el orden del archivo) de cada una
+        claves = _snapshot_column("sku", [lookup_key(str(sku)) for sku in np.asarray(datos["sku"], dtype=object)[orden]])
+        posiciones = np.argsort(claves, kind="stable").astype(np.int64)
+        for parte, arreglo in (("claves", claves[posiciones]), ("posiciones", posiciones)):
+            info["indice"][parte] = {"dtype": arreglo.dtype.str, "offset": offset}
+            bloques.append((nombre, parte, np.ascontiguousarray(arreglo)))
+            offset = _align(offset + arreglo.nbytes)
+        encabezado["tablas"][nombre] = info
+    header = json.dumps(encabezado).encode("utf-8")
+    inicio = _align(len(SNAPSHOT_MAGIC) + 8 + len(header))
+
+    directorio = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directorio, exist_ok=True)
+    temporal = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, "wb") as archivo:
+            archivo.write(SNAPSHOT_MAGIC + len(header).to_bytes(8, "little") + header)
+            for nombre, column, arreglo in bloques:
+                info = encabezado["tablas"][nombre]
+                archivo.seek(inicio + (info["columnas"].get(column) or info["indice"][column])["offset"])
+                archivo.write(arreglo.tobytes())
+            archivo.truncate(inicio + offset)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, path)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return {nombre: info["filas"] for nombre, info in encabezado["tablas"].items()}
+
+
+class SnapshotFile:
+    """Foto de `write_snapshot_file` mapeada en memoria de solo lectura.
+
+    Las columnas son vistas numpy sobre el mapa (sin copiar), así varios
+    procesos que abren el mismo archivo comparten las páginas en la caché del
+    sistema operativo. Las búsquedas por SKU son binarias sobre el índice
+    normalizado, sin distinguir mayúsculas ni espacios como la base.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as archivo:
+            self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapa[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} no es una foto de precios")
+        largo = int.from_bytes(self._mapa[len(SNAPSHOT_MAGIC): len(SNAPSHOT_MAGIC) + 8], "little")
+        inicio_header = len(SNAPSHOT_MAGIC) + 8
+        encabezado = json.loads(self._mapa[inicio_header: inicio_header + largo])
+        inicio = _align(inicio_header + largo)
+        self.path = path
+        self.generacion: int = encabezado["generacion"]
+        # Identifica el contenido para ETags; todos los workers que mapean este archivo ven la misma
+        self.version = f"{self.generacion:x}"
+        self.fuente: str = encabezado["fuente"]
+        # Posición de dbo.RecalculoEjecuciones al escribirla (None en fotos sin bitácora)
+        self.bitacora: int | None = encabezado.get("bitacora")
+        def vista(info: Dict[str, Any], col: Dict[str, Any]) -> np.ndarray:
+            return np.frombuffer(self._mapa, dtype=np.dtype(col["dtype"]), count=info["filas"], offset=inicio + col["offset"])
+
+        self.tablas: Dict[str, Dict[str, np.ndarray]] = {
+            nombre: {column: vista(info, col) for column, col in info["columnas"].items()}
+            for nombre, info in encabezado["tablas"].items()
+        }
+        # Índice normalizado por tabla (claves, posiciones) y transportes por clave normalizada
+        self.indices: Dict[str, Dict[str, np.ndarray]] = {
+            nombre: {parte: vista(info, col) for parte, col in info["indice"].items()}
+            for nombre, info in encabezado["tablas"].items()
+        }
+        self.transportes: Dict[str, Dict[str, List[bytes]]] = {}
+        for nombre, info in encabezado["tablas"].items():
+            por_clave: Dict[str, List[bytes]] = {}
+            for transporte in info["transportes"]:
+                por_clave.setdefault(lookup_key(transporte), []).append(transporte.encode("utf-8"))
+            self.transportes[nombre] = por_clave
+
+    def __len__(self) -> int:
+        return len(self.tablas["precios"]["sku"])
+
+    def _rango(self, tabla: str, sku: str) -> Tuple[int, int]:
+        skus = self.tablas[tabla]["sku"]
+        clave = sku.strip().encode("utf-8")
+        if len(clave) > skus.dtype.itemsize:
+            return 0, 0
+        return int(np.searchsorted(skus, clave, "left")), int(np.searchsorted(skus, clave, "right"))
+
+    def _posiciones(self, tabla: str, sku: str) -> np.ndarray:
+        """Filas del SKU sin distinguir mayúsculas ni espacios, en el orden del archivo."""
+        indice = self.indices[tabla]
+        clave = lookup_key(sku).encode("utf-8")
+        if len(clave) > indice["claves"].dtype.itemsize:
+            return np.empty(0, dtype=np.int64)
+        inicio = int(np.searchsorted(indice["claves"], clave, "left"))
+        fin = int(np.searchsorted(indice["claves"], clave, "right"))
+        return np.sort(indice["posiciones"][inicio:fin])
+
+    def _posterior(self, tabla: str, despues: Tuple[str, str]) -> int:
+        """Primera posición cuya clave (sku, transporte) es mayor que `despues`."""
+        inicio, fin = self._rango(tabla, despues[0])
+        if inicio == fin:
+            return int(np.searchsorted(self.tablas[tabla]["sku"], despues[0].strip().encode("utf-8"), "right"))
+        transportes = self.tablas[tabla]["transporte"][inicio:fin]
+        return inicio + int(np.searchsorted(transportes, despues[1].strip().encode("utf-8"), "right"))
+
+    def _indices(
+        self,
+        tabla: str,
+        sku: str | None,
+        transporte: str | None,
+        despues: Tuple[str, str] | None = None,
+    ) -> np.ndarray:
+        if sku is None:
+            inicio = 0 if despues is None else self._posterior(tabla, despues)
+            indices = np.arange(inicio, len(self.tablas[tabla]["sku"]))
+        else:
+            indices = self._posiciones(tabla, sku)
+            if despues is not None:
+                indices = indices[indices >= self._posterior(tabla, despues)]
+        if transporte is None:
+            return indices
+        # Valores tal como están en el archivo que coinciden sin distinguir mayúsculas ni espacios
+        crudos = self.transportes[tabla].get(lookup_key(transporte), [])
+        return indices[np.isin(self.tablas[tabla]["transporte"][indices], crudos)]
+
+    def _filas(self, tabla: str, indices: np.ndarray, columnas: Sequence[str] | None = None) -> List[Dict[str, Any]]:
+        columnas = list(self.tablas[tabla]) if columnas is None else columnas
+        valores = []
+        for column in columnas:
+            seleccion = self.tablas[tabla][column][indices]
+            if column in SNAPSHOT_TEXT_COLUMNS:
+                valores.append([None if v == SNAPSHOT_NULL_TEXT else v.decode("utf-8") for v in seleccion.tolist()])
+            elif column in SNAPSHOT_DATETIME_COLUMNS:
+                valores.append(seleccion.astype(object).tolist())
+            else:
+                valores.append([None if v != v else v for v in seleccion.tolist()])
+        return [dict(zip(columnas, fila)) for fila in zip(*valores)]
+
+    def lookup(self, sku: str, transporte: str, tabla: str = "precios") -> Dict[str, Any] | None:
+        """Fila de (sku, transporte) o None si no está en la foto."""
+        filas = self._filas(tabla, self._indices(tabla, sku, transporte))
+        return filas[0] if filas else None
+
+    def rows(
+        self,
+        sku: str | None = None,
+        transporte: str | None = None,
+        tabla: str = "precios",
+        despues: Tuple[str, str] | None = None,
+        limite: int | None = None,
+        columnas: Sequence[str] | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Filas ordenadas por (sku, transporte), opcionalmente filtradas.
+
+        Con `despues` empieza después de esa clave, con `limite` devuelve a lo más esas filas y
+        con `columnas` solo esos campos.
+        """
+        return self._filas(tabla, self._indices(tabla, sku, transporte, despues)[:limite], columnas)
+
+
+def run_calculations(
+    transporte: str | Sequence[str],
+    monedas_precio: Sequence[str] | None = None,
+    conn: pyodbc.Connection | None = None,
+    engine: str = "filas",
+    incremental: bool = False,
+    persist_mode: str = "directa",
+    batch_size: int | None = None,
+    streaming: bool = False,
+    workers: int = 1,
+    shard_by: str = "sku",
+    progress: Callable[[str, int, int], None] | None = None,
+    tolerance: float = DIFF_TOLERANCE,
+    fecha_corte: date | None = None,
+    keep_versions: int = KEEP_VERSIONS,
+    derived_tiers: bool = False,
+    snapshot_file: str | None = None,
+) -> Dict[str, Any]:
+    """Recalcula LandedCostCache y PreciosCalculados para uno o varios transportes.
+
+    Los datos de referencia (Productos activos, ParametrosImportacion vigentes
+    y el último tipo de cambio por moneda, o el vigente en `fecha_corte`) se
+    leen una sola vez y todos los transportes se calculan a partir de la misma
+    foto en memoria; los resultados se escriben en una sola transacción.
+
+    Con `incremental=True` compara Productos.fecha_actualizacion, el último
+    tipo de cambio por moneda y los parámetros vigentes contra las entradas
+    registradas en dbo.RecalculoEntradas y solo recalcula los SKUs afectados.
+    Si no hay ejecución previa registrada o cambió un parámetro global
+    (seguro, arancel, DTA, honorarios, mark-up o flete del transporte) se hace
+    un recálculo completo.
+
+    `persist_mode` elige cómo se escriben los resultados: "directa" (DELETE +
+    INSERT en la transacción) o "staging" (carga por lotes de `batch_size` en
+    tablas staging y MERGE final, sin bloquear a los lectores durante la carga)
+    o "diferencial" (compara contra los valores actuales con `tolerance` y solo
+    escribe las filas que cambiaron; el resumen incluye los conteos en
+    "escritura") o "versionada" (escribe una versión nueva de los precios y
+    la publica al terminar; conserva `keep_versions` versiones por transporte
+    y el resumen incluye el version_id publicado en "versiones").
+
+    Con `streaming=True` Productos se lee por lotes de `batch_size` (5000 por
+    defecto) y cada lote se calcula y se entrega al writer antes de leer el
+    siguiente; la memoria pico queda acotada por el tamaño del lote. No admite
+    `incremental` ni la persistencia "diferencial" (que carga todas las filas
+    actuales del transporte para comparar).
+
+    Con `workers > 1` el cálculo se reparte en shards (por hash de SKU o por
+    categoría, `shard_by`) que se calculan en procesos separados a partir de
+    la misma foto de tipos de cambio y parámetros; los resultados se unen en un
+    solo paso de persistencia y son idénticos a los de un solo proceso. No
+    admite `incremental` ni `streaming`.
+
+    El resumen incluye segundos por etapa en "timings" y, en "stages", segundos
+    y filas de cada etapa de RUN_STAGES (fetch, build, landed_compute,
+    landed_persist, price_compute, price_persist, commit); cada transporte
+    trae sus propias etapas en "transportes".
+
+    `monedas_precio` (p. ej. ["USD", "EUR"]) agrega los niveles de precio en
+    esas monedas a dbo.PreciosCalculadosMoneda, convertidos con el mismo mapa
+    de tipos de cambio en una sola operación de arreglos por transporte; MXN
+    sigue en PreciosCalculados. Requiere sql/create_precios_moneda.sql.
+
+    Con `derived_tiers=True` solo se guarda la base de cada precio en
+    dbo.PreciosBase (5 columnas en lugar de las 18 de PreciosCalculados); los
+    niveles los deriva la vista PRECIOS_DERIVADOS_VIEW al leer. No admite la
+    persistencia versionada.
+
+    Con `snapshot_file` se escribe, después del commit, la foto binaria de
+    precios vigentes y LandedCostCache que mapean los workers de la API
+    (`write_snapshot_file`); el resumen trae sus filas en "archivo_foto".
+
+    Si existe dbo.RecalculoEjecuciones (sql/create_recalculo_ejecuciones.sql)
+    cada ejecución queda registrada ahí por transporte: las exitosas en la
+    misma transacción que los precios y las fallidas después del ROLLBACK;
+    /metrics las lee sin importar qué proceso recalculó.
+
+    Antes de leer se toma un sp_getapplock de sesión por transporte
+    (`acquire_run_locks`): dos recálculos del mismo transporte, desde
+    cualquier worker o la CLI, corren uno después del otro.
+
+    `progress(etapa, completados, total)` se invoca al avanzar de etapa
+    ("lectura", "calculo", "persistencia", "completado"); `total` es el
+    número de transportes.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de cálculo desconocido: {engine}. Opciones: {', '.join(ENGINES)}")
+    if persist_mode not in PERSIST_MODES:
+        raise ValueError(f"Modo de persistencia desconocido: {persist_mode}. Opciones: {', '.join(PERSIST_MODES)}")
+    if streaming and incremental:
+        raise ValueError("El modo streaming no admite recálculo incremental")
+    if streaming and persist_mode == "diferencial":
+        # DiffWriter carga todas las filas actuales del transporte: anularía la memoria acotada
+        raise ValueError("El modo streaming no admite persistencia diferencial")
+    if workers > 1 and (streaming or incremental):
+        raise ValueError("El recálculo en varios procesos no admite streaming ni incremental")
+    if derived_tiers and persist_mode == "versionada":
+        raise ValueError("Los precios derivados no admiten persistencia versionada")
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"Partición desconocida: {shard_by}. Opciones: {', '.join(SHARD_KEYS)}")
+    transportes = normalize_transportes(transporte)
+    if not transportes:
+        raise ValueError("Debe indicarse al menos un transporte")
+    monedas = normalize_monedas_precio(monedas_precio)
+    total = len(transportes)
+    notify = progress or (lambda etapa, completados, total: None)
+    own_connection = False
+    if conn is None:
+        conn = get_connection()
+        own_connection = True
+
+    inicio_total = time.perf_counter()
+    confirmado = False
+    candados: List[str] = []
+    try:
+        notify("lectura", 0, total)
+        cursor = conn.cursor()
+        candados = acquire_run_locks(cursor, transportes)
+        data = fetch_reference_data(
+            cursor,
+            columnar=engine == "vectorizado",
+            include_productos=not streaming,
+            fecha_corte=fecha_corte,
+        )
+        registrar_entradas = recalculo_inputs_available(cursor)
+        registrar_ejecucion = recalculo_ejecuciones_available(cursor)
+        precios_moneda = precios_moneda_available(cursor)
+        if monedas and not precios_moneda:
+            raise ValueError("Precios en otras monedas requieren sql/create_precios_moneda.sql")
+        fetch_s = time.perf_counter() - inicio_total
+        inicio = time.perf_counter()
+        # Ya no necesitamos build_cost_map porque los costos están en productos
+        fx_map = build_fx_map(data["tipos_cambio"])
+        pct_params, fixed_params = split_parametros(data["parametros"])
+        build_s = time.perf_counter() - inicio
+        snapshot = {
+            "productos": data.get("productos"),
+            "fx_map": fx_map,
+            "pct_params": pct_params,
+            "fixed_params": fixed_params,
+            "listas": data["listas"],
+            "product_columns": None,
+            "monedas_precio": monedas,
+            "tc_monedas": currency_rates(fx_map, monedas),
+            "precios_moneda": precios_moneda,
+            "derived_tiers": derived_tiers,
+        }
+        calculado_en = datetime.now(timezone.utc)
+        if persist_mode == "diferencial":
+            writer = DiffWriter(conn, batch_size, tolerance)
+        elif persist_mode == "versionada":
+            writer = VersionedWriter(conn, batch_size, keep_versions)
+        else:
+            writer = PERSIST_MODES[persist_mode](conn, batch_size)
+
+        por_transporte: Dict[str, Dict[str, Any]] = {}
+        notify("calculo", 0, total)
+        try:
+            if streaming:
+                por_transporte = _stream_transportes(
+                    cursor, writer, snapshot, transportes, engine, batch_size or 5000, calculado_en
+                )
+            elif workers > 1:
+                snapshot["productos_fecha_max"] = max_fecha_actualizacion(snapshot["productos"])
+                por_transporte = _recalculate_sharded(
+                    writer, snapshot, transportes, engine, calculado_en, workers, shard_by
+                )
+            else:
+                snapshot["productos_fecha_max"] = max_fecha_actualizacion(snapshot["productos"])
+                for item in transportes:
+                    por_transporte[item] = _recalculate_transporte(
+                        cursor, writer, snapshot, item, engine, incremental, registrar_entradas, calculado_en
+                    )
+                    notify("calculo", len(por_transporte), total)
+            notify("persistencia", total, total)
+            inicio = time.perf_counter()
+            writer.finish()
+        except Exception:
+            writer.abort()
+            raise
+
+        if registrar_entradas:
+            # Las entradas se registran junto con los resultados, en la misma transacción
+            for item in transportes:
+                save_run_inputs(cursor, item, snapshot["productos_fecha_max"], fx_map, pct_params)
+        if registrar_ejecucion:
+            save_run_outcome(cursor, transportes, "ok", time.perf_counter() - inicio_total, por_transporte)
+        conn.commit()
+        confirmado = True
+        commit_s = time.perf_counter() - inicio
+        if isinstance(writer, VersionedWriter) and writer.versions:
+            _prune_in_background(transportes, keep_versions)
+        notify("completado", total, total)
+        fetch_s += snapshot.get("fetch_s", 0.0)
+        productos_leidos = snapshot.get("productos_leidos", len(_product_field(snapshot["productos"] or [], "sku")))
+        landed_total = sum(s["landed_rows"] for s in por_transporte.values())
+        price_total = sum(s["price_rows"] for s in por_transporte.values())
+        currency_total = sum(s["currency_price_rows"] for s in por_transporte.values())
+        timings = {"fetch_s": round(fetch_s, 4), "build_s": round(build_s, 4)}
+        for key in ("landed_compute_s", "landed_persist_s", "price_compute_s", "price_persist_s", "landed_s", "price_list_s"):
+            timings[key] = round(sum(s["timings"][key] for s in por_transporte.values()), 4)
+        timings["commit_s"] = round(commit_s, 4)
+        timings["total_s"] = round(time.perf_counter() - inicio_total, 4)
+        stage_rows = {
+            "fetch": productos_leidos + len(data["tipos_cambio"]) + len(data["parametros"]),
+            "build": len(data["tipos_cambio"]) + len(data["parametros"]),
+            "landed_compute": landed_total,
+            "landed_persist": landed_total,
+            "price_compute": price_total + currency_total,
+            "price_persist": price_total + currency_total,
+            "commit": landed_total + price_total + currency_total,
+        }
+        summary = {
+            "landed_rows": landed_total,
+            "price_rows": price_total,
+            "currency_price_rows": currency_total,
+            "monedas_precio": monedas,
+            "modo": "incremental" if any(s["modo"] == "incremental" for s in por_transporte.values()) else "completo",
+            "skipped_rows": sum(s["skipped_rows"] for s in por_transporte.values()),
+            "deleted_rows": sum(s["deleted_rows"] for s in por_transporte.values()),
+            "timings": timings,
+            # Segundos y filas por etapa, en el orden de RUN_STAGES
+            "stages": {
+                stage: {"seconds": timings[f"{stage}_s"], "rows": stage_rows[stage]} for stage in RUN_STAGES
+            },
+            "transportes": por_transporte,
+            # "version_id": data.get("version_id"),  # Eliminado: ya no existe version_id
+        }
+        if isinstance(writer, DiffWriter):
+            escritura: Dict[str, Dict[str, int]] = {}
+            for (table, item), stats in writer.stats.items():
+                por_transporte[item].setdefault("escritura", {})[table] = dict(stats)
+                totales = escritura.setdefault(table, dict.fromkeys(stats, 0))
+                for key, value in stats.items():
+                    totales[key] += value
+            summary["escritura"] = escritura
+        if isinstance(writer, VersionedWriter):
+            summary["versiones"] = {item: version_id for (_, item), version_id in writer.versions.items()}
+        if snapshot_file:
+            inicio = time.perf_counter()
+            filas = write_snapshot_file(cursor, snapshot_file, price_source(persist_mode, derived_tiers))
+            summary["archivo_foto"] = {
+                "ruta": snapshot_file,
+                "filas": filas,
+                "segundos": round(time.perf_counter() - inicio, 4),
+            }
+        print(
+            f"\n✅ Cálculos almacenados correctamente ({', '.join(transportes)}). Landed={summary['landed_rows']}, "
+            f"Precios={summary['price_rows']}, Omitidos={summary['skipped_rows']}"
+        )
+        return summary
+    except Exception as exc:
+        if not confirmado:
+            record_run_failure(conn, transportes, time.perf_counter() - inicio_total, exc)
+        raise
+    finally:
+        if candados:
+            release_run_locks(conn.cursor(), candados)
+        if own_connection:
+            conn.close()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.publicar_version is not None:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            transporte = publish_price_version(cursor, args.publicar_version)
+            record_publication(cursor, transporte)
+            conn.commit()
+            if args.archivo_foto:
+                write_snapshot_file(conn.cursor(), args.archivo_foto, PRECIOS_VIGENTES_VIEW)
+        finally:
+            conn.close()
+        print(f"✅ Versión {args.publicar_version} publicada para {transporte}")
+        return
+    run_calculations(
+        args.transportes or ["Maritimo"],
+        args.monedas,
+        engine=args.motor,
+        incremental=args.incremental,
+        persist_mode=args.persistencia,
+        tolerance=args.tolerancia,
+        batch_size=args.batch_size,
+        streaming=args.streaming,
+        workers=args.procesos,
+        shard_by=args.particion,
+        fecha_corte=args.fecha_corte,
+        keep_versions=args.keep_versions,
+        derived_tiers=args.precios_derivados,
+        snapshot_file=args.archivo_foto,
+    )
+    # La poda de versiones corre en un hilo daemon: la CLI la espera antes de salir
+    wait_for_prunes()
 
 
 if __name__ == "__main__":
@@ -347,20 +347,21 @@ async function loadLanded() {
 
         // --- Mantener montos propuestos previos ---
         const prevRows = state.rowsCotizacion || [];
-        // Consultar precios por SKU
-        const promises = skuQueries.map(query => {
-            const params = new URLSearchParams();
-            params.append('sku', query.sku);
-            params.append('transporte', query.transporte || 'Maritimo');
-            return apiFetch(`/pricing/listas?${params.toString()}`);
+        // Consultar precios de todos los SKUs en una sola solicitud
+        const results = await apiFetch('/pricing/lookup', {
+            method: 'POST',
+            body: JSON.stringify({
+                items: skuQueries.map(query => ({ sku: query.sku, transporte: query.transporte || 'Maritimo' })),
+            }),
         });
-
-        const results = await Promise.all(promises);
-        // Emparejar cantidad con cada resultado
-        let allData = results.map((data, i) => {
-            const cantidad = skuQueries[i].cantidad;
-            return data.map(row => ({ ...row, cantidad }));
-        }).flat();
+        const noEncontrados = results.filter(r => !r.encontrado).map(r => r.sku);
+        if (noEncontrados.length > 0) {
+            showToast(`Sin precio calculado: ${[...new Set(noEncontrados)].join(', ')}`, 'warning');
+        }
+        // Emparejar cantidad con cada resultado (vienen en el orden de la solicitud)
+        let allData = results
+            .map((r, i) => (r.encontrado ? { ...r.precio, cantidad: skuQueries[i].cantidad } : null))
+            .filter(Boolean);
 
         // --- Restaurar montos propuestos previos por SKU ---
         allData = allData.map(row => {
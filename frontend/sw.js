@@ -1,4 +1,4 @@
-const CACHE_NAME = 'base-costos-v2';
+const CACHE_NAME = 'base-costos-v3';
 const ASSETS = [
   './',
   './index.html',
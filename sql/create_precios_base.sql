@@ -0,0 +1,59 @@
+-- Precios derivados al leer (`--precios-derivados` de cost_engine.py).
+-- En lugar de guardar los 6 niveles de PreciosCalculados por SKU y
+-- transporte, el recálculo guarda solo la base (mark-up) en dbo.PreciosBase y
+-- la vista dbo.vPreciosDerivados calcula los niveles con los mismos
+-- multiplicadores de cost_engine (PRECIO_MAXIMO_MULTIPLIER y
+-- TIER_MULTIPLIERS). Costos y porcentajes se toman de LandedCostCache, que el
+-- recálculo ya escribe. La vista expone las columnas de PreciosCalculados, así
+-- /pricing/listas y las autorizaciones la leen sin cambios
+-- (PRICING_PRECIOS_DERIVADOS=1).
+--
+-- Si cambian los multiplicadores en cost_engine.py hay que actualizar la
+-- vista (tests/test_cost_engine.py lo verifica).
+
+IF OBJECT_ID('dbo.PreciosBase', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosBase (
+        sku                      NVARCHAR(100)    NOT NULL,
+        transporte               NVARCHAR(20)     NOT NULL,
+        precio_base_mxn          DECIMAL(18,6)    NOT NULL,
+        markup_pct               DECIMAL(10,6)    NOT NULL,
+        fecha_calculo            DATETIME         NULL,
+        CONSTRAINT PK_PreciosBase PRIMARY KEY CLUSTERED (transporte, sku)
+    );
+END
+
+-- Staging para `--persistencia staging` (ver sql/create_staging_precios.sql)
+IF OBJECT_ID('dbo.PreciosBase_Staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosBase_Staging (
+        lote_id                  UNIQUEIDENTIFIER NOT NULL,
+        sku                      NVARCHAR(100)    NOT NULL,
+        transporte               NVARCHAR(20)     NOT NULL,
+        precio_base_mxn          DECIMAL(18,6)    NOT NULL,
+        markup_pct               DECIMAL(10,6)    NOT NULL,
+        fecha_calculo            DATETIME         NULL
+    );
+    CREATE CLUSTERED INDEX CX_PreciosBase_Staging
+        ON dbo.PreciosBase_Staging(lote_id, transporte, sku);
+END
+GO
+
+CREATE OR ALTER VIEW dbo.vPreciosDerivados
+AS
+SELECT b.sku, b.transporte,
+       CAST(l.landed_cost_mxn AS DECIMAL(18,2))                     AS landed_cost_mxn,
+       CAST(b.precio_base_mxn AS DECIMAL(18,2))                     AS precio_base_mxn,
+       CAST(CAST(b.precio_base_mxn AS DECIMAL(18,2)) * 2 AS DECIMAL(18,2)) AS precio_maximo,
+       CAST(CAST(b.precio_base_mxn AS DECIMAL(18,2)) * 2 * 0.80 AS DECIMAL(18,2)) AS precio_vendedor_min,
+       CAST(CAST(b.precio_base_mxn AS DECIMAL(18,2)) * 2 * 0.75 AS DECIMAL(18,2)) AS precio_gerente_com_min,
+       CAST(CAST(b.precio_base_mxn AS DECIMAL(18,2)) * 2 * 0.70 AS DECIMAL(18,2)) AS precio_subdireccion_min,
+       CAST(CAST(b.precio_base_mxn AS DECIMAL(18,2)) * 2 * 0.65 AS DECIMAL(18,2)) AS precio_direccion_min,
+       b.markup_pct, l.costo_base_mxn, l.flete_pct, l.seguro_pct,
+       l.arancel_pct, l.dta_pct, l.honorarios_aduanales_pct,
+       ISNULL(l.categoria, '')                                      AS categoria,
+       b.fecha_calculo
+FROM dbo.PreciosBase b
+LEFT JOIN dbo.LandedCostCache l
+    ON l.transporte = b.transporte AND l.sku = b.sku;
+GO
@@ -0,0 +1,49 @@
+-- Precios por moneda destino (`--moneda-precio` de cost_engine.py).
+-- PreciosCalculados conserva los precios en MXN; aquí se guardan los mismos
+-- niveles convertidos a cada moneda solicitada con el tipo de cambio de la
+-- ejecución. La llave agrupada (moneda_precio, transporte, sku) permite leer
+-- una moneda/transporte por búsqueda de índice sin convertir en cada consulta.
+
+IF OBJECT_ID('dbo.PreciosCalculadosMoneda', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosCalculadosMoneda (
+        sku                      NVARCHAR(100)    NOT NULL,
+        transporte               NVARCHAR(20)     NOT NULL,
+        moneda_precio            NCHAR(3)         NOT NULL,
+        tc_mxn                   DECIMAL(18,6)    NOT NULL,
+        precio_base              DECIMAL(18,2)    NOT NULL,
+        precio_maximo            DECIMAL(18,2)    NULL,
+        precio_vendedor_min      DECIMAL(18,2)    NULL,
+        precio_gerente_com_min   DECIMAL(18,2)    NULL,
+        precio_subdireccion_min  DECIMAL(18,2)    NULL,
+        precio_direccion_min     DECIMAL(18,2)    NULL,
+        fecha_calculo            DATETIME         NULL,
+        CONSTRAINT PK_PreciosCalculadosMoneda PRIMARY KEY CLUSTERED (moneda_precio, transporte, sku)
+    );
+END
+
+-- Borrados por (transporte, sku) del recálculo incremental
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PreciosCalculadosMoneda_Transporte_SKU')
+    CREATE NONCLUSTERED INDEX IX_PreciosCalculadosMoneda_Transporte_SKU
+    ON dbo.PreciosCalculadosMoneda(transporte, sku);
+
+-- Staging para `--persistencia staging` (ver sql/create_staging_precios.sql)
+IF OBJECT_ID('dbo.PreciosCalculadosMoneda_Staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosCalculadosMoneda_Staging (
+        lote_id                  UNIQUEIDENTIFIER NOT NULL,
+        sku                      NVARCHAR(100)    NOT NULL,
+        transporte               NVARCHAR(20)     NOT NULL,
+        moneda_precio            NCHAR(3)         NOT NULL,
+        tc_mxn                   DECIMAL(18,6)    NOT NULL,
+        precio_base              DECIMAL(18,2)    NOT NULL,
+        precio_maximo            DECIMAL(18,2)    NULL,
+        precio_vendedor_min      DECIMAL(18,2)    NULL,
+        precio_gerente_com_min   DECIMAL(18,2)    NULL,
+        precio_subdireccion_min  DECIMAL(18,2)    NULL,
+        precio_direccion_min     DECIMAL(18,2)    NULL,
+        fecha_calculo            DATETIME         NULL
+    );
+    CREATE CLUSTERED INDEX CX_PreciosCalculadosMoneda_Staging
+        ON dbo.PreciosCalculadosMoneda_Staging(lote_id, transporte, moneda_precio, sku);
+END
@@ -0,0 +1,74 @@
+-- Persistencia versionada (`--persistencia versionada` de cost_engine.py).
+-- Cada recálculo escribe una versión nueva e inmutable de PreciosCalculados y al
+-- terminar mueve el apuntador de PreciosVersionActual en la misma transacción.
+-- Las rutas leen dbo.vPreciosCalculadosVigentes (PRICING_PERSIST_MODE=versionada):
+-- nunca ven un transporte a medio escribir y revertir es mover el apuntador.
+
+IF OBJECT_ID('dbo.PreciosVersiones', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosVersiones (
+        version_id    INT IDENTITY(1,1) NOT NULL CONSTRAINT PK_PreciosVersiones PRIMARY KEY,
+        transporte    NVARCHAR(20)      NOT NULL,
+        creado_en     DATETIME2(0)      NOT NULL,
+        publicado_en  DATETIME2(0)      NULL,
+        filas         INT               NULL
+    );
+    CREATE NONCLUSTERED INDEX IX_PreciosVersiones_Transporte
+        ON dbo.PreciosVersiones(transporte, version_id DESC);
+END
+
+IF OBJECT_ID('dbo.PreciosVersionActual', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosVersionActual (
+        transporte    NVARCHAR(20)  NOT NULL CONSTRAINT PK_PreciosVersionActual PRIMARY KEY,
+        version_id    INT           NOT NULL,
+        publicado_en  DATETIME2(0)  NOT NULL
+    );
+END
+
+IF OBJECT_ID('dbo.PreciosCalculadosVersion', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosCalculadosVersion (
+        version_id               INT              NOT NULL,
+        sku                      NVARCHAR(100)    NOT NULL,
+        transporte               NVARCHAR(20)     NOT NULL,
+        landed_cost_mxn          DECIMAL(18,2)    NOT NULL,
+        precio_base_mxn          DECIMAL(18,2)    NOT NULL,
+        precio_maximo            DECIMAL(18,2)    NULL,
+        precio_vendedor_min      DECIMAL(18,2)    NULL,
+        precio_gerente_com_min   DECIMAL(18,2)    NULL,
+        precio_subdireccion_min  DECIMAL(18,2)    NULL,
+        precio_direccion_min     DECIMAL(18,2)    NULL,
+        markup_pct               DECIMAL(10,6)    NOT NULL,
+        costo_base_mxn           DECIMAL(18,6)    NULL,
+        flete_pct                DECIMAL(9,6)     NULL,
+        seguro_pct               DECIMAL(9,6)     NULL,
+        arancel_pct              DECIMAL(9,6)     NULL,
+        dta_pct                  DECIMAL(9,6)     NULL,
+        honorarios_aduanales_pct DECIMAL(9,6)     NULL,
+        categoria                NVARCHAR(100)    NULL,
+        fecha_calculo            DATETIME         NULL,
+        CONSTRAINT PK_PreciosCalculadosVersion PRIMARY KEY CLUSTERED (version_id, transporte, sku)
+    );
+END
+GO
+
+-- Versión publicada de cada transporte. Los transportes que todavía no tienen
+-- versiones se leen de PreciosCalculados, así la vista sirve desde el primer día.
+CREATE OR ALTER VIEW dbo.vPreciosCalculadosVigentes
+AS
+SELECT p.sku, p.transporte, p.landed_cost_mxn, p.precio_base_mxn, p.precio_maximo,
+       p.precio_vendedor_min, p.precio_gerente_com_min, p.precio_subdireccion_min,
+       p.precio_direccion_min, p.markup_pct, p.costo_base_mxn, p.flete_pct, p.seguro_pct,
+       p.arancel_pct, p.dta_pct, p.honorarios_aduanales_pct, p.categoria, p.fecha_calculo
+FROM dbo.PreciosCalculadosVersion p
+INNER JOIN dbo.PreciosVersionActual a
+    ON a.transporte = p.transporte AND a.version_id = p.version_id
+UNION ALL
+SELECT c.sku, c.transporte, c.landed_cost_mxn, c.precio_base_mxn, c.precio_maximo,
+       c.precio_vendedor_min, c.precio_gerente_com_min, c.precio_subdireccion_min,
+       c.precio_direccion_min, c.markup_pct, c.costo_base_mxn, c.flete_pct, c.seguro_pct,
+       c.arancel_pct, c.dta_pct, c.honorarios_aduanales_pct, c.categoria, c.fecha_calculo
+FROM dbo.PreciosCalculados c
+WHERE NOT EXISTS (SELECT 1 FROM dbo.PreciosVersionActual a WHERE a.transporte = c.transporte);
+GO
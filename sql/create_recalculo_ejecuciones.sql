@@ -0,0 +1,50 @@
+-- Bitácora de ejecuciones de cost_engine.py (CLI, tarea nocturna o API), una
+-- fila por transporte y ejecución. La escribe `run_calculations`: al terminar
+-- bien, dentro de la misma transacción que los precios; si falla, después del
+-- ROLLBACK. /metrics lee de aquí el último recálculo exitoso por transporte,
+-- su duración y el conteo de ejecuciones, sin importar qué proceso recalculó.
+-- Las publicaciones manuales de versiones (--publicar-version o la API) se
+-- registran con resultado 'publicada'. No se borran filas de esta tabla.
+-- dbo.RecalculoPosicion (abajo) lleva la cuenta de filas 'ok' o 'publicada':
+-- es la versión de los precios vigentes que comparan las fotos de precios de
+-- la API (app/precios_snapshot.py).
+IF OBJECT_ID('dbo.RecalculoEjecuciones', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.RecalculoEjecuciones (
+        ejecucion_id   BIGINT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+        corrida_id     UNIQUEIDENTIFIER NOT NULL,  -- mismas filas de una sola ejecución
+        transporte     NVARCHAR(50)     NOT NULL,
+        resultado      NVARCHAR(10)     NOT NULL,  -- 'ok', 'error' o 'publicada'
+        duracion_s     DECIMAL(12,4)    NOT NULL,
+        landed_rows    INT              NULL,
+        price_rows     INT              NULL,
+        error          NVARCHAR(400)    NULL,
+        terminado_en   DATETIME2(3)     NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+END
+
+-- Último resultado por transporte para /metrics
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_RecalculoEjecuciones_Transporte')
+    CREATE NONCLUSTERED INDEX IX_RecalculoEjecuciones_Transporte
+    ON dbo.RecalculoEjecuciones(transporte, resultado, ejecucion_id DESC)
+    INCLUDE (duracion_s, terminado_en);
+
+-- Conteo de ejecuciones por resultado para /metrics
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_RecalculoEjecuciones_Resultado')
+    CREATE NONCLUSTERED INDEX IX_RecalculoEjecuciones_Resultado
+    ON dbo.RecalculoEjecuciones(resultado);
+
+-- Posición de la bitácora en una sola fila: `save_run_outcome` la incrementa
+-- en la misma transacción que inserta las filas 'ok' o 'publicada', así solo
+-- cuenta cambios confirmados. Leerla es una búsqueda por llave primaria (las
+-- autorizaciones la comparan en cada solicitud). Se inicia con el conteo de
+-- las filas existentes para que las fotos ya cargadas sigan comparando igual.
+IF OBJECT_ID('dbo.RecalculoPosicion', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.RecalculoPosicion (
+        id        TINYINT NOT NULL PRIMARY KEY CHECK (id = 1),
+        posicion  BIGINT  NOT NULL
+    );
+    INSERT INTO dbo.RecalculoPosicion (id, posicion)
+    SELECT 1, COUNT_BIG(*) FROM dbo.RecalculoEjecuciones WHERE resultado IN ('ok', 'publicada');
+END
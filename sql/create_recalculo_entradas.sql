@@ -0,0 +1,14 @@
+-- Entradas registradas en cada ejecución de cost_engine.py por transporte.
+-- Permite el recálculo incremental (--incremental): se comparan contra los
+-- valores actuales de Productos, TiposCambio y ParametrosImportacion para
+-- recalcular solo los SKUs afectados.
+IF OBJECT_ID('dbo.RecalculoEntradas', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.RecalculoEntradas (
+        transporte            NVARCHAR(50)    NOT NULL PRIMARY KEY,
+        productos_fecha_max   DATETIME2(0)    NULL,  -- fecha_actualizacion más reciente vista
+        tipos_cambio_json     NVARCHAR(MAX)   NOT NULL,  -- {"USD": 17.25, ...}
+        parametros_json       NVARCHAR(MAX)   NOT NULL,  -- porcentajes vigentes (claves en minúsculas)
+        ejecutado_en          DATETIME2(0)    NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+END
@@ -0,0 +1,30 @@
+-- Trabajos de recálculo de la API (app/recalculo_jobs.py), una fila por
+-- trabajo. El worker que lo recibe la escribe al encolarlo, al empezar, al
+-- avanzar de etapa (a lo más una vez por segundo) y al terminar; así
+-- GET /pricing/recalculate/{job_id} responde desde cualquier worker. Un
+-- trabajo que quedó 'en_cola' o 'en_proceso' porque su worker se detuvo se
+-- reconoce por la columna worker (equipo:pid). Sin esta tabla cada worker solo
+-- ve sus propios trabajos.
+IF OBJECT_ID('dbo.RecalculoTrabajos', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.RecalculoTrabajos (
+        job_id         CHAR(32)       NOT NULL PRIMARY KEY,
+        estado         NVARCHAR(20)   NOT NULL,  -- 'en_cola', 'en_proceso', 'completado' o 'error'
+        transportes    NVARCHAR(400)  NOT NULL,  -- JSON
+        opciones       NVARCHAR(MAX)  NOT NULL,  -- JSON
+        solicitudes    INT            NOT NULL,
+        creado_en      DATETIME2(3)   NOT NULL,  -- UTC
+        iniciado_en    DATETIME2(3)   NULL,
+        terminado_en   DATETIME2(3)   NULL,
+        progreso       NVARCHAR(400)  NOT NULL,  -- JSON
+        etapas         NVARCHAR(400)  NOT NULL,  -- JSON
+        resumen        NVARCHAR(MAX)  NULL,      -- JSON
+        error          NVARCHAR(400)  NULL,
+        worker         NVARCHAR(100)  NOT NULL
+    );
+END
+
+-- Trabajos más recientes para GET /pricing/recalculate
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_RecalculoTrabajos_CreadoEn')
+    CREATE NONCLUSTERED INDEX IX_RecalculoTrabajos_CreadoEn
+    ON dbo.RecalculoTrabajos(creado_en DESC);
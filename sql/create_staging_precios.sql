@@ -0,0 +1,66 @@
+-- Tablas staging para la persistencia `--persistencia staging` de cost_engine.py.
+-- Las filas se cargan por lotes (lote_id) sin tocar LandedCostCache/PreciosCalculados
+-- y al final se aplican con un MERGE por transporte.
+
+IF OBJECT_ID('dbo.LandedCostCache_Staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.LandedCostCache_Staging (
+        lote_id                  UNIQUEIDENTIFIER NOT NULL,
+        sku                      NVARCHAR(40)     NOT NULL,
+        transporte               NVARCHAR(50)     NOT NULL,
+        origen                   NVARCHAR(50)     NULL,
+        categoria                NVARCHAR(100)    NULL,
+        moneda_base              NCHAR(3)         NOT NULL,
+        costo_base               DECIMAL(18,6)    NULL,
+        tc_mxn                   DECIMAL(18,6)    NULL,
+        costo_base_mxn           DECIMAL(18,6)    NULL,
+        flete_pct                DECIMAL(9,6)     NULL,
+        seguro_pct               DECIMAL(9,6)     NULL,
+        arancel_pct              DECIMAL(9,6)     NULL,
+        dta_pct                  DECIMAL(9,6)     NULL,
+        honorarios_aduanales_pct DECIMAL(9,6)     NULL,
+        gastos_aduana_mxn        DECIMAL(18,6)    NULL,
+        landed_cost_mxn          DECIMAL(18,6)    NULL,
+        mark_up                  DECIMAL(18,6)    NULL,
+        calculado_en             DATETIME2(0)     NOT NULL
+    );
+    CREATE CLUSTERED INDEX CX_LandedCostCache_Staging
+        ON dbo.LandedCostCache_Staging(lote_id, transporte, sku);
+END
+
+IF OBJECT_ID('dbo.PreciosCalculados_Staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PreciosCalculados_Staging (
+        lote_id                  UNIQUEIDENTIFIER NOT NULL,
+        sku                      NVARCHAR(100)    NOT NULL,
+        transporte               NVARCHAR(20)     NOT NULL,
+        landed_cost_mxn          DECIMAL(18,2)    NOT NULL,
+        precio_base_mxn          DECIMAL(18,2)    NOT NULL,
+        precio_maximo            DECIMAL(18,2)    NULL,
+        precio_vendedor_min      DECIMAL(18,2)    NULL,
+        precio_gerente_com_min   DECIMAL(18,2)    NULL,
+        precio_subdireccion_min  DECIMAL(18,2)    NULL,
+        precio_direccion_min     DECIMAL(18,2)    NULL,
+        markup_pct               DECIMAL(10,6)    NOT NULL,
+        costo_base_mxn           DECIMAL(18,6)    NULL,
+        flete_pct                DECIMAL(9,6)     NULL,
+        seguro_pct               DECIMAL(9,6)     NULL,
+        arancel_pct              DECIMAL(9,6)     NULL,
+        dta_pct                  DECIMAL(9,6)     NULL,
+        honorarios_aduanales_pct DECIMAL(9,6)     NULL,
+        categoria                NVARCHAR(100)    NULL,
+        fecha_calculo            DATETIME         NULL
+    );
+    CREATE CLUSTERED INDEX CX_PreciosCalculados_Staging
+        ON dbo.PreciosCalculados_Staging(lote_id, transporte, sku);
+END
+
+-- El MERGE necesita buscar por (transporte, sku) en las tablas destino.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_LandedCostCache_Transporte_SKU')
+    CREATE NONCLUSTERED INDEX IX_LandedCostCache_Transporte_SKU
+    ON dbo.LandedCostCache(transporte, sku);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PreciosCalculados_Transporte_SKU')
+    CREATE NONCLUSTERED INDEX IX_PreciosCalculados_Transporte_SKU
+    ON dbo.PreciosCalculados(transporte, sku);
+
+-- READ_COMMITTED_SNAPSHOT es opcional y va aparte: ver sql/enable_rcsi.sql.
@@ -0,0 +1,30 @@
+-- Versión de fila para los ETags de /catalog (app/versiones_datos.py).
+-- SQL Server asigna un ROWVERSION nuevo en cada INSERT o UPDATE, así que
+-- COUNT_BIG(*) y MAX(version_fila) cambian con cualquier alta, cambio o baja
+-- de la tabla (una suma de verificación puede repetirse con datos distintos).
+-- El índice sobre version_fila resuelve ambos agregados sin recorrer la tabla.
+-- Agregar la columna reescribe cada fila: correr en ventana de mantenimiento.
+-- Sin este script la API responde los catálogos sin ETag.
+
+IF COL_LENGTH('dbo.Productos', 'version_fila') IS NULL
+    ALTER TABLE dbo.Productos ADD version_fila ROWVERSION;
+
+IF COL_LENGTH('dbo.ParametrosImportacion', 'version_fila') IS NULL
+    ALTER TABLE dbo.ParametrosImportacion ADD version_fila ROWVERSION;
+
+IF COL_LENGTH('dbo.TiposCambio', 'version_fila') IS NULL
+    ALTER TABLE dbo.TiposCambio ADD version_fila ROWVERSION;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Productos_VersionFila')
+    CREATE NONCLUSTERED INDEX IX_Productos_VersionFila
+    ON dbo.Productos(version_fila);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ParametrosImportacion_VersionFila')
+    CREATE NONCLUSTERED INDEX IX_ParametrosImportacion_VersionFila
+    ON dbo.ParametrosImportacion(version_fila);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_TiposCambio_VersionFila')
+    CREATE NONCLUSTERED INDEX IX_TiposCambio_VersionFila
+    ON dbo.TiposCambio(version_fila);
+GO
@@ -0,0 +1,20 @@
+-- Opcional: activa READ_COMMITTED_SNAPSHOT (RCSI) en la base de la API.
+--
+-- Con RCSI los SELECT en READ COMMITTED leen la última versión confirmada
+-- en lugar de esperar los bloqueos de escritura; durante el MERGE de
+-- `--persistencia staging` (o el DELETE+INSERT de los otros modos) la API
+-- sigue viendo los precios anteriores hasta el COMMIT. Sin RCSI el MERGE
+-- solo actualiza filas que cambiaron, pero los lectores de esas filas
+-- esperan a que termine la transacción.
+--
+-- Antes de ejecutar:
+-- - ROLLBACK IMMEDIATE revierte las transacciones abiertas y desconecta las
+--   demás sesiones de la base: ejecutar en ventana de mantenimiento, con la
+--   API y los recálculos detenidos.
+-- - Las versiones de fila se guardan en tempdb y cada fila modificada crece
+--   14 bytes; revisar espacio de tempdb en recálculos grandes.
+-- - Las consultas que dependan de esperar un bloqueo para leer datos
+--   confirmados deben usar READCOMMITTEDLOCK.
+-- Se revierte con SET READ_COMMITTED_SNAPSHOT OFF (mismas condiciones).
+IF (SELECT is_read_committed_snapshot_on FROM sys.databases WHERE name = DB_NAME()) = 0
+    ALTER DATABASE CURRENT SET READ_COMMITTED_SNAPSHOT ON WITH ROLLBACK IMMEDIATE;
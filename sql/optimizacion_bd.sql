@@ -12,6 +12,17 @@ IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PreciosCalculados_SKU_
     CREATE NONCLUSTERED INDEX IX_PreciosCalculados_SKU_Transporte 
     ON dbo.PreciosCalculados(sku, transporte);
 
+-- Paginación por (sku, transporte) de /pricing/listas con precios derivados o versionados
+IF OBJECT_ID('dbo.PreciosBase', 'U') IS NOT NULL
+   AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PreciosBase_SKU_Transporte')
+    CREATE NONCLUSTERED INDEX IX_PreciosBase_SKU_Transporte
+    ON dbo.PreciosBase(sku, transporte);
+
+IF OBJECT_ID('dbo.PreciosCalculadosVersion', 'U') IS NOT NULL
+   AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PreciosCalculadosVersion_Version_SKU')
+    CREATE NONCLUSTERED INDEX IX_PreciosCalculadosVersion_Version_SKU
+    ON dbo.PreciosCalculadosVersion(version_id, sku, transporte);
+
 -- Índice en SolicitudesAutorizacion para filtros por estado
 IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_SolicitudesAutorizacion_Estado_Solicitante')
     CREATE NONCLUSTERED INDEX IX_SolicitudesAutorizacion_Estado_Solicitante
@@ -22,6 +33,51 @@ IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Usuarios_Username')
     CREATE NONCLUSTERED INDEX IX_Usuarios_Username
     ON dbo.Usuarios(username) WHERE es_activo = 1;
 
+-- Índice filtrado de productos activos (lectura del motor de precios)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Productos_Activos')
+    CREATE NONCLUSTERED INDEX IX_Productos_Activos
+    ON dbo.Productos(sku)
+    INCLUDE (origen, categoria, moneda_base, costo_base, fecha_actualizacion, Segmento_Hospitalario)
+    WHERE activo = 1;
+
+-- Último tipo de cambio por moneda (ROW_NUMBER por moneda ORDER BY fecha DESC)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_TiposCambio_Moneda_Fecha')
+    CREATE NONCLUSTERED INDEX IX_TiposCambio_Moneda_Fecha
+    ON dbo.TiposCambio(moneda, fecha DESC)
+    INCLUDE (tipo_cambio_mxn);
+
+-- Orden binario de la paginación (app/paginacion.py ordena y filtra con
+-- `sku COLLATE Latin1_General_BIN2`). Las columnas calculadas repiten esa
+-- expresión; al indexarlas, el optimizador puede resolver la página con una
+-- búsqueda en el índice en vez de ordenar la tabla. No ocupan espacio en la
+-- tabla (no son PERSISTED) y los INSERT con lista de columnas no cambian.
+IF COL_LENGTH('dbo.Productos', 'sku_bin') IS NULL
+    ALTER TABLE dbo.Productos ADD sku_bin AS (sku COLLATE Latin1_General_BIN2);
+
+IF COL_LENGTH('dbo.PreciosCalculados', 'sku_bin') IS NULL
+    ALTER TABLE dbo.PreciosCalculados
+    ADD sku_bin AS (sku COLLATE Latin1_General_BIN2),
+        transporte_bin AS (transporte COLLATE Latin1_General_BIN2);
+
+IF COL_LENGTH('dbo.LandedCostCache', 'sku_bin') IS NULL
+    ALTER TABLE dbo.LandedCostCache
+    ADD sku_bin AS (sku COLLATE Latin1_General_BIN2),
+        transporte_bin AS (transporte COLLATE Latin1_General_BIN2);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Productos_SKU_Bin')
+    CREATE NONCLUSTERED INDEX IX_Productos_SKU_Bin
+    ON dbo.Productos(sku_bin);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PreciosCalculados_SKU_Transporte_Bin')
+    CREATE NONCLUSTERED INDEX IX_PreciosCalculados_SKU_Transporte_Bin
+    ON dbo.PreciosCalculados(sku_bin, transporte_bin);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_LandedCostCache_SKU_Transporte_Bin')
+    CREATE NONCLUSTERED INDEX IX_LandedCostCache_SKU_Transporte_Bin
+    ON dbo.LandedCostCache(sku_bin, transporte_bin);
+GO
+
 -- Verificar índices creados
 SELECT 
     t.name AS Tabla,
@@ -29,7 +85,7 @@ SELECT
     i.type_desc AS Tipo
 FROM sys.indexes i
 INNER JOIN sys.tables t ON i.object_id = t.object_id
-WHERE t.name IN ('Productos', 'PreciosCalculados', 'SolicitudesAutorizacion', 'Usuarios')
+WHERE t.name IN ('Productos', 'TiposCambio', 'PreciosCalculados', 'SolicitudesAutorizacion', 'Usuarios')
 ORDER BY t.name, i.name;
 
 -- Backup manual (ejecutar por separado si es necesario)
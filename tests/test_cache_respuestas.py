@@ -0,0 +1,78 @@
+from fastapi.testclient import TestClient
+
+from app import cache_respuestas, metrics, precios_snapshot
+from app.auth import get_current_user
+from app.db import get_connection
+from app.main import app
+
+from test_precios_snapshot import FILAS
+
+
+def test_cache_evicts_by_size_and_version():
+    cache = cache_respuestas.CacheRespuestas(max_bytes=10)
+    cache.put(("a",), "v1", b"12345")
+    cache.put(("b",), "v1", b"12345")
+    assert cache.get(("a",), "v1") == (b"12345", {})  # "a" pasa a ser la más reciente
+    cache.put(("c",), "v1", b"123")
+    assert cache.get(("b",), "v1") is None
+    assert cache.get(("a",), "v2") is None  # Precios anteriores: se descarta
+    assert cache.get(("a",), "v1") is None
+    cache.put(("grande",), "v1", b"x" * 11)
+    assert len(cache) == 1 and cache.get(("c",), "v1") == (b"123", {})
+
+
+def test_listas_hits_skip_snapshot_rows(monkeypatch):
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 7)
+    lecturas = []
+    original = precios_snapshot.PreciosSnapshot.rows
+
+    def rows(self, *args, **kwargs):
+        lecturas.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(precios_snapshot.PreciosSnapshot, "rows", rows)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: snapshot)
+    monkeypatch.setattr(cache_respuestas, "cache", cache_respuestas.CacheRespuestas(1024 * 1024))
+    cliente = TestClient(app)
+
+    def consultar(rol):
+        app.dependency_overrides[get_current_user] = lambda: {"rol": rol, "username": rol}
+        app.dependency_overrides[get_connection] = lambda: None
+        try:
+            return cliente.get("/pricing/listas", params={"sku": "SKU-1"})
+        finally:
+            app.dependency_overrides.clear()
+
+    vendedor = consultar("Vendedor")
+    assert consultar("Vendedor").content == vendedor.content
+    direccion = consultar("Direccion")
+    assert len(lecturas) == 2  # Una lectura por clase de rol
+    assert vendedor.json()[0]["landed_cost_mxn"] is None
+    assert direccion.json()[0]["landed_cost_mxn"] == 108.0
+    assert vendedor.json()[0]["precio_maximo_lista"] == 240.0
+
+    texto = "\n".join(metrics.render())
+    assert 'pricing_response_cache_requests_total{endpoint="listas",resultado="hit"}' in texto
+    assert 'pricing_response_cache_requests_total{endpoint="listas",resultado="miss"}' in texto
+
+
+def test_reload_with_same_prices_keeps_cached_responses(monkeypatch):
+    fotos = [precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1)]
+    monkeypatch.setattr(precios_snapshot, "current", lambda: fotos[-1])
+    monkeypatch.setattr(cache_respuestas, "cache", cache_respuestas.CacheRespuestas(1024 * 1024))
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Direccion", "username": "dir"}
+    app.dependency_overrides[get_connection] = lambda: None
+    cliente = TestClient(app)
+    try:
+        cliente.get("/pricing/listas", params={"sku": "SKU-1"})
+        # Recarga por TTL: otra foto con los mismos precios
+        fotos.append(precios_snapshot.PreciosSnapshot.from_rows(FILAS, 2))
+        assert fotos[-1].version == fotos[0].version
+        assert cache_respuestas.cache.get(("listas", "SKU-1", None, None, None, None, "completo"), fotos[-1].version)
+        # Un recálculo que cambia precios descarta la entrada
+        cambiados = [dict(fila, precio_maximo=fila["precio_maximo"] + 1) for fila in FILAS]
+        fotos.append(precios_snapshot.PreciosSnapshot.from_rows(cambiados, 3))
+        respuesta = cliente.get("/pricing/listas", params={"sku": "SKU-1"})
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.json()[0]["precio_maximo"] == 241.0
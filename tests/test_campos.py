@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import cache_respuestas, campos, precios_snapshot, schemas
+from app.auth import get_current_user
+from app.db import get_connection
+from app.main import app
+from app.routes import pricing
+
+from test_precios_snapshot import FILAS
+
+
+def test_elegir_keeps_schema_order_and_rejects_hidden_fields():
+    vendedor = pricing._campos_listas("Vendedor")
+    seleccion = campos.elegir(" precio_minimo_lista,sku ,precio_maximo_lista", schemas.ListaPrecio, vendedor)
+    assert seleccion == ("sku", "precio_maximo_lista", "precio_minimo_lista")
+    assert campos.elegir("", schemas.ListaPrecio, vendedor) is None
+    for pedido in ("sku,landed_cost_mxn", "sku,no_existe"):
+        with pytest.raises(HTTPException) as error:
+            campos.elegir(pedido, schemas.ListaPrecio, vendedor)
+        assert error.value.status_code == 400
+
+
+def test_listas_fields_narrow_snapshot_columns_and_output(monkeypatch):
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 5)
+    leidas = []
+    original = precios_snapshot.PreciosSnapshot.rows
+
+    def rows(self, *args, **kwargs):
+        leidas.append(kwargs["columnas"])
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(precios_snapshot.PreciosSnapshot, "rows", rows)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: snapshot)
+    monkeypatch.setattr(cache_respuestas, "cache", cache_respuestas.CacheRespuestas(1024 * 1024))
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Vendedor", "username": "v"}
+    app.dependency_overrides[get_connection] = lambda: None
+    try:
+        cliente = TestClient(app)
+        respuesta = cliente.get(
+            "/pricing/listas", params={"sku": "SKU-1", "fields": "sku,precio_maximo_lista,precio_minimo_lista"}
+        )
+        oculto = cliente.get("/pricing/listas", params={"fields": "sku,costo_base_mxn"})
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.json() == [
+        {"sku": "SKU-1", "precio_maximo_lista": 240.0, "precio_minimo_lista": 192.0},
+        {"sku": "SKU-1", "precio_maximo_lista": 200.0, "precio_minimo_lista": 160.0},
+    ]
+    # Solo la clave de paginación y las columnas de las que salen los alias
+    assert leidas == [["sku", "transporte", "precio_maximo", "precio_vendedor_min"]]
+    assert oculto.status_code == 400
@@ -0,0 +1,577 @@
+import re
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import cost_engine
+
+CALCULADO_EN = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+PRODUCTOS = [
+    {"sku": " EQ-001 ", "origen": "Importado", "categoria": "Equipo", "moneda_base": "USD", "costo_base": Decimal("1500.25")},
+    {"sku": "EQ-002", "origen": None, "categoria": "equipo ", "moneda_base": "usd", "costo_base": 980.0},
+    {"sku": "IN-001", "origen": "importado", "categoria": "Insumo", "moneda_base": "EUR", "costo_base": "1,234.50"},
+    {"sku": "IN-002", "origen": "", "categoria": "insumo", "moneda_base": "MXN", "costo_base": 45},
+    {"sku": "AC-001", "origen": "Nacional", "categoria": "Accesorio", "moneda_base": None, "costo_base": None},
+    {"sku": "AC-002", "origen": " importado", "categoria": None, "moneda_base": "JPY", "costo_base": "abc"},
+    {"sku": "RF-001", "origen": "Importado", "categoria": "Refaccion", "moneda_base": "USD", "costo_base": 12.5},
+]
+
+FX_MAP = {"USD": 17.25, "EUR": 18.9, "MXN": 1.0}
+
+PARAMETROS = [
+    {"concepto": "Seguro", "tipo": "porcentaje", "valor": Decimal("0.005")},
+    {"concepto": "Arancel", "tipo": "porcentaje", "valor": Decimal("0.15")},
+    {"concepto": "DTA", "tipo": "porcentaje", "valor": Decimal("0.008")},
+    {"concepto": "Honorarios_Aduanales", "tipo": "porcentaje", "valor": Decimal("0.0045")},
+    {"concepto": "Mark_up", "tipo": "porcentaje", "valor": Decimal("0.10")},
+    {"concepto": "Maritimo_Equipo", "tipo": "porcentaje", "valor": Decimal("0.07")},
+    {"concepto": "Aereo", "tipo": "porcentaje", "valor": Decimal("0.12")},
+    {"concepto": "Gastos_Fijos", "tipo": "fijo", "valor": Decimal("250")},
+]
+
+
+@pytest.mark.parametrize("transporte", ["Maritimo", "Aereo", "Terrestre"])
+def test_vectorized_engine_matches_row_engine(transporte):
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    esperado = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, transporte, CALCULADO_EN
+    )
+    obtenido = cost_engine.calculate_landed_costs_vectorized(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, transporte, CALCULADO_EN
+    )
+    assert obtenido == esperado
+    assert all(type(row["landed_cost_mxn"]) is float for row in obtenido)
+
+
+def test_vectorized_engine_accepts_columns():
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    columnas = {name: [row[name] for row in PRODUCTOS] for name in PRODUCTOS[0]}
+    esperado = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, "Maritimo", CALCULADO_EN
+    )
+    obtenido = cost_engine.calculate_landed_costs_vectorized(
+        columnas, {}, FX_MAP, pct_params, fixed_params, "Maritimo", CALCULADO_EN
+    )
+    assert obtenido == esperado
+
+
+def test_vectorized_engine_empty_catalog():
+    assert cost_engine.calculate_landed_costs_vectorized([], {}, FX_MAP, {}, {}, "Maritimo") == []
+
+
+def _previous_run(**overrides):
+    pct_params, _ = cost_engine.split_parametros(PARAMETROS)
+    previous = {
+        "productos_fecha_max": datetime(2026, 1, 10),
+        "fx_map": dict(FX_MAP),
+        "pct_params": dict(pct_params),
+    }
+    previous.update(overrides)
+    return previous
+
+
+def _productos_con_fecha():
+    productos = [dict(row, fecha_actualizacion=datetime(2026, 1, 5).date()) for row in PRODUCTOS]
+    productos[0]["fecha_actualizacion"] = datetime(2026, 1, 12).date()
+    return productos
+
+
+def test_detect_changed_skus_only_updated_and_new():
+    pct_params, _ = cost_engine.split_parametros(PARAMETROS)
+    productos = _productos_con_fecha()
+    cached = {row["sku"].strip() for row in productos} - {"RF-001"} | {"OLD-001"}
+    dirty, deleted = cost_engine.detect_changed_skus(
+        productos, FX_MAP, pct_params, _previous_run(), cached, "Maritimo"
+    )
+    assert dirty == {"EQ-001", "RF-001"}
+    assert deleted == {"OLD-001"}
+
+
+def test_detect_changed_skus_fx_and_category_freight():
+    pct_params, _ = cost_engine.split_parametros(PARAMETROS)
+    productos = _productos_con_fecha()
+    cached = {row["sku"].strip() for row in productos}
+    fx_map = dict(FX_MAP, EUR=19.5)
+    pct_params = dict(pct_params, maritimo_accesorio=0.02, aereo_insumo=0.2)
+    dirty, deleted = cost_engine.detect_changed_skus(
+        productos, fx_map, pct_params, _previous_run(), cached, "Maritimo"
+    )
+    assert dirty == {"EQ-001", "IN-001", "AC-001"}
+    assert deleted == set()
+
+
+def test_detect_changed_skus_global_param_forces_full():
+    pct_params, _ = cost_engine.split_parametros(PARAMETROS)
+    productos = _productos_con_fecha()
+    cached = {row["sku"].strip() for row in productos}
+    dirty, _ = cost_engine.detect_changed_skus(
+        productos, FX_MAP, dict(pct_params, arancel=0.2), _previous_run(), cached, "Maritimo"
+    )
+    assert dirty is None
+
+
+def test_normalize_transportes():
+    assert cost_engine.normalize_transportes("Maritimo") == ["Maritimo"]
+    assert cost_engine.normalize_transportes(["Maritimo, Aereo", "Aereo"]) == ["Maritimo", "Aereo"]
+    assert cost_engine.normalize_transportes(None) == []
+
+
+def test_price_columns_match_price_rows():
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    landed_rows = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, "Aereo", CALCULADO_EN
+    )
+    esperado = cost_engine.build_price_rows(landed_rows, pct_params["mark_up"], CALCULADO_EN)
+    landed_columns = cost_engine.calculate_landed_columns(
+        cost_engine.productos_to_columns(PRODUCTOS), FX_MAP, pct_params, fixed_params, "Aereo", CALCULADO_EN
+    )
+    obtenido = cost_engine.columns_to_rows(
+        cost_engine.calculate_price_columns(landed_columns, pct_params["mark_up"], CALCULADO_EN),
+        cost_engine.PRICE_COLUMNS,
+    )
+    assert obtenido == esperado
+    assert esperado[0]["precio_maximo"] == esperado[0]["precio_base_mxn"] * 2
+    assert esperado[0]["precio_direccion_min"] == esperado[0]["precio_maximo"] * 0.65
+
+
+def test_shard_indices_are_stable_partitions():
+    grupos = cost_engine.shard_indices(PRODUCTOS, 3, "sku")
+    assert sorted(i for grupo in grupos for i in grupo) == list(range(len(PRODUCTOS)))
+    assert grupos == cost_engine.shard_indices(PRODUCTOS, 3, "sku")
+    por_categoria = cost_engine.shard_indices(PRODUCTOS, 4, "categoria")
+    assert any({0, 1} <= set(grupo) for grupo in por_categoria)
+
+
+@pytest.mark.parametrize("engine", cost_engine.ENGINES)
+def test_compute_sharded_matches_single_process(engine):
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    snapshot = {"fx_map": FX_MAP, "pct_params": pct_params, "fixed_params": fixed_params, "listas": [{"id": 1}]}
+    resultado = cost_engine.compute_sharded(PRODUCTOS, snapshot, ["Maritimo"], engine, CALCULADO_EN, workers=2)
+    landed = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, "Maritimo", CALCULADO_EN
+    )
+    precios = cost_engine.build_price_rows(landed, pct_params["mark_up"], CALCULADO_EN)
+    assert resultado["Maritimo"]["landed"] == cost_engine._row_payload(landed, cost_engine.LANDED_COLUMNS)
+    assert resultado["Maritimo"]["prices"] == cost_engine._row_payload(precios, cost_engine.PRICE_COLUMNS)
+
+
+def test_simulate_prices_applies_overrides_without_touching_snapshot():
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    snapshot = {
+        "product_columns": cost_engine.productos_to_columns(PRODUCTOS),
+        "fx_map": dict(FX_MAP),
+        "pct_params": pct_params,
+        "fixed_params": fixed_params,
+    }
+    base = cost_engine.simulate_prices(snapshot, "Maritimo", calculado_en=CALCULADO_EN)
+    actuales = {column: base[column].copy() for column in cost_engine.PRICE_TIER_COLUMNS}
+    sin_cambios = cost_engine.summarize_price_delta(base, actuales)
+    assert all(col["delta"] == 0 for col in sin_cambios["columnas"].values())
+
+    mask = cost_engine.simulation_mask(snapshot["product_columns"], categorias=["Equipo"])
+    simulado = cost_engine.simulate_prices(snapshot, "Maritimo", {"usd": 20.0}, {"Arancel": 0.2}, mask)
+    assert list(simulado["sku"]) == ["EQ-001", "EQ-002"]
+    assert simulado["arancel_pct"] == 0.2
+    assert snapshot["fx_map"]["USD"] == 17.25 and snapshot["pct_params"]["arancel"] == 0.15
+    resumen = cost_engine.summarize_price_delta(simulado, {c: v[mask] for c, v in actuales.items()})
+    assert resumen["comparados"] == 2
+    assert resumen["columnas"]["precio_maximo"]["delta"] > 0
+
+
+def test_fx_grid_matches_single_scenarios():
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    product_columns = cost_engine.productos_to_columns(PRODUCTOS)
+    monedas, escenarios = cost_engine.fx_scenarios({"usd": (16.0, 22.0, 0.25)})
+    assert monedas == ["USD"] and len(escenarios) == 25 and escenarios[-1, 0] == 22.0
+    grid = cost_engine.calculate_fx_grid(product_columns, FX_MAP, pct_params, "Aereo", monedas, escenarios)
+    for j, usd in enumerate(escenarios[:, 0]):
+        landed = cost_engine.calculate_landed_columns(
+            product_columns, dict(FX_MAP, USD=usd), pct_params, fixed_params, "Aereo", CALCULADO_EN
+        )
+        precios = cost_engine.calculate_price_columns(landed, pct_params["mark_up"], CALCULADO_EN)
+        for column in ("landed_cost_mxn", *cost_engine.PRICE_TIER_COLUMNS):
+            assert grid[column][:, j].tolist() == precios[column].tolist()
+
+
+def test_currency_price_columns_match_per_currency_division():
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    landed = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, "Maritimo", CALCULADO_EN
+    )
+    precios = cost_engine.build_price_rows(landed, pct_params["mark_up"], CALCULADO_EN)
+    monedas = cost_engine.normalize_monedas_precio(["usd", "EUR,MXN", "USD"])
+    assert monedas == ["USD", "EUR"]
+    tipos_cambio = cost_engine.currency_rates(FX_MAP, monedas)
+    with pytest.raises(ValueError):
+        cost_engine.currency_rates(FX_MAP, ["GBP"])
+
+    columnas = cost_engine.calculate_currency_price_columns(precios, "Maritimo", monedas, tipos_cambio, CALCULADO_EN)
+    filas = cost_engine.columns_to_rows(columnas, cost_engine.PRICE_CURRENCY_COLUMNS)
+    assert len(filas) == len(precios) * len(monedas)
+    for moneda, tc in zip(monedas, tipos_cambio):
+        por_moneda = [fila for fila in filas if fila["moneda_precio"] == moneda]
+        assert [fila["sku"] for fila in por_moneda] == [fila["sku"] for fila in precios]
+        for fila, base in zip(por_moneda, precios):
+            assert fila["precio_base"] == base["precio_base_mxn"] / tc
+            assert fila["precio_direccion_min"] == base["precio_direccion_min"] / tc
+
+    # Mismo resultado desde tuplas (shards) y desde columnas (motor vectorizado)
+    tuplas = cost_engine._row_payload(precios, cost_engine.PRICE_COLUMNS)
+    desde_tuplas = cost_engine.calculate_currency_price_columns(tuplas, "Maritimo", monedas, tipos_cambio, CALCULADO_EN)
+    assert cost_engine.columns_to_rows(desde_tuplas, cost_engine.PRICE_CURRENCY_COLUMNS) == filas
+
+
+def test_price_tiers_match_baseline_near_half_cent():
+    # Antes los niveles se derivaban del Landed Cost y mark-up leídos de
+    # LandedCostCache (DECIMAL, en centavos); valores en la frontera de .005
+    valores = [10.005, 1.115, 2.675, 0.125, 10.0049999, 1234.565, 0.005, 99.995, 7.0]
+    landed_rows = [
+        {"sku": f"SKU{i}", "transporte": "Maritimo", "landed_cost_mxn": valor, "mark_up": valor * 1.1}
+        for i, valor in enumerate(valores)
+    ]
+
+    def baseline(valor):
+        precio_base = float(Decimal(f"{valor:.6f}").quantize(Decimal("0.01"), ROUND_HALF_UP))
+        precio_maximo = precio_base * 2
+        return {
+            "precio_base_mxn": precio_base,
+            "precio_maximo": precio_maximo,
+            **{column: precio_maximo * multiplier for column, multiplier in cost_engine.TIER_MULTIPLIERS.items()},
+        }
+
+    filas = cost_engine.build_price_rows(landed_rows, 0.1, CALCULADO_EN)
+    columnas = cost_engine.calculate_price_columns(
+        {
+            **{column: [0.0] * len(valores) for column in ("costo_base_mxn", "flete_pct", "seguro_pct", "arancel_pct", "dta_pct", "honorarios_aduanales_pct")},
+            "categoria": [""] * len(valores),
+            "sku": [fila["sku"] for fila in landed_rows],
+            "transporte": ["Maritimo"] * len(valores),
+            "landed_cost_mxn": np.array(valores),
+            "mark_up": np.array([fila["mark_up"] for fila in landed_rows]),
+        },
+        0.1,
+        CALCULADO_EN,
+    )
+    for i, (fila, origen) in enumerate(zip(filas, landed_rows)):
+        esperado = baseline(origen["mark_up"])
+        assert fila["landed_cost_mxn"] == baseline(origen["landed_cost_mxn"])["precio_base_mxn"]
+        assert columnas["landed_cost_mxn"][i] == fila["landed_cost_mxn"]
+        for column, valor in esperado.items():
+            assert fila[column] == valor, (origen, column)
+            assert columnas[column][i] == valor, (origen, column)
+
+
+def test_derived_tiers_view_uses_engine_multipliers():
+    assert set(cost_engine.PRICE_BASE_COLUMNS) <= set(cost_engine.PRICE_COLUMNS)
+    script = (Path(__file__).resolve().parents[1] / "sql" / "create_precios_base.sql").read_text(encoding="utf-8")
+    maximo = cost_engine.PRECIO_MAXIMO_MULTIPLIER
+    # Los niveles se derivan del precio base ya en centavos, como el motor
+    base = r"CAST\(b\.precio_base_mxn AS DECIMAL\(18,2\)\)"
+    assert re.search(rf"{base} \* {maximo} AS DECIMAL\(18,2\)\)\s+AS precio_maximo", script)
+    for column, multiplier in cost_engine.TIER_MULTIPLIERS.items():
+        assert re.search(rf"{base} \* {maximo} \* {multiplier:.2f} AS DECIMAL\(18,2\)\)\s+AS {column}", script)
+
+    # Las tuplas de los shards se proyectan a las columnas de PreciosBase
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    landed = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, "Maritimo", CALCULADO_EN
+    )
+    precios = cost_engine.build_price_rows(landed, pct_params["mark_up"], CALCULADO_EN)
+    escritos = []
+
+    class Writer:
+        def write(self, table, columns, rows, transporte, skus=None):
+            escritos.append((table, columns, rows))
+
+    tuplas = cost_engine._row_payload(precios, cost_engine.PRICE_COLUMNS)
+    cost_engine._write_prices(Writer(), {"derived_tiers": True}, tuplas, "Maritimo")
+    table, columns, rows = escritos[0]
+    assert table == "dbo.PreciosBase" and columns == cost_engine.PRICE_BASE_COLUMNS
+    assert rows == [tuple(fila[column] for column in columns) for fila in precios]
+
+
+def test_staging_merge_updates_only_changed_rows(monkeypatch):
+    ejecutadas = []
+
+    class Cursor:
+        def execute(self, query, *params):
+            ejecutadas.append(query)
+
+    class Conexion:
+        def cursor(self):
+            return Cursor()
+
+        def commit(self):
+            pass
+
+    monkeypatch.setattr(cost_engine, "insert_rows", lambda *args: None)
+    writer = cost_engine.StagingWriter(Conexion())
+    precios = cost_engine.build_price_rows(
+        [{"sku": "A", "transporte": "Maritimo", "landed_cost_mxn": 10.0, "mark_up": 11.0}], 0.1, CALCULADO_EN
+    )
+    writer.write("dbo.PreciosCalculados", cost_engine.PRICE_COLUMNS, precios, "Maritimo")
+    writer.finish()
+
+    merge = next(query for query in ejecutadas if "MERGE" in query)
+    condicion = re.search(r"WHEN MATCHED AND EXISTS \((.+?)\) THEN UPDATE", merge, re.S).group(1)
+    origen, destino = (parte.strip() for parte in condicion.split("EXCEPT"))
+    assert origen.replace("s.", "t.") == destino
+    comparadas = origen.removeprefix("SELECT ").replace("s.", "").split(", ")
+    assert "precio_direccion_min" in comparadas
+    assert not {"sku", "transporte", "fecha_calculo"} & set(comparadas)
+    assert "t.fecha_calculo = s.fecha_calculo" in merge
+
+
+def test_snapshot_file_round_trip(tmp_path):
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    landed = []
+    for transporte in ("Maritimo", "Aereo"):
+        landed += cost_engine.calculate_landed_costs(
+            PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, transporte, CALCULADO_EN
+        )
+    precios = cost_engine.build_price_rows(landed, pct_params["mark_up"], CALCULADO_EN)
+    tablas = {"dbo.PreciosCalculados": precios, "dbo.LandedCostCache": landed}
+
+    class Cursor:
+        def execute(self, query, params=()):
+            if "OBJECT_ID" in query:
+                self.filas = [(None,)]  # Sin dbo.RecalculoEjecuciones
+                return
+            columnas, tabla = re.match(r"SELECT (.+) FROM (\S+)", query).groups()
+            self.description = [(column,) for column in columnas.split(", ")]
+            self.filas = [tuple(fila.get(column) for column, in self.description) for fila in tablas[tabla]]
+
+        def fetchall(self):
+            return self.filas
+
+        def fetchone(self):
+            return self.filas[0]
+
+    ruta = tmp_path / "precios.snap"
+    filas = cost_engine.write_snapshot_file(Cursor(), str(ruta))
+    assert filas == {"precios": len(precios), "landed": len(landed)}
+    assert not list(tmp_path.glob("*.tmp"))
+    foto = cost_engine.SnapshotFile(str(ruta))
+    assert len(foto) == len(precios)
+
+    esperado = next(fila for fila in precios if fila["transporte"] == "Aereo")
+    encontrado = foto.lookup(esperado["sku"], "Aereo")
+    assert encontrado["precio_direccion_min"] == pytest.approx(esperado["precio_direccion_min"])
+    assert encontrado["fecha_calculo"] == CALCULADO_EN.replace(tzinfo=None)
+    assert foto.lookup("NO-EXISTE", "Aereo") is None
+    assert [fila["transporte"] for fila in foto.rows(esperado["sku"])] == ["Aereo", "Maritimo"]
+    assert len(foto.rows(transporte="Maritimo", tabla="landed")) == len(PRODUCTOS)
+    assert [fila["sku"] for fila in foto.rows()] == sorted(fila["sku"] for fila in precios)
+
+    # Páginas por clave (sku, transporte): juntas dan las mismas filas que sin paginar
+    paginas, despues = [], None
+    while pagina := foto.rows(despues=despues, limite=2):
+        paginas += pagina
+        despues = (pagina[-1]["sku"], pagina[-1]["transporte"])
+    assert paginas == foto.rows()
+    assert foto.rows(esperado["sku"], despues=(esperado["sku"], "Aereo")) == foto.rows(esperado["sku"], "Maritimo")
+
+
+def test_streaming_rejects_diff_persistence(monkeypatch):
+    with pytest.raises(ValueError, match="diferencial"):
+        cost_engine.run_calculations("Maritimo", streaming=True, persist_mode="diferencial")
+    monkeypatch.setattr("sys.argv", ["cost_engine.py", "--streaming", "--persistencia", "diferencial"])
+    with pytest.raises(SystemExit):
+        cost_engine.parse_args()
+
+
+def test_sensitivity_parquet_streams_one_row_group_per_block(monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import sys
+    from io import BytesIO
+
+    from fastapi.testclient import TestClient
+
+    from app.auth import get_current_user
+    from app.config import settings
+    from app.db import get_connection
+    from app.main import app
+    from app.routes import pricing
+
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    snapshot = {
+        "product_columns": cost_engine.productos_to_columns(PRODUCTOS),
+        "fx_map": FX_MAP,
+        "pct_params": pct_params,
+        "fixed_params": fixed_params,
+    }
+    monkeypatch.setattr(pricing, "get_reference_snapshot", lambda conn, ttl: snapshot)
+    monkeypatch.setattr(settings, "pricing_batch_size", 1)
+    app.dependency_overrides[get_connection] = lambda: None
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Direccion", "username": "direccion"}
+    cuerpo = {"transporte": "Aereo", "rangos": [{"moneda": "USD", "desde": 16, "hasta": 17, "paso": 0.5}]}
+    try:
+        respuesta = TestClient(app).post("/pricing/sensitivity", json={**cuerpo, "formato": "parquet"})
+        # Sin pyarrow el formato no está disponible en el servidor
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        sin_pyarrow = TestClient(app).post("/pricing/sensitivity", json={**cuerpo, "formato": "parquet"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert respuesta.status_code == 200
+    archivo = pq.ParquetFile(BytesIO(respuesta.content))
+    assert archivo.num_row_groups == len(PRODUCTOS)
+    filas = archivo.read().to_pylist()
+    esperado = cost_engine.iter_fx_grid(
+        snapshot, "Aereo", {"USD": (16, 17, 0.5)}, ["landed_cost_mxn", *cost_engine.PRICE_TIER_COLUMNS]
+    )
+    assert [tuple(fila.values()) for fila in filas] == list(esperado)
+    assert sin_pyarrow.status_code == 501
+
+
+def test_failed_run_is_logged_after_rollback():
+    eventos = []
+
+    class Cursor:
+        def execute(self, query, *params):
+            if "OBJECT_ID('dbo.RecalculoEjecuciones'" in query:
+                return
+            if "sp_getapplock" in query or "sp_releaseapplock" in query:
+                eventos.append(("lock" if "sp_getapplock" in query else "unlock", params[0]))
+                return
+            raise cost_engine.pyodbc.Error("sin Productos")
+
+        def fetchone(self):
+            return (1,)
+
+        def executemany(self, query, filas):
+            eventos.append(("insert", filas))
+
+    class Conexion:
+        def cursor(self):
+            return Cursor()
+
+        def rollback(self):
+            eventos.append(("rollback",))
+
+        def commit(self):
+            eventos.append(("commit",))
+
+    with pytest.raises(cost_engine.pyodbc.Error, match="sin Productos"):
+        cost_engine.run_calculations(["Maritimo", "Aereo"], conn=Conexion())
+    assert [evento[0] for evento in eventos] == ["lock", "lock", "rollback", "insert", "commit", "unlock", "unlock"]
+    # Candados en orden fijo (sin interbloqueos entre recálculos) y liberados al final
+    assert [evento[1] for evento in eventos if evento[0] == "lock"] == ["recalculo:aereo", "recalculo:maritimo"]
+    assert [evento[1] for evento in eventos if evento[0] == "unlock"] == ["recalculo:maritimo", "recalculo:aereo"]
+    filas = eventos[3][1]
+    assert [(fila[1], fila[2]) for fila in filas] == [("Maritimo", "error"), ("Aereo", "error")]
+    assert filas[0][0] == filas[1][0]  # Misma corrida
+    assert "sin Productos" in filas[0][6]
+
+
+def test_run_lock_timeout_releases_taken_locks():
+    ejecutadas = []
+
+    class Cursor:
+        def execute(self, query, *params):
+            ejecutadas.append(("lock" if "sp_getapplock" in query else "unlock", params[0]))
+
+        def fetchone(self):
+            # El primer transporte se obtiene; el segundo agota la espera (-1)
+            return (0,) if len(ejecutadas) == 1 else (-1,)
+
+    with pytest.raises(RuntimeError, match="maritimo sigue en curso"):
+        cost_engine.acquire_run_locks(Cursor(), ["Maritimo", "Aereo"], timeout_s=1)
+    assert ejecutadas == [
+        ("lock", "recalculo:aereo"),
+        ("lock", "recalculo:maritimo"),
+        ("unlock", "recalculo:aereo"),
+    ]
+
+
+def test_versioned_writer_merges_landed_from_staging(monkeypatch):
+    ejecutadas, insertadas, commits = [], [], []
+
+    class Cursor:
+        rowcount = 1
+
+        def execute(self, query, *params):
+            ejecutadas.append(" ".join(query.split()))
+            self.fila = (7,) if "version_id" in query else (1,)
+            if "SELECT transporte FROM dbo.PreciosVersiones" in query:
+                self.fila = ("Maritimo",)
+
+        def fetchone(self):
+            return self.fila
+
+    class Conexion:
+        def cursor(self):
+            return Cursor()
+
+        def commit(self):
+            commits.append(True)
+
+    monkeypatch.setattr(cost_engine, "insert_rows", lambda cursor, table, *args: insertadas.append(table))
+    pct_params, fixed_params = cost_engine.split_parametros(PARAMETROS)
+    landed = cost_engine.calculate_landed_costs(
+        PRODUCTOS, {}, FX_MAP, pct_params, fixed_params, "Maritimo", CALCULADO_EN
+    )
+    precios = cost_engine.build_price_rows(landed, pct_params["mark_up"], CALCULADO_EN)
+    writer = cost_engine.VersionedWriter(Conexion())
+    writer.write("dbo.LandedCostCache", cost_engine.LANDED_COLUMNS, landed, "Maritimo")
+    writer.write("dbo.PreciosCalculados", cost_engine.PRICE_COLUMNS, precios, "Maritimo")
+    writer.finish()
+
+    assert insertadas == ["dbo.LandedCostCache_Staging", "dbo.PreciosCalculadosVersion"]
+    # Sin DELETE de LandedCostCache ni COMMIT intermedio: todo va en la transacción de la ejecución
+    assert not any(query.startswith("DELETE FROM dbo.LandedCostCache WHERE") for query in ejecutadas)
+    assert not commits
+    merge = next(i for i, query in enumerate(ejecutadas) if query.startswith("MERGE dbo.LandedCostCache"))
+    publicacion = next(i for i, query in enumerate(ejecutadas) if "UPDATE dbo.PreciosVersionActual" in query)
+    assert merge < publicacion
+
+
+def test_prune_thread_is_daemon_and_awaitable(monkeypatch):
+    import threading
+
+    liberar = threading.Event()
+    monkeypatch.setattr(cost_engine, "prune_price_versions", lambda transportes, keep: liberar.wait(5))
+    hilo = cost_engine._prune_in_background(["Maritimo"], 3)
+    assert hilo.daemon
+    assert not cost_engine.wait_for_prunes(timeout=0.01)
+    liberar.set()
+    assert cost_engine.wait_for_prunes(timeout=5)
+    assert not hilo.is_alive()
+
+
+def test_run_log_position_is_one_seek_once_the_counter_exists(monkeypatch):
+    consultas = []
+
+    class Cursor:
+        def execute(self, query, *params):
+            consultas.append((" ".join(query.split()), params))
+
+        def executemany(self, query, filas):
+            consultas.append(("insert", len(filas)))
+
+        def fetchone(self):
+            return (11,)
+
+    monkeypatch.setattr(cost_engine, "_RUN_LOG_COUNTER", {"existe": False})
+    cursor = Cursor()
+    assert cost_engine.run_log_position(cursor) == 11
+    assert cost_engine.run_log_position(cursor) == 11
+    # La existencia se consulta una vez; después, solo la fila del contador
+    assert [q for q, _ in consultas] == [
+        "SELECT OBJECT_ID('dbo.RecalculoPosicion', 'U')",
+        "SELECT posicion FROM dbo.RecalculoPosicion WHERE id = 1",
+        "SELECT posicion FROM dbo.RecalculoPosicion WHERE id = 1",
+    ]
+
+    # El contador sube en la misma transacción que las filas 'ok'; un error no lo mueve
+    consultas.clear()
+    cost_engine.save_run_outcome(cursor, ["Maritimo", "Aereo"], "ok", 1.0)
+    cost_engine.save_run_outcome(cursor, ["Maritimo"], "error", 1.0, error="x")
+    assert consultas[0] == ("insert", 2)
+    assert "UPDATE dbo.RecalculoPosicion SET posicion = posicion + ?" in consultas[1][0]
+    assert consultas[1][1] == (2,)
+    assert consultas[2:] == [("insert", 1)]
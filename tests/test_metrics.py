@@ -0,0 +1,66 @@
+from app import metrics
+
+
+def test_observe_recalculation_renders_prometheus_text():
+    summary = {
+        "timings": {"total_s": 1.5},
+        "stages": {
+            "fetch": {"seconds": 0.2, "rows": 1010},
+            "build": {"seconds": 0.001, "rows": 10},
+            "landed_compute": {"seconds": 0.3, "rows": 1000},
+            "commit": {"seconds": 0.05, "rows": 2000},
+        },
+        "transportes": {
+            "Maritimo": {
+                "landed_rows": 1000,
+                "price_rows": 1000,
+                "timings": {
+                    "landed_compute_s": 0.3,
+                    "landed_persist_s": 0.6,
+                    "price_compute_s": 0.1,
+                    "price_persist_s": 0.25,
+                },
+            }
+        },
+    }
+    metrics.observe_recalculation(summary)
+    texto = "\n".join(metrics.render())
+    assert 'pricing_recalc_stage_seconds_bucket{stage="landed_persist",transporte="Maritimo",le="1"} 1' in texto
+    assert 'pricing_recalc_stage_seconds_bucket{stage="landed_persist",transporte="Maritimo",le="0.5"} 0' in texto
+    assert 'pricing_recalc_stage_rows{stage="fetch",transporte="todos"} 1010' in texto
+    assert 'pricing_recalc_last_duration_seconds{transporte="Maritimo"} 1.5' in texto
+    assert "pricing_recalc_last_success_timestamp_seconds{transporte=\"Maritimo\"}" in texto
+    assert "# TYPE pricing_recalc_runs_total counter" in texto
+
+
+def test_recalculation_log_overrides_process_values():
+    from datetime import datetime, timezone
+    from decimal import Decimal
+
+    class Cursor:
+        def execute(self, query, *params):
+            self.query = query
+
+        def fetchone(self):
+            return (1,)
+
+        def fetchall(self):
+            if "ROW_NUMBER" in self.query:
+                return [("Aereo", datetime(2026, 3, 1, 2, 0), Decimal("42.5000"))]
+            return [("ok", 7), ("error", 2)]
+
+    metrics.recalc_runs.inc(resultado="ok")
+    assert metrics.load_recalculation_log(Cursor())
+    texto = "\n".join(metrics.render())
+    epoch = datetime(2026, 3, 1, 2, 0, tzinfo=timezone.utc).timestamp()
+    assert f'pricing_recalc_last_success_timestamp_seconds{{transporte="Aereo"}} {int(epoch)}' in texto
+    assert 'pricing_recalc_last_duration_seconds{transporte="Aereo"} 42.5' in texto
+    assert 'pricing_recalc_runs_total{resultado="ok"} 7' in texto
+    assert 'pricing_recalc_runs_total{resultado="error"} 2' in texto
+
+    class SinTabla(Cursor):
+        def fetchone(self):
+            return (None,)
+
+    assert not metrics.load_recalculation_log(SinTabla())
+    assert 'pricing_recalc_runs_total{resultado="ok"} 7' in "\n".join(metrics.render())
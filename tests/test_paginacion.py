@@ -0,0 +1,136 @@
+import re
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import cache_respuestas, paginacion, precios_snapshot
+from app.auth import get_current_user
+from app.db import get_connection
+from app.main import app
+
+from test_precios_snapshot import FILAS, _fila
+
+
+def test_cursor_round_trip_and_rejects_foreign_tokens():
+    cursor = paginacion.codificar(["SKU-Ñ", "Aereo"])
+    assert paginacion.decodificar(cursor, paginacion.CLAVE_PRECIOS) == ("SKU-Ñ", "Aereo")
+    for invalido in ("no-es-base64!", paginacion.codificar(["SKU-1"]), "e30"):
+        with pytest.raises(HTTPException) as error:
+            paginacion.decodificar(invalido, paginacion.CLAVE_PRECIOS)
+        assert error.value.status_code == 400
+
+
+def test_sql_condition_seeks_on_first_column():
+    condicion, valores = paginacion.filtro_sql(("SKU-1", "Aereo"), paginacion.CLAVE_PRECIOS, alias="p.")
+    bin2 = " COLLATE Latin1_General_BIN2"
+    assert condicion == f" AND p.sku{bin2} >= ? AND (p.sku{bin2} > ? OR p.transporte{bin2} > ?)"
+    assert paginacion.orden_sql(paginacion.CLAVE_PRECIOS, alias="p.") == f" ORDER BY p.sku{bin2}, p.transporte{bin2}"
+    assert valores == ["SKU-1", "SKU-1", "Aereo"]
+    assert paginacion.limite_sql(50) == (" OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", [51])
+    assert paginacion.filtro_sql(None, paginacion.CLAVE_PRODUCTOS) == ("", [])
+
+
+def test_snapshot_pages_follow_key_order():
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS)
+    claves = [(r["sku"], r["transporte"]) for r in snapshot.rows(despues=("SKU-1", "Aereo"), limite=5)]
+    assert claves == [("SKU-1", "Maritimo"), ("SKU-2", "Maritimo")]
+    assert [r["sku"] for r in snapshot.rows(transporte="Maritimo", despues=("SKU-1", "Zzz"))] == ["SKU-2"]
+    assert snapshot.rows(sku="SKU-1", despues=("SKU-1", "Maritimo")) == []
+    assert [r["sku"] for r in snapshot.rows(despues=("SKU-0", "Aereo"), limite=1)] == ["SKU-1"]
+
+
+def test_listas_walks_pages_with_next_cursor_header(monkeypatch):
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 3)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: snapshot)
+    monkeypatch.setattr(cache_respuestas, "cache", cache_respuestas.CacheRespuestas(1024 * 1024))
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Direccion", "username": "dir"}
+    app.dependency_overrides[get_connection] = lambda: None
+    cliente = TestClient(app)
+    try:
+        for _ in range(2):
+            # Dos vueltas: la segunda sale de la caché con el mismo encabezado
+            claves, params = [], {"limite": 2}
+            while True:
+                respuesta = cliente.get("/pricing/listas", params=params)
+                assert respuesta.status_code == 200
+                claves += [(r["sku"], r["transporte"]) for r in respuesta.json()]
+                siguiente = respuesta.headers.get(paginacion.ENCABEZADO)
+                if siguiente is None:
+                    break
+                params = {"limite": 2, "cursor": siguiente}
+            assert claves == [("SKU-1", "Aereo"), ("SKU-1", "Maritimo"), ("SKU-2", "Maritimo")]
+        assert cliente.get("/pricing/listas", params={"cursor": "%%"}).status_code == 400
+        assert paginacion.ENCABEZADO not in cliente.get("/pricing/listas").headers
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_pages_continue_across_snapshot_file_and_database_in_binary_order(monkeypatch, tmp_path):
+    """Mayúsculas y guiones: la intercalación CI ordena distinto; BIN2 coincide con las fotos."""
+    import cost_engine
+
+    skus = ["sku-10", "SKU-2 ", "SKU10", "Sku-1", "SKU_3", "abc-1", "ABC-2  ", "SKU-2-A"]
+    tabla = [_fila(sku, transporte, Decimal("10.00")) for sku in skus for transporte in ("Aereo", "Maritimo")]
+    # Punto de código tras quitar espacios = Latin1_General_BIN2 (que ignora espacios finales)
+    esperado = sorted((f["sku"].strip(), f["transporte"]) for f in tabla)
+    bin2 = " COLLATE Latin1_General_BIN2"
+
+    class Cursor:
+        """Base que solo responde si el orden y la condición usan BIN2."""
+
+        def execute(self, query, params=()):
+            if "OBJECT_ID" in query:
+                self.description, self.filas = [("id",)], [(None,)]
+                return
+            columnas = re.match(r"\s*SELECT (.+?)\s+FROM", query, re.S).group(1).replace("p.", "").split(", ")
+            filas = sorted(tabla, key=lambda f: (f["sku"].rstrip(), f["transporte"]))
+            if "ORDER BY" in query:
+                assert f"ORDER BY p.sku{bin2}, p.transporte{bin2}" in query
+                if ">= ?" in query:
+                    assert f"p.sku{bin2} >= ?" in query
+                    despues = (params[0].rstrip(), params[2].rstrip())
+                    filas = [f for f in filas if (f["sku"].rstrip(), f["transporte"]) > despues]
+                filas = filas[: params[-1]]
+            self.description = [(column,) for column in columnas]
+            self.filas = [tuple(f.get(column) for column in columnas) for f in filas]
+
+        def fetchall(self):
+            return self.filas
+
+        def fetchone(self):
+            return self.filas[0]
+
+    class Conexion:
+        def cursor(self):
+            return Cursor()
+
+    ruta = tmp_path / "precios.snap"
+    cost_engine.write_snapshot_file(Cursor(), str(ruta))
+    fuentes = [
+        precios_snapshot.PreciosSnapshot.from_rows(tabla, 1),
+        None,  # Base de datos
+        cost_engine.SnapshotFile(str(ruta)),
+    ]
+    monkeypatch.setattr(cache_respuestas, "cache", cache_respuestas.CacheRespuestas(0))
+    app.dependency_overrides[get_connection] = Conexion
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Direccion", "username": "dir"}
+    cliente = TestClient(app)
+    try:
+        for inicio in range(len(fuentes)):
+            # Cada página sale de otra fuente, empezando por cada una
+            claves, params, pagina = [], {"limite": 3}, inicio
+            while True:
+                fuente = fuentes[pagina % len(fuentes)]
+                monkeypatch.setattr(precios_snapshot, "current", lambda: fuente)
+                respuesta = cliente.get("/pricing/listas", params=params)
+                assert respuesta.status_code == 200
+                claves += [(r["sku"].strip(), r["transporte"]) for r in respuesta.json()]
+                siguiente = respuesta.headers.get(paginacion.ENCABEZADO)
+                if siguiente is None:
+                    break
+                params, pagina = {"limite": 3, "cursor": siguiente}, pagina + 1
+            assert claves == esperado
+    finally:
+        app.dependency_overrides.clear()
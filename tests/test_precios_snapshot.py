@@ -0,0 +1,351 @@
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app import precios_snapshot
+from app.config import settings
+
+FECHA = datetime(2026, 3, 1, 12, 0)
+
+
+def _fila(sku, transporte, base):
+    fila = dict.fromkeys(precios_snapshot.COLUMNAS)
+    maximo = base * 2
+    fila.update(
+        sku=sku,
+        transporte=transporte,
+        landed_cost_mxn=base * Decimal("0.9"),
+        precio_base_mxn=base,
+        precio_maximo=maximo,
+        precio_vendedor_min=maximo * Decimal("0.80"),
+        precio_direccion_min=maximo * Decimal("0.65"),
+        markup_pct=Decimal("0.10"),
+        fecha_calculo=FECHA,
+        categoria="Equipo",
+    )
+    return fila
+
+
+def _estado(snapshot=None, vigente=False, generacion=0):
+    """Estado del módulo con una foto dada y sin recargas ni verificaciones en curso."""
+    return {
+        "snapshot": snapshot, "vigente": vigente, "cargando": False, "generacion": generacion,
+        "verificando": False, "verificado_en": 0.0, "bitacora": None,
+    }
+
+
+FILAS = [
+    _fila("SKU-2", "Maritimo", Decimal("150.00")),
+    _fila("SKU-1", "Maritimo", Decimal("100.00")),
+    _fila("SKU-1", "Aereo", Decimal("120.00")),
+]
+
+
+def test_lookup_and_rows_match_database_rows():
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS)
+    assert len(snapshot) == 3
+    fila = snapshot.lookup("SKU-1", "Maritimo")
+    assert fila["precio_maximo"] == 200.0
+    assert fila["precio_gerente_com_min"] is None
+    assert fila["fecha_calculo"] == FECHA
+    assert snapshot.lookup("SKU-9", "Maritimo") is None
+
+    # Mismo orden que ORDER BY sku, transporte
+    assert [(r["sku"], r["transporte"]) for r in snapshot.rows()] == [
+        ("SKU-1", "Aereo"), ("SKU-1", "Maritimo"), ("SKU-2", "Maritimo")
+    ]
+    assert [r["transporte"] for r in snapshot.rows(sku="SKU-1")] == ["Aereo", "Maritimo"]
+    assert [r["sku"] for r in snapshot.rows(transporte="Maritimo")] == ["SKU-1", "SKU-2"]
+    assert snapshot.rows(sku="SKU-2", transporte="Aereo") == []
+    assert snapshot.rows(sku="SKU-9") == []
+
+    with pytest.raises(ValueError):
+        snapshot.columnas["precio_maximo"][0] = np.float64(1)
+
+
+def test_lookup_ignores_case_and_padding_like_sql_server():
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS + [_fila("abc-7 ", "Aereo", Decimal("10.00"))])
+    assert snapshot.lookup("sku-1", "maritimo")["precio_maximo"] == 200.0
+    assert snapshot.lookup("  SKU-1  ", "MARITIMO ")["precio_maximo"] == 200.0
+    assert snapshot.lookup("ABC-7", "aereo")["sku"] == "abc-7"
+    assert [r["transporte"] for r in snapshot.rows(sku="Sku-1 ")] == ["Aereo", "Maritimo"]
+    assert [r["sku"] for r in snapshot.rows(transporte="maritimo")] == ["SKU-1", "SKU-2"]
+
+
+def test_verified_snapshot_requires_current_run_log(monkeypatch):
+    posicion = {"valor": 4}
+    monkeypatch.setattr(precios_snapshot, "run_log_position", lambda cursor: posicion["valor"])
+    invalidaciones = []
+    monkeypatch.setattr(precios_snapshot, "invalidate", lambda: invalidaciones.append(True))
+
+    class Conexion:
+        def cursor(self):
+            return None
+
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1, bitacora=4)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: snapshot)
+    assert precios_snapshot.current_verificada(Conexion()) is snapshot
+
+    # Otro proceso recalculó: la autorización consulta la base y la foto se recarga
+    posicion["valor"] = 5
+    assert precios_snapshot.current_verificada(Conexion()) is None
+    assert invalidaciones == [True]
+
+    # Sin bitácora no se puede comparar
+    sin_bitacora = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: sin_bitacora)
+    assert precios_snapshot.current_verificada(Conexion()) is None
+
+
+def test_background_check_invalidates_after_external_recalculation(monkeypatch):
+    class Conexion:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def cursor(self):
+            return None
+
+    invalidaciones = []
+    monkeypatch.setattr(precios_snapshot, "connection_scope", Conexion)
+    monkeypatch.setattr(precios_snapshot, "run_log_position", lambda cursor: 8)
+    monkeypatch.setattr(precios_snapshot, "invalidate", lambda: invalidaciones.append(True))
+    monkeypatch.setattr(settings, "pricing_snapshot_ttl", 60.0)
+    monkeypatch.setattr(settings, "pricing_snapshot_poll", 5.0)
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1, bitacora=7)
+    monkeypatch.setattr(precios_snapshot, "_estado", _estado(snapshot, vigente=True, generacion=1))
+    # La solicitud no espera la verificación: recibe la foto y la comparación corre en otro hilo
+    assert precios_snapshot.current() is snapshot
+    for hilo in threading.enumerate():
+        if hilo.name == "verifica-precios":
+            hilo.join(5)
+    assert invalidaciones == [True]
+    # La siguiente verificación espera PRICING_SNAPSHOT_POLL
+    assert precios_snapshot.current() is snapshot
+    assert not any(hilo.name == "verifica-precios" for hilo in threading.enumerate())
+
+
+def test_current_falls_back_until_reloaded(monkeypatch):
+    cargas = []
+    liberar = threading.Event()
+
+    def load(conn, generacion=0):
+        liberar.wait(5)
+        cargas.append(generacion)
+        return precios_snapshot.PreciosSnapshot.from_rows(FILAS, generacion)
+
+    class Conexion:
+        def __enter__(self):
+            return None
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(precios_snapshot, "load", load)
+    monkeypatch.setattr(precios_snapshot, "connection_scope", Conexion)
+    monkeypatch.setattr(settings, "pricing_snapshot_ttl", 60.0)
+    monkeypatch.setattr(settings, "pricing_snapshot_poll", 0.0)
+    monkeypatch.setattr(precios_snapshot, "_estado", _estado(None, vigente=False, generacion=0))
+
+    def esperar_carga():
+        for hilo in threading.enumerate():
+            if hilo.name == "recarga-precios":
+                hilo.join(5)
+
+    precios_snapshot.start()
+    assert precios_snapshot.current() is None  # Cargando: se consulta la base
+    liberar.set()
+    esperar_carga()
+    snapshot = precios_snapshot.current()
+    assert snapshot is not None and snapshot.generacion == 0
+
+    # Un recálculo invalida la foto: se vuelve a la base hasta recargarla
+    liberar.clear()
+    precios_snapshot.invalidate()
+    assert precios_snapshot.current() is None
+    liberar.set()
+    esperar_carga()
+    assert precios_snapshot.current().generacion == 1
+    assert cargas == [0, 1]
+
+
+def test_expired_snapshot_is_served_while_reloading(monkeypatch):
+    recargas = []
+    monkeypatch.setattr(settings, "pricing_snapshot_ttl", 60.0)
+    monkeypatch.setattr(settings, "pricing_snapshot_poll", 0.0)
+    monkeypatch.setattr(precios_snapshot, "_recargar_en_segundo_plano", lambda: recargas.append(True))
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1)
+    snapshot.cargado_en -= 61
+    monkeypatch.setattr(precios_snapshot, "_estado", _estado(snapshot, vigente=True, generacion=1))
+    # Vencida: la solicitud sigue con la foto y la recarga corre aparte
+    assert precios_snapshot.current() is snapshot
+    assert recargas == [True]
+    # Invalidada (recálculo): las rutas vuelven a la base
+    precios_snapshot._estado["vigente"] = False
+    assert precios_snapshot.current() is None
+
+
+def test_snapshot_file_behind_run_log_falls_back_to_database(monkeypatch):
+    class Conexion:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def cursor(self):
+            return None
+
+    class Foto:
+        bitacora = 4
+
+    foto = Foto()
+    posiciones = [4]
+    invalidaciones = []
+    monkeypatch.setattr(settings, "pricing_snapshot_file", "precios.snap")
+    monkeypatch.setattr(settings, "pricing_snapshot_poll", 5.0)
+    monkeypatch.setattr(precios_snapshot, "archivo", lambda: foto)
+    monkeypatch.setattr(precios_snapshot, "_archivo", {"firma": None, "foto": foto})
+    monkeypatch.setattr(precios_snapshot, "connection_scope", Conexion)
+    monkeypatch.setattr(precios_snapshot, "run_log_position", lambda cursor: posiciones[-1])
+    monkeypatch.setattr(precios_snapshot, "invalidate", lambda: invalidaciones.append(True))
+    monkeypatch.setattr(precios_snapshot, "_estado", _estado())
+
+    precios_snapshot._verificar()
+    precios_snapshot._estado["verificado_en"] = time.monotonic()
+    assert precios_snapshot.current() is foto
+    # La CLI recalculó sin reescribir el archivo: se consulta la base
+    posiciones.append(5)
+    precios_snapshot._verificar()
+    precios_snapshot._estado["verificado_en"] = time.monotonic()
+    assert precios_snapshot.current() is None
+    # El siguiente recálculo con --archivo-foto lo pone al día
+    foto.bitacora = 6
+    assert precios_snapshot.current() is foto
+    assert invalidaciones == []
+
+
+def test_bulk_lookup_masks_costs_and_reports_unknown_skus(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.auth import get_current_user
+    from app.db import get_connection
+    from app.main import app
+
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: snapshot)
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Vendedor", "username": "vendedor"}
+    app.dependency_overrides[get_connection] = lambda: None
+    try:
+        respuesta = TestClient(app).post(
+            "/pricing/lookup",
+            json={"items": [
+                {"sku": "SKU-2", "transporte": "Maritimo"},
+                {"sku": "SKU-9", "transporte": "Maritimo"},
+                {"sku": "SKU-1", "transporte": "Aereo"},
+            ]},
+        )
+        demasiados = TestClient(app).post("/pricing/lookup", json={"items": [{"sku": "X"}] * 501})
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.status_code == 200
+    resultados = respuesta.json()
+    assert [(r["sku"], r["encontrado"]) for r in resultados] == [("SKU-2", True), ("SKU-9", False), ("SKU-1", True)]
+    assert resultados[1]["precio"] is None
+    assert resultados[0]["precio"]["precio_maximo_lista"] == 300.0
+    assert resultados[0]["precio"]["landed_cost_mxn"] is None  # Vendedor no ve costos
+    assert demasiados.status_code == 400
+
+
+def test_bulk_lookup_same_answer_from_snapshot_file_and_database(monkeypatch, tmp_path):
+    import re
+
+    from fastapi.testclient import TestClient
+
+    import cost_engine
+    from app.auth import get_current_user
+    from app.db import get_connection
+    from app.main import app
+    from app.routes import pricing
+
+    tabla = FILAS + [_fila("Abc-7 ", "Aereo", Decimal("10.00"))]
+
+    def igual_ci(a, b):
+        # Intercalación CI de SQL Server: sin mayúsculas ni espacios finales
+        return a.rstrip().casefold() == b.rstrip().casefold()
+
+    class Cursor:
+        def execute(self, query, params=()):
+            if "OBJECT_ID" in query:
+                self.description, self.filas = [("id",)], [(None,)]
+                return
+            if "VALUES" in query:
+                pares = list(zip(params[::2], params[1::2]))
+                columnas = precios_snapshot.COLUMNAS
+                filas = [f for f in tabla if any(igual_ci(f["sku"], s) and igual_ci(f["transporte"], t) for s, t in pares)]
+            else:
+                texto, origen = re.match(r"SELECT (.+) FROM (\S+)", query).groups()
+                columnas = texto.split(", ")
+                filas = tabla if "Precios" in origen else []
+            self.description = [(column,) for column in columnas]
+            self.filas = [tuple(fila.get(column) for column in columnas) for fila in filas]
+
+        def fetchall(self):
+            return self.filas
+
+        def fetchone(self):
+            return self.filas[0]
+
+    class Conexion:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def cursor(self):
+            return Cursor()
+
+    ruta = tmp_path / "precios.snap"
+    cost_engine.write_snapshot_file(Cursor(), str(ruta))
+    fuentes = {
+        "memoria": lambda: precios_snapshot.PreciosSnapshot.from_rows(tabla, 1),
+        "archivo": lambda: cost_engine.SnapshotFile(str(ruta)),
+        "base": lambda: None,
+    }
+    items = [
+        {"sku": " sku-1 ", "transporte": "maritimo"},
+        {"sku": "SKU-1", "transporte": "AEREO "},
+        {"sku": "abc-7", "transporte": "Aereo"},
+        {"sku": "ABC-7  "},
+        {"sku": "SKU-9", "transporte": "Maritimo"},
+    ]
+    monkeypatch.setattr(settings, "default_transporte", "Aereo")
+    app.dependency_overrides[get_connection] = Conexion
+    app.dependency_overrides[get_current_user] = lambda: {"rol": "Direccion", "username": "direccion"}
+    respuestas = {}
+    try:
+        for nombre, fuente in fuentes.items():
+            monkeypatch.setattr(precios_snapshot, "current", fuente)
+            respuesta = TestClient(app).post("/pricing/lookup", json={"items": items})
+            assert respuesta.status_code == 200
+            respuestas[nombre] = [
+                (r["sku"], r["transporte"], r["encontrado"], r["precio"] and r["precio"]["precio_maximo_lista"])
+                for r in respuesta.json()
+            ]
+    finally:
+        app.dependency_overrides.clear()
+    assert respuestas["memoria"] == respuestas["archivo"] == respuestas["base"]
+    assert respuestas["base"] == [
+        ("sku-1", "maritimo", True, 200.0),
+        ("SKU-1", "AEREO", True, 240.0),
+        ("abc-7", "Aereo", True, 20.0),
+        ("ABC-7", "Aereo", True, 20.0),
+        ("SKU-9", "Maritimo", False, None),
+    ]
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from app import recalculo_jobs
+
+
+class BaseFalsa:
+    """dbo.RecalculoTrabajos en memoria, para `connection_scope`."""
+
+    def __init__(self, existe=True):
+        self.existe = existe
+        self.filas = {}
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def execute(self, query, *params):
+        self.rowcount = 0
+        if "OBJECT_ID" in query:
+            self.resultado = [(1 if self.existe else None,)]
+        elif query.startswith("UPDATE"):
+            if params[-1] in self.filas:
+                self.filas[params[-1]] = (params[-1], *params[:-1])
+                self.rowcount = 1
+        elif query.startswith("INSERT"):
+            self.filas[params[0]] = params
+        elif "WHERE job_id = ?" in query:
+            self.resultado = [self.filas[params[0]]] if params[0] in self.filas else []
+        else:
+            self.resultado = sorted(self.filas.values(), key=lambda fila: fila[5], reverse=True)[: params[0]]
+
+    def fetchone(self):
+        return self.resultado[0]
+
+    def fetchall(self):
+        return self.resultado
+
+
+@pytest.fixture(autouse=True)
+def sin_tabla(monkeypatch):
+    monkeypatch.setattr(recalculo_jobs, "connection_scope", BaseFalsa(existe=False))
+    monkeypatch.setattr(recalculo_jobs, "_tabla", {"existe": False})
+
+
+def _esperar(job_id, timeout=5):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        job = recalculo_jobs.get_job(job_id)
+        if job["estado"] not in recalculo_jobs.ACTIVOS:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("El trabajo no terminó")
+
+
+def test_duplicate_requests_are_coalesced():
+    liberar = threading.Event()
+
+    def runner(transportes, progress=None, **kwargs):
+        progress("lectura", 0, len(transportes))
+        liberar.wait(5)
+        progress("calculo", len(transportes), len(transportes))
+        progress("completado", len(transportes), len(transportes))
+        return {"landed_rows": 1, "price_rows": 1}
+
+    primero = recalculo_jobs.submit(["Maritimo", "Aereo"], runner, engine="filas")
+    repetido = recalculo_jobs.submit(["Aereo"], runner, engine="filas")
+    otro_motor = recalculo_jobs.submit(["Aereo"], runner, engine="vectorizado")
+    assert repetido["job_id"] == primero["job_id"]
+    assert repetido["solicitudes"] == 2
+    assert otro_motor["job_id"] != primero["job_id"]
+
+    liberar.set()
+    job = _esperar(primero["job_id"])
+    assert job["estado"] == recalculo_jobs.COMPLETADO
+    assert job["progreso"]["porcentaje"] == 100.0
+    assert {"lectura_s", "calculo_s", "total_s"} <= set(job["etapas"])
+    _esperar(otro_motor["job_id"])
+
+
+def test_failed_job_records_error():
+    def runner(transportes, progress=None, **kwargs):
+        raise ValueError("sin conexión")
+
+    job = _esperar(recalculo_jobs.submit(["Terrestre"], runner)["job_id"])
+    assert job["estado"] == recalculo_jobs.ERROR
+    assert job["error"] == "sin conexión"
+
+
+def test_job_is_readable_from_another_worker(monkeypatch):
+    base = BaseFalsa()
+    monkeypatch.setattr(recalculo_jobs, "connection_scope", base)
+    monkeypatch.setattr(recalculo_jobs, "_jobs", recalculo_jobs.OrderedDict())
+
+    def runner(transportes, progress=None, **kwargs):
+        progress("lectura", 0, len(transportes))
+        return {"landed_rows": 3, "price_rows": 3, "timings": {"total_s": 0.5}}
+
+    job_id = recalculo_jobs.submit(["Maritimo"], runner, engine="filas")["job_id"]
+    local = _esperar(job_id)
+    # Otro worker no tiene el trabajo en memoria: lo lee de dbo.RecalculoTrabajos
+    monkeypatch.setattr(recalculo_jobs, "_jobs", recalculo_jobs.OrderedDict())
+    remoto = recalculo_jobs.get_job(job_id)
+    assert remoto == local
+    assert remoto["worker"] == recalculo_jobs.WORKER
+    assert remoto["creado_en"].tzinfo is not None
+    assert [job["job_id"] for job in recalculo_jobs.list_jobs()] == [job_id]
+    assert recalculo_jobs.get_job("no-existe") is None
@@ -0,0 +1,77 @@
+import json
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from app import compresion, precios_snapshot, schemas, serializacion
+from app.config import settings
+from app.routes import pricing
+
+from test_precios_snapshot import FILAS
+
+
+def test_fast_path_matches_pydantic_output(monkeypatch):
+    pytest.importorskip("orjson")
+    filas = pricing._presentar_listas(precios_snapshot.PreciosSnapshot.from_rows(FILAS).rows(), "Vendedor")
+    productos = [{"sku": "A", "costo_base": Decimal("12.50"), "activo": True}]  # Como los devuelve pyodbc
+    seleccion = ("sku", "precio_minimo_lista")
+
+    monkeypatch.setattr(settings, "api_json_rapido", False)
+    esperado = [
+        serializacion.lista_json(schemas.ListaPrecio, filas),
+        serializacion.lista_json(schemas.ListaPrecio, filas, seleccion),
+        serializacion.lista_json(schemas.Producto, productos),
+    ]
+    monkeypatch.setattr(settings, "api_json_rapido", True)
+    assert serializacion.rapido()
+    rapido = [
+        serializacion.lista_json(schemas.ListaPrecio, filas),
+        serializacion.lista_json(schemas.ListaPrecio, filas, seleccion),
+        serializacion.lista_json(schemas.Producto, productos),
+    ]
+    assert [json.loads(cuerpo) for cuerpo in rapido] == [json.loads(cuerpo) for cuerpo in esperado]
+    # Mismo orden de campos que el esquema
+    assert list(json.loads(rapido[0])[0]) == list(schemas.ListaPrecio.model_fields)
+
+
+@pytest.mark.parametrize(
+    "encabezado, esperado",
+    [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0, identity", None),
+        ("*;q=0.5", "br" if compresion.brotli else "gzip"),
+        ("br;q=0.8, gzip;q=0.9", "gzip"),
+        ("", None),
+    ],
+)
+def test_negociar_accept_encoding(encabezado, esperado):
+    assert compresion.negociar(encabezado) == esperado
+
+
+def test_middleware_compresses_large_bodies_and_weakens_etag():
+    app = FastAPI()
+    app.add_middleware(compresion.CompresionMiddleware, minimum_size=100)
+    cuerpo = json.dumps([{"sku": f"SKU-{i}", "precio": i * 1.5} for i in range(200)]).encode()
+
+    @app.get("/grande")
+    def grande():
+        return Response(cuerpo, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/chica")
+    def chica():
+        return Response(b"[]", media_type="application/json", headers={"ETag": '"v2"'})
+
+    cliente = TestClient(app)
+    respuesta = cliente.get("/grande", headers={"Accept-Encoding": "gzip"})
+    assert respuesta.headers["content-encoding"] == "gzip"
+    assert respuesta.headers["etag"] == 'W/"v1"'
+    assert int(respuesta.headers["content-length"]) < len(cuerpo)
+    assert respuesta.content == cuerpo  # httpx descomprime
+
+    pequena = cliente.get("/chica", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in pequena.headers and pequena.headers["etag"] == '"v2"'
+    sin = cliente.get("/grande", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in sin.headers and sin.headers["etag"] == '"v1"'
@@ -0,0 +1,140 @@
+from fastapi import Depends
+from fastapi.testclient import TestClient
+
+from app import cache_respuestas, precios_snapshot, versiones_datos
+from app.auth import get_current_user
+from app.db import get_connection
+from app.main import app
+
+from test_precios_snapshot import FILAS
+
+
+def _cliente(rol="Vendedor", conexion=None):
+    app.dependency_overrides[get_connection] = lambda: conexion
+    app.dependency_overrides[get_current_user] = lambda: {"rol": rol, "username": rol}
+    return TestClient(app)
+
+
+def test_listas_conditional_get_returns_304_until_prices_change(monkeypatch):
+    snapshot = precios_snapshot.PreciosSnapshot.from_rows(FILAS, 1)
+    monkeypatch.setattr(precios_snapshot, "current", lambda: snapshot)
+    monkeypatch.setattr(cache_respuestas, "cache", cache_respuestas.CacheRespuestas(0))
+    try:
+        cliente = _cliente()
+        primera = cliente.get("/pricing/listas", params={"transporte": "Maritimo"})
+        etag = primera.headers["etag"]
+        assert primera.headers["cache-control"] == versiones_datos.CACHE_CONTROL
+        repetida = cliente.get("/pricing/listas", params={"transporte": "Maritimo"}, headers={"If-None-Match": etag})
+        assert repetida.status_code == 304 and repetida.content == b""
+        # Otro filtro u otra clase de rol es otra representación
+        otra = cliente.get("/pricing/listas", params={"transporte": "Aereo"}, headers={"If-None-Match": etag})
+        assert otra.status_code == 200
+        completo = _cliente("Direccion").get("/pricing/listas", params={"transporte": "Maritimo"})
+        assert completo.headers["etag"] != etag
+
+        # Mismos precios en otro worker (otra generación): misma etiqueta
+        monkeypatch.setattr(precios_snapshot, "current", lambda: precios_snapshot.PreciosSnapshot.from_rows(FILAS, 9))
+        assert _cliente().get("/pricing/listas", params={"transporte": "Maritimo"}).headers["etag"] == etag
+        cambiados = [dict(fila, precio_maximo=fila["precio_maximo"] + 1) for fila in FILAS]
+        monkeypatch.setattr(precios_snapshot, "current", lambda: precios_snapshot.PreciosSnapshot.from_rows(cambiados, 9))
+        nueva = _cliente().get("/pricing/listas", params={"transporte": "Maritimo"}, headers={"If-None-Match": etag})
+        assert nueva.status_code == 200 and nueva.headers["etag"] != etag
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_catalog_304_does_not_read_the_catalog(monkeypatch):
+    monkeypatch.setattr(versiones_datos, "version_catalogo", lambda nombre, conn: f"{nombre}-v1")
+
+    class SinConsultas:
+        def cursor(self):
+            raise AssertionError("No debe consultar la base")
+
+    etag = versiones_datos.etag("productos-v1", "productos", None, None, None)  # Sin limite, cursor ni fields
+    try:
+        respuesta = _cliente(conexion=SinConsultas()).get(
+            "/catalog/productos", headers={"If-None-Match": f'W/{etag}, "otra"'}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.status_code == 304
+    assert respuesta.headers["etag"] == etag
+
+
+def test_auth_and_route_share_one_connection(monkeypatch):
+    """get_current_user y la ruta reciben la misma conexión de get_connection."""
+    abiertas = []
+
+    class Conexion:
+        def cursor(self):
+            return _CursorVersion((1, b"\x01"))
+
+        def close(self):
+            pass
+
+    def conexion():
+        abiertas.append(Conexion())
+        yield abiertas[-1]
+
+    async def usuario(conn=Depends(get_connection)):
+        assert conn is abiertas[0]
+        return {"rol": "Vendedor", "username": "v"}
+
+    monkeypatch.setattr(versiones_datos, "version_catalogo", lambda nombre, conn: f"{nombre}-{id(conn)}")
+    app.dependency_overrides[get_connection] = conexion
+    app.dependency_overrides[get_current_user] = usuario
+    try:
+        respuesta = TestClient(app).get("/catalog/tipos-cambio", headers={"If-None-Match": "*"})
+    finally:
+        app.dependency_overrides.clear()
+    assert respuesta.status_code == 304
+    assert len(abiertas) == 1
+    assert respuesta.headers["etag"] == versiones_datos.etag(f"tipos_cambio-{id(abiertas[0])}", "tipos_cambio")
+
+
+class _CursorVersion:
+    def __init__(self, resultado):
+        self.resultado = resultado
+        self.consultas = []
+
+    def execute(self, sql, *params):
+        self.consultas.append(sql)
+        if isinstance(self.resultado, Exception):
+            raise self.resultado
+
+    def fetchone(self):
+        return self.resultado
+
+
+class _ConexionVersion:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.consultas = 0
+
+    def cursor(self):
+        self.consultas += 1
+        return self._cursor
+
+
+def test_catalog_version_uses_rowversion_and_caches_failures(monkeypatch):
+    cursor = _CursorVersion((3, b"\x00\x00\x00\x00\x00\x00\x07\xd1"))
+    conn = _ConexionVersion(cursor)
+    monkeypatch.setattr(versiones_datos.settings, "catalog_version_ttl", 60)
+    versiones_datos.invalidate_catalogos()
+
+    assert versiones_datos.version_catalogo("productos", conn) == "3-00000000000007d1"
+    assert "MAX(version_fila)" in cursor.consultas[0]
+    # Un UPDATE asigna un rowversion nuevo aunque el conteo no cambie
+    cursor.resultado = (3, b"\x00\x00\x00\x00\x00\x00\x07\xd2")
+    assert versiones_datos.version_catalogo("productos", conn) == "3-00000000000007d1"  # Dentro del TTL
+    versiones_datos.invalidate_catalogos()
+    assert versiones_datos.version_catalogo("productos", conn) == "3-00000000000007d2"
+
+    # Sin la columna: sin ETag, y no se reintenta en cada solicitud
+    cursor.resultado = RuntimeError("Invalid column name 'version_fila'")
+    versiones_datos.invalidate_catalogos()
+    antes = conn.consultas
+    assert versiones_datos.version_catalogo("tipos_cambio", conn) is None
+    assert versiones_datos.version_catalogo("tipos_cambio", conn) is None
+    assert conn.consultas == antes + 1
+    versiones_datos.invalidate_catalogos()
@@ -0,0 +1,279 @@
+"""
+Benchmark del motor de pricing (cost_engine) con catálogos sintéticos.
+
+Genera Productos, TiposCambio y ParametrosImportacion en memoria (sin SQL
+Server) con mezclas realistas de moneda, origen y categoría, y mide cada
+etapa del recálculo:
+- build_fx_map
+- split_parametros
+- landed (calculate_landed_costs / motor vectorizado)
+- precios (niveles de precio)
+- serializacion (tuplas para executemany de LandedCostCache y PreciosCalculados)
+
+Por etapa reporta segundos (mejor de N repeticiones), filas por segundo y
+memoria pico (tracemalloc, en una pasada aparte para no afectar los tiempos).
+Los resultados se guardan en JSON para comparar ejecuciones.
+
+Uso:
+  python tools/benchmark_pricing.py
+  python tools/benchmark_pricing.py --tamanos 10000 100000 --motor vectorizado --repeticiones 5
+  python tools/benchmark_pricing.py --comparar benchmarks/base.json --umbral 0.25
+
+Con --comparar termina con código 1 si alguna etapa es más lenta que la base
+por encima del umbral (fracción; 0.25 = 25%). El catálogo de 1M SKUs con el
+motor por filas necesita del orden de 2 GB de memoria.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import cost_engine
+except Exception:
+    # try importing as module when executed from repo root
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    import cost_engine
+
+TAMANOS = (10_000, 100_000, 1_000_000)
+ETAPAS = ("build_fx_map", "split_parametros", "landed", "precios", "serializacion")
+
+# Mezclas aproximadas del catálogo real
+MONEDAS = (("USD", 0.55), ("MXN", 0.25), ("EUR", 0.15), ("JPY", 0.05))
+ORIGENES = (("Importado", 0.60), ("Nacional", 0.25), (None, 0.10), ("", 0.05))
+CATEGORIAS = (("Equipo", 0.35), ("Insumo", 0.35), ("Accesorio", 0.15), ("Refaccion", 0.10), (None, 0.05))
+TIPO_CAMBIO_BASE = {"USD": 17.2, "EUR": 18.9, "JPY": 0.118}
+# Diferencias menores a esto son ruido de medición (etapas de microsegundos)
+RUIDO_S = 0.001
+
+
+def _elegir(rng, opciones, n):
+    valores = [valor for valor, _ in opciones]
+    pesos = np.array([peso for _, peso in opciones])
+    indices = rng.choice(len(valores), size=n, p=pesos / pesos.sum())
+    return [valores[i] for i in indices]
+
+
+def generar_productos(n, semilla=7):
+    """Productos en columnas, como los devuelve cost_engine.fetch_columns (costos DECIMAL)."""
+    rng = np.random.default_rng(semilla)
+    costos = np.round(rng.lognormal(mean=6.0, sigma=1.4, size=n), 2)
+    dias = rng.integers(0, 365, size=n)
+    inicio = date(2025, 1, 1)
+    return {
+        "sku": [f"SKU-{i:07d}" for i in range(n)],
+        "origen": _elegir(rng, ORIGENES, n),
+        "categoria": _elegir(rng, CATEGORIAS, n),
+        "moneda_base": _elegir(rng, MONEDAS, n),
+        "costo_base": [Decimal(f"{valor:.2f}") for valor in costos],
+        "fecha_actualizacion": [inicio + timedelta(days=int(d)) for d in dias],
+        "segmento_hospitalario": [None] * n,
+    }
+
+
+def generar_tipos_cambio(dias=365, semilla=7):
+    """Histórico diario por moneda; build_fx_map debe quedarse con el más reciente."""
+    rng = np.random.default_rng(semilla)
+    filas = []
+    inicio = date(2025, 1, 1)
+    for moneda, base in TIPO_CAMBIO_BASE.items():
+        variaciones = rng.normal(0, 0.004, size=dias).cumsum()
+        for dia, variacion in enumerate(variaciones):
+            filas.append({
+                "moneda": moneda,
+                "tipo_cambio_mxn": Decimal(f"{base * (1 + variacion):.6f}"),
+                "fecha": inicio + timedelta(days=dia),
+            })
+    return filas
+
+
+def generar_parametros():
+    filas = [
+        {"concepto": "Seguro", "tipo": "porcentaje", "valor": Decimal("0.005")},
+        {"concepto": "Arancel", "tipo": "porcentaje", "valor": Decimal("0.15")},
+        {"concepto": "DTA", "tipo": "porcentaje", "valor": Decimal("0.008")},
+        {"concepto": "Honorarios_Aduanales", "tipo": "porcentaje", "valor": Decimal("0.0045")},
+        {"concepto": "Mark_up", "tipo": "porcentaje", "valor": Decimal("0.10")},
+        {"concepto": "Gastos_Fijos", "tipo": "fijo", "valor": Decimal("250")},
+    ]
+    fletes = {"maritimo": Decimal("0.05"), "aereo": Decimal("0.12"), "terrestre": Decimal("0.03")}
+    for transporte, flete in fletes.items():
+        filas.append({"concepto": transporte.capitalize(), "tipo": "porcentaje", "valor": flete})
+        for categoria in ("Equipo", "Insumo", "Refaccion"):
+            filas.append({
+                "concepto": f"{transporte.capitalize()}_{categoria}",
+                "tipo": "porcentaje",
+                "valor": flete + Decimal("0.01"),
+            })
+    return filas
+
+
+def _etapas(motor, productos, tipos_cambio, parametros, transporte, calculado_en):
+    """Funciones de cada etapa; cada una recibe el resultado de las anteriores."""
+    estado = {}
+
+    def fx():
+        estado["fx_map"] = cost_engine.build_fx_map(tipos_cambio)
+
+    def params():
+        estado["pct"], estado["fijos"] = cost_engine.split_parametros(parametros)
+
+    if motor == "vectorizado":
+        def landed():
+            columnas = cost_engine.productos_to_columns(productos)
+            estado["landed"] = cost_engine.calculate_landed_columns(
+                columnas, estado["fx_map"], estado["pct"], estado["fijos"], transporte, calculado_en
+            )
+
+        def precios():
+            estado["precios"] = cost_engine.calculate_price_columns(
+                estado["landed"], estado["pct"].get("mark_up", 0.10), calculado_en
+            )
+    else:
+        filas = [dict(zip(productos, valores)) for valores in zip(*productos.values())]
+
+        def landed():
+            estado["landed"] = cost_engine.calculate_landed_costs(
+                filas, {}, estado["fx_map"], estado["pct"], estado["fijos"], transporte, calculado_en
+            )
+
+        def precios():
+            estado["precios"] = cost_engine.build_price_rows(
+                estado["landed"], estado["pct"].get("mark_up", 0.10), calculado_en
+            )
+
+    def serializacion():
+        cost_engine._row_payload(estado["landed"], cost_engine.LANDED_COLUMNS)
+        cost_engine._row_payload(estado["precios"], cost_engine.PRICE_COLUMNS)
+
+    return dict(zip(ETAPAS, (fx, params, landed, precios, serializacion)))
+
+
+def medir(motor, n, transporte, repeticiones):
+    productos = generar_productos(n)
+    tipos_cambio = generar_tipos_cambio()
+    parametros = generar_parametros()
+    calculado_en = datetime.now(timezone.utc)
+    filas_por_etapa = {
+        "build_fx_map": len(tipos_cambio),
+        "split_parametros": len(parametros),
+        "landed": n,
+        "precios": n,
+        "serializacion": 2 * n,
+    }
+
+    tiempos = {etapa: [] for etapa in ETAPAS}
+    for _ in range(repeticiones):
+        for etapa, funcion in _etapas(motor, productos, tipos_cambio, parametros, transporte, calculado_en).items():
+            inicio = time.perf_counter()
+            funcion()
+            tiempos[etapa].append(time.perf_counter() - inicio)
+
+    memoria = {}
+    for etapa, funcion in _etapas(motor, productos, tipos_cambio, parametros, transporte, calculado_en).items():
+        tracemalloc.start()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memoria[etapa] = pico
+
+    etapas = {}
+    for etapa in ETAPAS:
+        segundos = min(tiempos[etapa])
+        etapas[etapa] = {
+            "segundos": round(segundos, 6),
+            "filas": filas_por_etapa[etapa],
+            "filas_por_s": round(filas_por_etapa[etapa] / segundos, 1) if segundos else None,
+            "memoria_pico_mb": round(memoria[etapa] / 1024 / 1024, 2),
+        }
+    total = sum(etapa["segundos"] for etapa in etapas.values())
+    return {
+        "motor": motor,
+        "skus": n,
+        "transporte": transporte,
+        "etapas": etapas,
+        "total_s": round(total, 6),
+        "skus_por_s": round(n / total, 1) if total else None,
+    }
+
+
+def comparar(resultados, base, umbral):
+    """Lista de etapas más lentas que la base por encima de `umbral`."""
+    previos = {(r["motor"], r["skus"], r["transporte"]): r for r in base["resultados"]}
+    regresiones = []
+    for actual in resultados:
+        previo = previos.get((actual["motor"], actual["skus"], actual["transporte"]))
+        if not previo:
+            continue
+        for etapa, medida in actual["etapas"].items():
+            antes = previo["etapas"].get(etapa, {}).get("segundos")
+            if antes and medida["segundos"] > antes * (1 + umbral) and medida["segundos"] - antes > RUIDO_S:
+                regresiones.append({
+                    "motor": actual["motor"],
+                    "skus": actual["skus"],
+                    "etapa": etapa,
+                    "base_s": antes,
+                    "actual_s": medida["segundos"],
+                    "cambio_pct": round((medida["segundos"] / antes - 1) * 100, 1),
+                })
+    return regresiones
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de pricing con catálogos sintéticos")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS), help="Número de SKUs por catálogo")
+    parser.add_argument("--motor", nargs="+", choices=cost_engine.ENGINES, default=list(cost_engine.ENGINES))
+    parser.add_argument("--transporte", default="Maritimo")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se reporta el mejor tiempo de N repeticiones")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados (por defecto benchmarks/benchmark_<fecha>.json)")
+    parser.add_argument("--comparar", default=None, help="JSON de una ejecución previa para detectar regresiones")
+    parser.add_argument("--umbral", type=float, default=0.25, help="Fracción de tiempo extra tolerada al comparar")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    resultados = []
+    for n in args.tamanos:
+        for motor in args.motor:
+            resultado = medir(motor, n, args.transporte, args.repeticiones)
+            resultados.append(resultado)
+            print(f"{motor:>11} {n:>9,} SKUs: {resultado['total_s']:.3f} s ({resultado['skus_por_s']:,.0f} SKUs/s)")
+            for etapa, medida in resultado["etapas"].items():
+                print(
+                    f"    {etapa:<17} {medida['segundos']:>9.4f} s  "
+                    f"{medida['filas_por_s'] or 0:>14,.0f} filas/s  {medida['memoria_pico_mb']:>8.2f} MB"
+                )
+
+    salida = {
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "repeticiones": args.repeticiones,
+        "resultados": resultados,
+    }
+    ruta = Path(args.salida or f"benchmarks/benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(salida, indent=2), encoding="utf-8")
+    print(f"\nResultados guardados en {ruta}")
+
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        regresiones = comparar(resultados, base, args.umbral)
+        for r in regresiones:
+            print(f"⚠️ Regresión {r['motor']} {r['skus']:,} SKUs, {r['etapa']}: {r['base_s']} s -> {r['actual_s']} s (+{r['cambio_pct']}%)")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto a la base")
+
+
+if __name__ == "__main__":
+    main()
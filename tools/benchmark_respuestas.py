@@ -0,0 +1,169 @@
+"""
+Benchmark de serialización y compresión de /pricing/listas con una foto sintética.
+
+Arma una foto de precios (app/precios_snapshot.py) de N filas y mide el CPU
+por solicitud (time.process_time, promedio de N repeticiones tras una de
+calentamiento) de generar el cuerpo de /pricing/listas sin caché:
+- response_model: validación + dump_python + json.dumps de JSONResponse, como
+  hacía FastAPI antes de serializar las listas en la ruta
+- pydantic: `lista_json` por defecto (validación + dump_json de pydantic-core)
+- orjson: `lista_json` con API_JSON_RAPIDO (sin validar; requiere orjson)
+
+y el costo de comprimir el cuerpo con gzip (nivel de app/compresion.py) y
+brotli (si está instalado), con el tamaño resultante. No requiere SQL Server.
+
+Uso:
+  python tools/benchmark_respuestas.py
+  python tools/benchmark_respuestas.py --filas 10000 50000 --rol Vendedor --repeticiones 50
+"""
+import argparse
+import gzip
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app import compresion, precios_snapshot, schemas, serializacion  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.routes import pricing  # noqa: E402
+
+FILAS = (10_000,)
+TRANSPORTES = ("Maritimo", "Aereo")
+CATEGORIAS = ("Equipo", "Insumo", "Accesorio", "Refaccion", None)
+
+
+def generar_foto(n, semilla=7):
+    """Foto con n filas: n/2 SKUs con precio marítimo y aéreo, niveles como los del motor."""
+    rng = np.random.default_rng(semilla)
+    landed = np.round(rng.lognormal(mean=7.0, sigma=1.2, size=n), 4)
+    base = landed * 1.10
+    maximo = base * 2
+    columnas = {
+        "sku": [f"SKU-{i // 2:07d}" for i in range(n)],
+        "transporte": [TRANSPORTES[i % 2] for i in range(n)],
+        "landed_cost_mxn": landed.tolist(),
+        "precio_base_mxn": base.tolist(),
+        "precio_maximo": maximo.tolist(),
+        "precio_vendedor_min": (maximo * 0.80).tolist(),
+        "precio_gerente_com_min": (maximo * 0.75).tolist(),
+        "precio_subdireccion_min": (maximo * 0.70).tolist(),
+        "precio_direccion_min": (maximo * 0.65).tolist(),
+        "markup_pct": [0.10] * n,
+        "fecha_calculo": [datetime(2026, 3, 1, 12, 0)] * n,
+        "costo_base_mxn": (landed * 0.8).tolist(),
+        "flete_pct": [0.05] * n,
+        "seguro_pct": [0.005] * n,
+        "arancel_pct": [0.15] * n,
+        "dta_pct": [0.008] * n,
+        "honorarios_aduanales_pct": [0.0045] * n,
+        "categoria": [CATEGORIAS[i % len(CATEGORIAS)] for i in range(n // 2) for _ in range(2)][:n],
+    }
+    return precios_snapshot.PreciosSnapshot(columnas)
+
+
+def _response_model(snapshot, rol):
+    adapter = serializacion._adaptador(schemas.ListaPrecio)
+    filas = pricing._presentar_listas(snapshot.rows(), rol)
+    return JSONResponse(adapter.dump_python(adapter.validate_python(filas), mode="json")).body
+
+
+def _lista_json(rapido):
+    def construir(snapshot, rol):
+        settings.api_json_rapido = rapido
+        cuerpo, _ = pricing._listas_json(snapshot, None, None, None, None, None, rol)
+        return cuerpo
+    return construir
+
+
+def cpu_ms(funcion, repeticiones):
+    """CPU promedio por llamada en milisegundos (tras una llamada de calentamiento)."""
+    funcion()
+    inicio = time.process_time()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.process_time() - inicio) / repeticiones * 1000
+
+
+def medir(n, rol, repeticiones):
+    snapshot = generar_foto(n)
+    modos = {"response_model": _response_model, "pydantic": _lista_json(False)}
+    if serializacion.orjson is not None:
+        modos["orjson"] = _lista_json(True)
+    anterior = settings.api_json_rapido
+    serializacion_ms, cuerpos = {}, {}
+    try:
+        for modo, construir in modos.items():
+            serializacion_ms[modo] = round(cpu_ms(lambda: construir(snapshot, rol), repeticiones), 3)
+            cuerpos[modo] = construir(snapshot, rol)
+    finally:
+        settings.api_json_rapido = anterior
+
+    cuerpo = cuerpos.get("orjson", cuerpos["pydantic"])
+    compresores = {"gzip": lambda: gzip.compress(cuerpo, compresslevel=compresion.NIVEL_GZIP)}
+    if compresion.brotli is not None:
+        compresores["br"] = lambda: compresion.brotli.compress(cuerpo, quality=compresion.CALIDAD_BROTLI)
+    compresion_medida = {
+        nombre: {"cpu_ms": round(cpu_ms(comprimir, repeticiones), 3), "bytes": len(comprimir())}
+        for nombre, comprimir in compresores.items()
+    }
+    base = serializacion_ms["response_model"]
+    return {
+        "filas": n,
+        "rol": rol,
+        "bytes": {modo: len(valor) for modo, valor in cuerpos.items()},
+        "serializacion_cpu_ms": serializacion_ms,
+        "ahorro_vs_response_model_pct": {
+            modo: round((1 - ms / base) * 100, 1) for modo, ms in serializacion_ms.items() if modo != "response_model"
+        },
+        "compresion": compresion_medida,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización y compresión de /pricing/listas")
+    parser.add_argument("--filas", type=int, nargs="+", default=list(FILAS), help="Filas de la lista de precios")
+    parser.add_argument("--rol", default="Direccion", help="Rol de la solicitud (Vendedor oculta costos)")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Solicitudes medidas por modo")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados (por defecto benchmarks/respuestas_<fecha>.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    resultados = []
+    for n in args.filas:
+        resultado = medir(n, args.rol, args.repeticiones)
+        resultados.append(resultado)
+        print(f"{n:,} filas, rol {args.rol}:")
+        for modo, ms in resultado["serializacion_cpu_ms"].items():
+            ahorro = resultado["ahorro_vs_response_model_pct"].get(modo)
+            extra = f"  ({ahorro:+.1f}% CPU ahorrado)" if ahorro is not None else ""
+            print(f"    {modo:<15} {ms:>9.2f} ms CPU  {resultado['bytes'][modo]:>11,} bytes{extra}")
+        for nombre, medida in resultado["compresion"].items():
+            print(f"    {nombre:<15} {medida['cpu_ms']:>9.2f} ms CPU  {medida['bytes']:>11,} bytes comprimidos")
+
+    salida = {
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "orjson": serializacion.orjson is not None,
+        "brotli": compresion.brotli is not None,
+        "repeticiones": args.repeticiones,
+        "resultados": resultados,
+    }
+    ruta = Path(args.salida or f"benchmarks/respuestas_{datetime.now():%Y%m%d_%H%M%S}.json")
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(salida, indent=2), encoding="utf-8")
+    print(f"\nResultados guardados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()